@@ -1,5 +1,6 @@
-from flask import Flask, request, session, redirect, url_for
+from flask import Flask, request, session, redirect, url_for, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 from flask import Blueprint
 import base64
 
@@ -11,15 +12,65 @@ def create_app():
     app.config.from_pyfile('../config.py')
     db.init_app(app)
 
+    # Behind a proxy, request.remote_addr (a login admission key) and the scheme come from its headers
+    if app.config.get('TRUSTED_PROXIES'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    from app.sql_metrics import sql_metrics
+    sql_metrics.init_app(app)
+
+    from app.hash_pool import hash_pool
+    hash_pool.init_app(app)
+
+    from app.password_utils import key_cache
+    key_cache.init_app(app)
+
+    from app.blob_store import blob_store
+    blob_store.init_app(app)
+
+    from app.thumbnails import variant_worker
+    variant_worker.init_app(app)
+
+    from app.holidays import holiday_calendars
+    holiday_calendars.init_app(app)
+
+    from app.timezones import time_service
+    time_service.init_app(app)
+
+    from app.event_bus import event_bus
+    event_bus.init_app(app)
+
+    from app.invalidation import invalidation_bus, EMPLOYEE
+    from app.live_board import forget_names
+    invalidation_bus.init_app(app)
+    invalidation_bus.subscribe(EMPLOYEE, forget_names)
+
+    from app.presence import presence
+    presence.init_app(app)
+
+    from app.dashboard_metrics import dashboard_metrics
+    dashboard_metrics.init_app(app)
+
     # Configure session security
     app.config['PERMANENT_SESSION_LIFETIME'] = app.config.get('PERMANENT_SESSION_LIFETIME')
     app.config['SESSION_COOKIE_SECURE'] = app.config.get('SESSION_COOKIE_SECURE', False)
     app.config['SESSION_COOKIE_HTTPONLY'] = app.config.get('SESSION_COOKIE_HTTPONLY', True)
     app.config['SESSION_COOKIE_SAMESITE'] = app.config.get('SESSION_COOKIE_SAMESITE', 'Lax')
 
-    # Create database tables after everything is set up
+    # Create a fresh database, or check an existing one against the migrations
     with app.app_context():
-        db.create_all()
+        from app.migrations import prepare_database
+        prepare_database(app)
+        if presence.enabled:
+            try:
+                presence.warm()
+            except SQLAlchemyError:
+                # e.g. `flask db upgrade` on an old schema; the index warms on first use
+                app.logger.warning("Could not warm the presence index", exc_info=True)
+            finally:
+                db.session.remove()
 
     # Register custom Jinja2 filters
     @app.template_filter('b64encode')
@@ -30,8 +81,13 @@ def create_app():
 
     @app.template_filter('user_by_id')
     def user_by_id_filter(user_id):
+        from app.identity import current_identity
+        identity = current_identity()
+        if identity and identity.user_id == user_id:
+            return identity.user
+        # Any other user already loaded in this session comes from the identity map, without a query
         from app.models import User
-        return User.query.get(user_id)
+        return db.session.get(User, user_id) if user_id is not None else None
 
     # Global login guard: allow only whitelisted endpoints without auth
     @app.before_request
@@ -46,11 +102,24 @@ def create_app():
             'main.unauthorized',
         ):
             return None
+        # The JSON API authenticates each request itself (token or session)
+        if request.blueprint == 'api':
+            return None
         # If not logged in, redirect to login
         if 'user_id' not in session:
             return redirect(url_for('main.login'))
+        # Load the user/employee once for views, context processors and filters
+        from app.identity import load_identity
+        g.identity = load_identity(session['user_id'])
+        if g.identity is None:
+            # The account was deleted while the session was still alive
+            session.clear()
+            return redirect(url_for('main.login'))
         return None
 
+    from app.commands import register_commands
+    register_commands(app)
+
     from app.routes import main
     app.register_blueprint(main)
 
@@ -60,4 +129,7 @@ def create_app():
     from app.admin.routes import admin as admin_blueprint
     app.register_blueprint(admin_blueprint)
 
+    from app.api.routes import api as api_blueprint
+    app.register_blueprint(api_blueprint)
+
     return app
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from app.models import User, Employee
 from app import db
+from app.timezones import time_service, TIME_12H
+from app.invalidation import invalidation_bus, USER
+from app.sql_metrics import query_budget
 from functools import wraps
 
 # Authentication decorator
@@ -31,14 +34,15 @@ def role_required(allowed_roles):
 admin = Blueprint('admin', __name__)
 
 @admin.route('/admin/view_employees')
+@query_budget(2)
 @login_required
 @role_required(['admin'])
 def view_employees():
     """Admin view to see all employees"""
-    employees = Employee.query.all()
+    from app.read_models import employee_select, employee_rows
+    employees = employee_rows(employee_select().order_by(Employee.name, Employee.id))
     employee_list = []
     for emp in employees:
-        user = User.query.get(emp.user_id)
         employee_list.append({
             'id': emp.id,
             'name': emp.name,
@@ -46,13 +50,14 @@ def view_employees():
             'address': emp.address,
             'phone_number': emp.phone_number,
             'unique_id_number': emp.unique_id_number,
-            'username': user.username if user else '',
-            'role': user.role if user else '',
+            'username': emp.username or '',
+            'role': emp.role or '',
             'job_role': emp.job_role
         })
     return render_template('admin/view_employees.html', employees=employee_list)
 
 @admin.route('/admin/view_hr')
+@query_budget(2)
 @login_required
 @role_required(['admin'])
 def view_hr():
@@ -92,6 +97,8 @@ def add_hr():
             new_hr = User(username=username, role='hr', name=name)
             new_hr.set_password(password)
             db.session.add(new_hr)
+            db.session.flush()
+            invalidation_bus.changed(db.session, USER, new_hr.id)
             db.session.commit()
             message = 'HR user added successfully!'
     
@@ -105,6 +112,7 @@ def delete_hr(hr_id):
     hr_user = User.query.get(hr_id)
     if hr_user and hr_user.role == 'hr':
         db.session.delete(hr_user)
+        invalidation_bus.changed(db.session, USER, hr_id)
         db.session.commit()
         flash('HR user deleted successfully.')
     else:
@@ -113,88 +121,52 @@ def delete_hr(hr_id):
     return redirect(url_for('admin.view_hr'))
 
 @admin.route('/admin/view_users')
+@query_budget(5)
 @login_required
 @role_required(['admin'])
 def view_users():
     """Admin view to see all users with comprehensive details"""
-    from app.models import Attendance, LeaveRequest
-    from datetime import datetime, timedelta
+    from app.user_stats import user_stats_page, parse_user_filters, role_counts
+    from app.pagination import clamp_per_page, CursorError
+    filters = parse_user_filters(request.args)
+    per_page = clamp_per_page(request.args.get('per_page'))
+    try:
+        page = user_stats_page(filters, request.args.get('cursor'), per_page)
+    except CursorError:
+        return redirect(url_for('admin.view_users', **filters.args()))
     
-    # Get all users
-    all_users = User.query.all()
     users_data = []
-    
-    for user in all_users:
+    for stats in page.items:
         user_info = {
-            'id': user.id,
-            'username': user.username,
-            'role': user.role,
-            'name': user.name,
-            'created_at': user.created_at if hasattr(user, 'created_at') else 'N/A',
-            'last_login': user.last_login if hasattr(user, 'last_login') else 'N/A',
-            'is_active': user.is_active if hasattr(user, 'is_active') else True,
+            'id': stats.user_id,
+            'username': stats.username,
+            'role': stats.role,
+            'name': stats.name,
+            'is_active': True,
             'employee_details': None,
             'attendance_stats': None,
             'leave_stats': None
         }
-        
-        # Get employee details if user is an employee (name and job role for system management)
-        if user.role == 'employee':
-            employee = Employee.query.filter_by(user_id=user.id).first()
-            if employee:
-                user_info['employee_details'] = {
-                    'name': employee.name,
-                    'job_role': employee.job_role
-                }
-                
-                # Get attendance statistics
-                total_attendance = Attendance.query.filter_by(employee_id=employee.id).count()
-                today = datetime.now().date()
-                today_attendance = Attendance.query.filter_by(employee_id=employee.id, date=today).first()
-                
-                user_info['attendance_stats'] = {
-                    'total_records': total_attendance,
-                    'today_status': 'Present' if today_attendance else 'Absent',
-                    'login_time': None,
-                    'last_checkout': None
-                }
-                
-                # Get today's login time if present
-                if today_attendance and today_attendance.checkin_time:
-                    # Convert UTC to IST for check-in time
-                    import pytz
-                    utc = pytz.utc
-                    ist = pytz.timezone('Asia/Kolkata')
-                    dt_utc = datetime.combine(today_attendance.date, today_attendance.checkin_time).replace(tzinfo=utc)
-                    dt_ist = dt_utc.astimezone(ist)
-                    user_info['attendance_stats']['login_time'] = dt_ist.strftime('%I:%M %p')
-                
-                # Get last checkout time
-                last_attendance = Attendance.query.filter_by(employee_id=employee.id).order_by(Attendance.date.desc()).first()
-                if last_attendance and last_attendance.checkout_time:
-                    # Convert UTC to IST for checkout time
-                    import pytz
-                    utc = pytz.utc
-                    ist = pytz.timezone('Asia/Kolkata')
-                    dt_utc = datetime.combine(last_attendance.date, last_attendance.checkout_time).replace(tzinfo=utc)
-                    dt_ist = dt_utc.astimezone(ist)
-                    user_info['attendance_stats']['last_checkout'] = dt_ist.strftime('%I:%M %p - %Y-%m-%d')
-                
-                # Get leave statistics
-                total_leaves = LeaveRequest.query.filter_by(employee_id=employee.id).count()
-                pending_leaves = LeaveRequest.query.filter_by(employee_id=employee.id, status='Pending').count()
-                approved_leaves = LeaveRequest.query.filter_by(employee_id=employee.id, status='Accepted').count()
-                
-                user_info['leave_stats'] = {
-                    'total_requests': total_leaves,
-                    'pending': pending_leaves,
-                    'approved': approved_leaves,
-                    'rejected': total_leaves - pending_leaves - approved_leaves
-                }
-        
+        if stats.employee_id is not None:
+            user_info['employee_details'] = {
+                'name': stats.name,
+                'job_role': stats.job_role
+            }
+            attendance = stats.attendance
+            user_info['attendance_stats'] = {
+                'total_records': attendance.total_records,
+                'today_status': 'Present' if attendance.present_today else 'Absent',
+                'login_time': None,
+                'last_checkout': None
+            }
+            if attendance.present_today:
+                user_info['attendance_stats']['login_time'] = time_service.format(
+                    attendance.date, attendance.login_time, TIME_12H)
+            if attendance.last_checkout:
+                checkout = time_service.format(attendance.last_checkout_date, attendance.last_checkout, TIME_12H)
+                user_info['attendance_stats']['last_checkout'] = f"{checkout} - {attendance.last_checkout_date:%Y-%m-%d}"
+            user_info['leave_stats'] = stats.leaves._asdict()
         users_data.append(user_info)
     
-    # Sort users by role and then by username
-    users_data.sort(key=lambda x: (x['role'], x['username']))
-    
-    return render_template('admin/view_users.html', users=users_data)
+    return render_template('admin/view_users.html', users=users_data, page=page, filters=filters,
+                           role_counts=role_counts(), per_page=per_page)
@@ -0,0 +1,117 @@
+from flask import Blueprint, request, session, jsonify, g
+from functools import wraps
+from app.identity import load_identity
+from app.api_tokens import bearer_token, load_token_identity
+from app.timezones import time_service, utc_now, TIME_24H_SECONDS
+from app.sql_metrics import query_budget
+
+API_VERSION = 1
+
+api = Blueprint('api', __name__, url_prefix=f'/api/v{API_VERSION}')
+
+
+def api_error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    if status == 401:
+        response.headers['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+# Token or session authentication; the global login guard leaves this blueprint alone
+def api_auth_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = bearer_token(request)
+        if token:
+            g.identity = load_token_identity(token)
+        elif 'user_id' in session:
+            # Browsers can only send a JSON body cross-site after a CORS
+            # preflight, so requiring one keeps session POSTs same-origin
+            if request.method == 'POST' and not request.is_json:
+                return api_error('Session-authenticated requests must send JSON.', 415)
+            g.identity = load_identity(session['user_id'])
+        else:
+            g.identity = None
+        if g.identity is None:
+            return api_error('Authentication required.', 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def employee_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if g.identity.employee is None:
+            return api_error('No employee record found for this user.', 403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if g.identity.role != 'admin':
+            return api_error('Admin access required.', 403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _idempotency_key():
+    body = request.get_json(silent=True) or {}
+    return request.headers.get('Idempotency-Key') or body.get('idempotency_key')
+
+
+def _state_payload(state):
+    """Attendance state with times as HH:MM:SS in the user's zone"""
+    zone_name = time_service.display_zone()
+    payload = state.to_dict(zone_name=zone_name, fmt=TIME_24H_SECONDS)
+    payload['zone'] = zone_name
+    return payload
+
+
+@api.route('/attendance', methods=['GET'])
+@api_auth_required
+@employee_required
+def attendance_today():
+    from app.checkin import attendance_state
+    return jsonify(_state_payload(attendance_state(g.identity.employee_id, utc_now().date())))
+
+
+@api.route('/attendance/checkin', methods=['POST'])
+@api_auth_required
+@employee_required
+def checkin():
+    from app.checkin import check_in
+    changed, state = check_in(g.identity.employee_id, _idempotency_key())
+    return jsonify({'changed': changed, 'state': _state_payload(state)})
+
+
+@api.route('/attendance/checkout', methods=['POST'])
+@api_auth_required
+@employee_required
+def checkout():
+    from app.checkin import check_out
+    changed, state = check_out(g.identity.employee_id, _idempotency_key())
+    return jsonify({'changed': changed, 'state': _state_payload(state)})
+
+
+@api.route('/admin/users', methods=['GET'])
+@query_budget(5)
+@api_auth_required
+@admin_required
+def admin_users():
+    from app.user_stats import user_stats_page, parse_user_filters
+    from app.pagination import clamp_per_page, CursorError
+    try:
+        page = user_stats_page(parse_user_filters(request.args), request.args.get('cursor'),
+                               clamp_per_page(request.args.get('per_page')))
+    except CursorError:
+        return api_error('Invalid cursor.', 400)
+    zone_name = time_service.display_zone()
+    return jsonify({
+        'users': [stats.to_dict(zone_name=zone_name, fmt=TIME_24H_SECONDS) for stats in page.items],
+        'zone': zone_name,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
@@ -0,0 +1,71 @@
+import hashlib
+import secrets
+from datetime import timedelta
+from app import db
+from app.timezones import utc_now
+
+TOKEN_PREFIX = 'hrms_'
+LAST_USED_RESOLUTION = timedelta(minutes=5)  # Avoid a write on every API call
+
+
+def hash_token(token):
+    """Tokens are random, so a plain SHA-256 is enough to store them"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_token(user, name, lifetime=None):
+    """
+    Create an API token for a user
+
+    Args:
+        user (User): Owner of the token
+        name (str): Label shown by `flask api-tokens list`
+        lifetime (timedelta, optional): None for a token that does not expire
+
+    Returns:
+        tuple: (ApiToken, the token string; it is not stored and cannot be shown again)
+    """
+    from app.models import ApiToken
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    record = ApiToken(
+        user_id=user.id, name=name, token_hash=hash_token(token),
+        created_at=utc_now(), expires_at=utc_now() + lifetime if lifetime else None,
+    )
+    db.session.add(record)
+    db.session.commit()
+    return record, token
+
+
+def bearer_token(request):
+    """The token from an 'Authorization: Bearer ...' header, or None"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    token = token.strip()
+    return token if scheme.lower() == 'bearer' and token else None
+
+
+def load_token_identity(token):
+    """
+    Load the Identity behind a bearer token in one query
+
+    Returns:
+        Identity or None if the token is unknown, revoked or expired
+    """
+    from app.identity import Identity
+    from app.models import ApiToken, User, Employee
+    now = utc_now()
+    row = (
+        db.session.query(ApiToken, User, Employee)
+        .join(User, User.id == ApiToken.user_id)
+        .outerjoin(Employee, Employee.user_id == User.id)
+        .filter(ApiToken.token_hash == hash_token(token), ApiToken.revoked.is_(False))
+        .first()
+    )
+    if row is None:
+        return None
+    record, user, employee = row
+    if record.expires_at is not None and record.expires_at <= now:
+        return None
+    if record.last_used_at is None or now - record.last_used_at >= LAST_USED_RESOLUTION:
+        record.last_used_at = now
+        db.session.commit()
+    return Identity(user, employee, bool(employee and employee.has_profile_pic))
@@ -0,0 +1,179 @@
+import calendar
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+from app import db
+from app.attendance_report import PRESENT, CHECKED_IN, NO_RECORD
+from app.holidays import holiday_calendars
+
+# One character per day in MatrixRow.statuses
+CELL_CODES = {
+    'P': 'Present',
+    'C': 'Checked In',
+    'N': 'No Record',
+    'A': 'Absent',
+    'H': 'Holiday',
+    '.': 'Upcoming',
+}
+STATUS_CODES = {PRESENT: 'P', CHECKED_IN: 'C', NO_RECORD: 'N'}
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+class MatrixTotals(NamedTuple):
+    present_days: int
+    absent_days: int
+    holiday_days: int
+    late_days: int
+    total_hours: float
+
+
+class MatrixRow(NamedTuple):
+    employee_id: int
+    name: str
+    job_role: Optional[str]
+    statuses: str  # One CELL_CODES character per day of the month
+    hours: list  # Worked hours per day, None where the day is not 'P'
+    late_days: list  # Days of the month with a late first check-in
+    totals: MatrixTotals
+
+    def to_dict(self):
+        return {
+            'employee_id': self.employee_id,
+            'name': self.name,
+            'job_role': self.job_role,
+            'statuses': self.statuses,
+            'hours': self.hours,
+            'late_days': self.late_days,
+            'totals': self.totals._asdict(),
+        }
+
+
+def parse_month(month_arg, today=None):
+    """
+    Parse a 'YYYY-MM' query argument, defaulting to the current month
+
+    Raises:
+        ValueError: If the argument is not a valid month
+    """
+    today = today or date.today()
+    if not month_arg:
+        return today.year, today.month
+    parsed = datetime.strptime(month_arg, '%Y-%m')
+    return parsed.year, parsed.month
+
+
+def fetch_month_summaries(employee_ids, year, month):
+    """All summary rows of the employees for a month, in one query"""
+    from app.models import DailyAttendanceSummary as Summary
+    days_in_month = calendar.monthrange(year, month)[1]
+    return db.session.query(
+        Summary.employee_id, Summary.date, Summary.status, Summary.worked_seconds, Summary.late_login
+    ).filter(
+        Summary.employee_id.in_(list(employee_ids)),
+        Summary.date >= date(year, month, 1),
+        Summary.date <= date(year, month, days_in_month),
+    ).all()
+
+
+def build_matrix(employees, year, month, summaries, today=None):
+    """
+    Lay out an employees x days grid from summary rows
+
+    Each employee's month is folded into bitmaps (bit d-1 = day d) so the
+    absent, holiday and late counts are bit operations against the holiday
+    calendar's month bitmap rather than per-day comparisons.
+
+    Args:
+        employees (list): (id, name, job_role, holiday_calendar_id) tuples
+        year, month (int): The month to show
+        summaries (iterable): (employee_id, date, status, worked_seconds,
+            late_login) rows for those employees and that month
+        today (date, optional): Days after it are shown as upcoming
+
+    Returns:
+        list: MatrixRow per employee, in the order given
+    """
+    today = today or date.today()
+    days_in_month = calendar.monthrange(year, month)[1]
+    month_start = date(year, month, 1)
+    if today < month_start:
+        elapsed = 0
+    elif (today.year, today.month) == (year, month):
+        elapsed = today.day
+    else:
+        elapsed = days_in_month
+    elapsed_mask = (1 << elapsed) - 1
+
+    # employee_id -> [status by day, worked seconds by day, recorded bits, present bits, late bits]
+    folded = {}
+    for employee_id, day, status, worked, late in summaries:
+        entry = folded.get(employee_id)
+        if entry is None:
+            entry = folded[employee_id] = [[None] * days_in_month, [0] * days_in_month, 0, 0, 0]
+        index = day.day - 1
+        bit = 1 << index
+        entry[0][index] = STATUS_CODES.get(status, 'N')
+        entry[1][index] = worked
+        entry[2] |= bit
+        if status == PRESENT:
+            entry[3] |= bit
+        if late:
+            entry[4] |= bit
+
+    holiday_bitmaps = {}
+    rows = []
+    for employee_id, name, job_role, calendar_id in employees:
+        holidays = holiday_bitmaps.get(calendar_id)
+        if holidays is None:
+            holidays = holiday_bitmaps[calendar_id] = holiday_calendars.get(calendar_id).month_bitmap(year, month)
+        statuses, worked, recorded, present, late = folded.get(employee_id) or (None, None, 0, 0, 0)
+        absent = elapsed_mask & ~holidays & ~recorded
+        cells = []
+        hours = []
+        total_seconds = 0
+        for index in range(days_in_month):
+            bit = 1 << index
+            code = statuses[index] if recorded & bit else None
+            if code is None:
+                code = '.' if index >= elapsed else ('H' if holidays & bit else 'A')
+            cells.append(code)
+            if present & bit:
+                hours.append(round(worked[index] / 3600, 2))
+                total_seconds += worked[index]
+            else:
+                hours.append(None)
+        rows.append(MatrixRow(
+            employee_id, name, job_role, ''.join(cells), hours,
+            [index + 1 for index in range(days_in_month) if late >> index & 1],
+            MatrixTotals(
+                present_days=present.bit_count(),
+                absent_days=absent.bit_count(),
+                holiday_days=(elapsed_mask & holidays & ~recorded).bit_count(),
+                late_days=late.bit_count(),
+                total_hours=round(total_seconds / 3600, 2),
+            ),
+        ))
+    return rows
+
+
+def matrix_page(year, month, page=1, per_page=DEFAULT_PER_PAGE, search=None, job_role=None, today=None):
+    """
+    One page of the organisation-wide matrix: a page of employees plus one
+    query for their month of summaries
+
+    Returns:
+        tuple: (Pagination of employee tuples, list of MatrixRow)
+    """
+    from app.models import Employee
+    query = Employee.query.with_entities(
+        Employee.id, Employee.name, Employee.job_role, Employee.holiday_calendar_id)
+    if search:
+        query = query.filter(Employee.name.ilike(f'%{search}%'))
+    if job_role:
+        query = query.filter(Employee.job_role == job_role)
+    pagination = query.order_by(Employee.name, Employee.id).paginate(
+        page=page, per_page=per_page, max_per_page=MAX_PER_PAGE, error_out=False)
+    employees = pagination.items
+    summaries = fetch_month_summaries([employee[0] for employee in employees], year, month) if employees else []
+    return pagination, build_matrix(employees, year, month, summaries, today)
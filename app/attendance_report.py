@@ -0,0 +1,239 @@
+import calendar
+from datetime import datetime, date, time, timedelta
+from typing import NamedTuple, Optional
+from app import db
+from app.holidays import builtin_calendar, holiday_calendars
+from app.timezones import time_service, utc_to_local, format_time, TIME_12H
+
+# Day statuses
+PRESENT = 'Present'
+CHECKED_IN = 'Checked In'
+ABSENT = 'Absent'
+HOLIDAY = 'Holiday'
+NO_RECORD = 'No Record'
+
+LATE_AFTER = time(9, 30)
+
+
+class DayRow(NamedTuple):
+    """One employee-day of a report; times are in the display zone"""
+    employee_id: int
+    date: date
+    status: str
+    first_checkin: Optional[time]
+    last_checkout: Optional[time]
+    worked_seconds: int
+    late_login: bool
+
+    @property
+    def day_name(self):
+        return calendar.day_name[self.date.weekday()]
+
+    @property
+    def checkin_time(self):
+        return format_time(self.first_checkin, TIME_12H) if self.first_checkin else '-'
+
+    @property
+    def checkout_time(self):
+        return format_time(self.last_checkout, TIME_12H) if self.last_checkout else '-'
+
+    @property
+    def duration(self):
+        if self.status != PRESENT:
+            return '-'
+        hours, minutes = divmod(self.worked_seconds // 60, 60)
+        return f"{hours:02}:{minutes:02}"
+
+    @property
+    def duration_hours(self):
+        if self.status != PRESENT:
+            return 0
+        hours, minutes = divmod(self.worked_seconds // 60, 60)
+        return hours + (minutes / 60)
+
+
+class ReportTotals(NamedTuple):
+    total_days: int
+    holiday_days: int
+    working_days: int
+    present_days: int
+    total_hours: float
+
+
+class EmployeeReport(NamedTuple):
+    rows: list  # DayRow, newest first
+    totals: ReportTotals
+
+
+def fetch_sessions(employee_ids, start_date, end_date):
+    """
+    Load the raw check-in/out sessions for a report in a single query
+
+    Returns:
+        list: (employee_id, date, checkin_time, checkout_time) tuples
+    """
+    from app.models import Attendance
+    return db.session.query(
+        Attendance.employee_id, Attendance.date, Attendance.checkin_time, Attendance.checkout_time
+    ).filter(
+        Attendance.employee_id.in_(list(employee_ids)),
+        Attendance.date >= start_date,
+        Attendance.date <= end_date,
+    ).all()
+
+
+def session_seconds(checkin, checkout):
+    """Seconds between a check-in and check-out on the same day (never negative)"""
+    worked = ((checkout.hour - checkin.hour) * 3600 + (checkout.minute - checkin.minute) * 60
+              + checkout.second - checkin.second)
+    return max(worked, 0)
+
+
+def day_status(first_checkin, open_sessions):
+    """Status of an employee-day that has attendance records"""
+    if first_checkin is None:
+        return NO_RECORD
+    return CHECKED_IN if open_sessions else PRESENT
+
+
+def fold_sessions(sessions):
+    """
+    Fold raw sessions into one entry per employee-day
+
+    Args:
+        sessions (iterable): (employee_id, date, checkin_time, checkout_time)
+            tuples with times stored in UTC
+
+    Returns:
+        dict: (employee_id, date) -> [first checkin, last checkout,
+            worked seconds, open sessions, session count, last checkin]
+    """
+    days = {}
+    for employee_id, day, checkin, checkout in sessions:
+        entry = days.get((employee_id, day))
+        if entry is None:
+            entry = days[(employee_id, day)] = [None, None, 0, 0, 0, None]
+        entry[4] += 1
+        if checkin is not None:
+            if entry[0] is None or checkin < entry[0]:
+                entry[0] = checkin
+            if entry[5] is None or checkin > entry[5]:
+                entry[5] = checkin
+            if checkout is None:
+                entry[3] += 1
+            else:
+                entry[2] += session_seconds(checkin, checkout)
+        if checkout is not None and (entry[1] is None or checkout > entry[1]):
+            entry[1] = checkout
+    return days
+
+
+def fetch_days(employee_ids, start_date, end_date):
+    """
+    Load the daily attendance summaries of a report in a single query
+
+    Returns:
+        dict: keyed and shaped like fold_sessions()
+    """
+    from app.read_models import summary_days
+    return {(row.employee_id, row.date): list(row[2:]) for row in summary_days(employee_ids, start_date, end_date)}
+
+
+def compute_report(sessions, employee_ids, start_date, end_date, **options):
+    """Build per-employee reports from raw sessions, see compute_day_report()"""
+    return compute_day_report(fold_sessions(sessions), employee_ids, start_date, end_date, **options)
+
+
+def compute_day_report(days, employee_ids, start_date, end_date, calendars=None,
+                       timezone=None, late_after=LATE_AFTER):
+    """
+    Build per-employee reports from per-day attendance entries
+
+    Args:
+        days (dict): Entries as returned by fold_sessions() or fetch_days()
+        employee_ids (iterable): Employees to report on
+        start_date (date): First day of the range (inclusive)
+        end_date (date): Last day of the range (inclusive)
+        calendars (dict, optional): employee_id -> CompiledCalendar; employees
+            not in it use the built-in weekly-off calendar
+        timezone (str, optional): Zone the times are displayed in; defaults
+            to the viewer's zone
+        late_after (time): First check-ins after this time in the
+            organisation's zone are late
+
+    Returns:
+        dict: employee_id -> EmployeeReport
+    """
+    display_zone = timezone or time_service.display_zone()
+    org_zone = time_service.default_zone
+
+    # Days of the range, newest first, and their holiday flags per calendar
+    span = (end_date - start_date).days + 1
+    range_days = [end_date - timedelta(days=offset) for offset in range(span)]
+    calendars = calendars or {}
+    flags_by_calendar = {}
+
+    reports = {}
+    for employee_id in employee_ids:
+        holiday_calendar = calendars.get(employee_id, builtin_calendar)
+        cached_flags = flags_by_calendar.get(id(holiday_calendar))
+        if cached_flags is None:
+            holiday_flags = [holiday_calendar.is_holiday(day) for day in range_days]
+            cached_flags = flags_by_calendar[id(holiday_calendar)] = (holiday_flags, sum(holiday_flags))
+        holiday_flags, holiday_days = cached_flags
+        rows = []
+        present_days = 0
+        total_seconds = 0
+        for day, holiday in zip(range_days, holiday_flags):
+            entry = days.get((employee_id, day))
+            if entry is None:
+                rows.append(DayRow(employee_id, day, HOLIDAY if holiday else ABSENT, None, None, 0, False))
+                continue
+            first_checkin, last_checkout, worked, open_sessions = entry[:4]
+            status = day_status(first_checkin, open_sessions)
+            if status == PRESENT:
+                present_days += 1
+                total_seconds += worked
+            local_checkin = utc_to_local(day, first_checkin, display_zone) if first_checkin else None
+            local_checkout = utc_to_local(day, last_checkout, display_zone) if last_checkout and not open_sessions else None
+            if local_checkin is None:
+                late = False
+            elif display_zone == org_zone:
+                late = local_checkin > late_after
+            else:
+                late = utc_to_local(day, first_checkin, org_zone) > late_after
+            rows.append(DayRow(employee_id, day, status, local_checkin, local_checkout, worked, late))
+        totals = ReportTotals(
+            total_days=span,
+            holiday_days=holiday_days,
+            working_days=span - holiday_days,
+            present_days=present_days,
+            total_hours=round(total_seconds / 3600, 2),
+        )
+        reports[employee_id] = EmployeeReport(rows, totals)
+    return reports
+
+
+def build_report(employee_ids, start_date, end_date, **options):
+    """Fetch daily summaries and calendars and compute reports, see compute_day_report()"""
+    employee_ids = list(employee_ids)
+    days = fetch_days(employee_ids, start_date, end_date)
+    options.setdefault('calendars', holiday_calendars.for_employees(employee_ids))
+    return compute_day_report(days, employee_ids, start_date, end_date, **options)
+
+
+def parse_report_range(start_arg, end_arg, today=None):
+    """
+    Parse the start/end query arguments of a report page
+
+    Defaults to the current month up to today and swaps a reversed range.
+
+    Returns:
+        tuple: (start_date, end_date, swapped)
+    """
+    today = today or date.today()
+    start_date = datetime.strptime(start_arg, '%Y-%m-%d').date() if start_arg else today.replace(day=1)
+    end_date = datetime.strptime(end_arg, '%Y-%m-%d').date() if end_arg else today
+    if start_date > end_date:
+        return end_date, start_date, True
+    return start_date, end_date, False
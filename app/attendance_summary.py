@@ -0,0 +1,205 @@
+from datetime import timedelta
+from app import db
+from app.attendance_report import (
+    fetch_sessions, fold_sessions, session_seconds, day_status, LATE_AFTER, PRESENT, CHECKED_IN,
+)
+from app.timezones import time_service, utc_to_local
+
+REBUILD_CHUNK_DAYS = 31
+
+
+def is_late(day, first_checkin):
+    """True if a UTC first check-in is after LATE_AFTER in the organisation's zone"""
+    return first_checkin is not None and utc_to_local(day, first_checkin, time_service.default_zone) > LATE_AFTER
+
+
+def dialect_insert(table):
+    """
+    INSERT construct with ON CONFLICT support for the current database
+
+    Returns None on databases without it; callers fall back to the ORM.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _summary_for_update(employee_id, day, create=True):
+    from app.models import DailyAttendanceSummary as Summary
+    summary = (Summary.query.filter_by(employee_id=employee_id, date=day)
+               .with_for_update().first())
+    if summary is None and create:
+        summary = Summary(employee_id=employee_id, date=day, worked_seconds=0,
+                          session_count=0, open_sessions=0, late_login=False)
+        db.session.add(summary)
+    return summary
+
+
+def record_checkin(employee_id, day, checkin):
+    """
+    Fold a new check-in into the employee-day summary
+
+    Call in the same transaction that adds the Attendance row. On Postgres
+    and SQLite this is one upsert statement.
+
+    Returns:
+        The updated summary (a row or model instance with its columns)
+    """
+    from app.models import DailyAttendanceSummary as Summary
+    late = is_late(day, checkin)
+    insert = dialect_insert(Summary.__table__)
+    if insert is not None:
+        columns = Summary.__table__.c
+        statement = insert.values(
+            employee_id=employee_id, date=day, first_checkin=checkin, last_checkin=checkin,
+            worked_seconds=0, session_count=1, open_sessions=1, late_login=late, status=CHECKED_IN,
+        )
+        earlier = db.or_(columns.first_checkin.is_(None), statement.excluded.first_checkin < columns.first_checkin)
+        later = db.or_(columns.last_checkin.is_(None), statement.excluded.last_checkin > columns.last_checkin)
+        statement = statement.on_conflict_do_update(
+            index_elements=[columns.employee_id, columns.date],
+            set_={
+                'session_count': columns.session_count + 1,
+                'open_sessions': columns.open_sessions + 1,
+                'first_checkin': db.case((earlier, statement.excluded.first_checkin), else_=columns.first_checkin),
+                'late_login': db.case((earlier, statement.excluded.late_login), else_=columns.late_login),
+                'last_checkin': db.case((later, statement.excluded.last_checkin), else_=columns.last_checkin),
+                'status': CHECKED_IN,
+            },
+        ).returning(*columns)
+        return db.session.execute(statement).one()
+
+    summary = _summary_for_update(employee_id, day)
+    summary.session_count += 1
+    summary.open_sessions += 1
+    if summary.first_checkin is None or checkin < summary.first_checkin:
+        summary.first_checkin = checkin
+        summary.late_login = late
+    if summary.last_checkin is None or checkin > summary.last_checkin:
+        summary.last_checkin = checkin
+    summary.status = day_status(summary.first_checkin, summary.open_sessions)
+    return summary
+
+
+def record_checkout(employee_id, day, checkin, checkout):
+    """
+    Fold the closing of an open session into the employee-day summary
+
+    Call in the same transaction that sets Attendance.checkout_time. On
+    Postgres and SQLite this is one UPDATE ... RETURNING statement.
+
+    Returns:
+        The updated summary (a row or model instance with its columns)
+    """
+    from app.models import DailyAttendanceSummary as Summary
+    worked = session_seconds(checkin, checkout) if checkin is not None else 0
+    if dialect_insert(Summary.__table__) is not None:
+        columns = Summary.__table__.c
+        statement = db.update(Summary.__table__).where(
+            columns.employee_id == employee_id, columns.date == day,
+        ).values(
+            open_sessions=db.case((columns.open_sessions > 0, columns.open_sessions - 1), else_=0),
+            worked_seconds=columns.worked_seconds + worked,
+            last_checkout=db.case(
+                (db.or_(columns.last_checkout.is_(None), columns.last_checkout < checkout), checkout),
+                else_=columns.last_checkout),
+            # Evaluated against the pre-update open_sessions
+            status=db.case((columns.open_sessions > 1, CHECKED_IN), else_=PRESENT),
+        ).returning(*columns)
+        summary = db.session.execute(statement).first()
+        # No row: the check-in predates the rollup, so rebuild the day instead
+        return summary if summary is not None else refresh_day(employee_id, day)
+
+    summary = _summary_for_update(employee_id, day, create=False)
+    if summary is None:
+        return refresh_day(employee_id, day)
+    summary.open_sessions = max(summary.open_sessions - 1, 0)
+    summary.worked_seconds += worked
+    if summary.last_checkout is None or checkout > summary.last_checkout:
+        summary.last_checkout = checkout
+    summary.status = day_status(summary.first_checkin, summary.open_sessions)
+    return summary
+
+
+def summary_values(employee_id, day, entry):
+    """Column values of a summary row from a fold_sessions() entry"""
+    first_checkin, last_checkout, worked, open_sessions, session_count, last_checkin = entry
+    return {
+        'employee_id': employee_id,
+        'date': day,
+        'first_checkin': first_checkin,
+        'last_checkin': last_checkin,
+        'last_checkout': last_checkout,
+        'worked_seconds': worked,
+        'session_count': session_count,
+        'open_sessions': open_sessions,
+        'late_login': is_late(day, first_checkin),
+        'status': day_status(first_checkin, open_sessions),
+    }
+
+
+def refresh_day(employee_id, day):
+    """Recompute one employee-day from its raw sessions (after edits or deletes)"""
+    from app.models import DailyAttendanceSummary as Summary
+    entry = fold_sessions(fetch_sessions([employee_id], day, day)).get((employee_id, day))
+    summary = Summary.query.filter_by(employee_id=employee_id, date=day).first()
+    if entry is None:
+        if summary is not None:
+            db.session.delete(summary)
+        return None
+    if summary is None:
+        summary = Summary(employee_id=employee_id, date=day)
+        db.session.add(summary)
+    for name, value in summary_values(employee_id, day, entry).items():
+        setattr(summary, name, value)
+    return summary
+
+
+def rebuild(start_date=None, end_date=None, employee_ids=None, on_progress=None):
+    """
+    Recompute summaries from raw attendance, one chunk of days per transaction
+
+    Args:
+        start_date, end_date (date, optional): Range to rebuild; defaults to
+            all recorded attendance
+        employee_ids (iterable, optional): Limit to these employees
+        on_progress (callable, optional): Called with (chunk_end, rows_written)
+
+    Returns:
+        int: Summary rows written
+    """
+    from app.models import Attendance, DailyAttendanceSummary as Summary
+    if start_date is None or end_date is None:
+        first, last = db.session.query(db.func.min(Attendance.date), db.func.max(Attendance.date)).one()
+        if first is None:
+            return 0
+        start_date = start_date or first
+        end_date = end_date or last
+    if employee_ids is None:
+        employee_ids = [row[0] for row in db.session.query(Attendance.employee_id).distinct()]
+    employee_ids = list(employee_ids)
+    written = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=REBUILD_CHUNK_DAYS - 1), end_date)
+        days = fold_sessions(fetch_sessions(employee_ids, chunk_start, chunk_end))
+        Summary.query.filter(
+            Summary.employee_id.in_(employee_ids),
+            Summary.date >= chunk_start,
+            Summary.date <= chunk_end,
+        ).delete(synchronize_session=False)
+        if days:
+            db.session.execute(db.insert(Summary), [
+                summary_values(employee_id, day, entry) for (employee_id, day), entry in days.items()
+            ])
+        db.session.commit()
+        written += len(days)
+        if on_progress:
+            on_progress(chunk_end, written)
+        chunk_start = chunk_end + timedelta(days=1)
+    return written
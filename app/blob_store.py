@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+import tempfile
+from werkzeug.utils import import_string
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLarge(ValueError):
+    """Raised when a streamed blob exceeds the allowed size"""
+
+
+def blob_key(data):
+    """Return the content-hash key (sha256 hex digest) for some bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_valid_key(key):
+    """True if key looks like a key produced by blob_key()"""
+    return bool(key and KEY_PATTERN.match(key))
+
+
+class BlobStore:
+    """
+    Interface for content-addressed blob storage.
+
+    Blobs are immutable and keyed by the sha256 of their content, so storing
+    the same bytes twice is a no-op and a key can be cached forever.
+    """
+
+    def put(self, data, key=None):
+        """
+        Store bytes and return their key
+
+        key defaults to the content hash; derived blobs (e.g. thumbnails) may
+        pass a key computed from their source blob instead.
+        """
+        raise NotImplementedError
+
+    def put_stream(self, stream, max_bytes=None):
+        """
+        Store the contents of a binary stream and return its key
+
+        Raises:
+            BlobTooLarge: If the stream holds more than max_bytes
+        """
+        data = stream.read(max_bytes + 1 if max_bytes is not None else -1)
+        if max_bytes is not None and len(data) > max_bytes:
+            raise BlobTooLarge(f"Blob exceeds {max_bytes} bytes")
+        return self.put(data)
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def open(self, key):
+        """Return a readable binary file object for a blob"""
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """Return a filesystem path for a blob, or None if the backend is remote"""
+        return None
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under root, sharded by the first two key characters"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        if not is_valid_key(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key)
+
+    def _write(self, write_chunks, key=None):
+        # Write to a temporary file and rename so readers never see a partial blob
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                digest = write_chunks(tmp)
+            key = key or digest
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def put(self, data, key=None):
+        key = key or blob_key(data)
+        if os.path.exists(self._path(key)):
+            return key
+
+        def write_chunks(tmp):
+            tmp.write(data)
+            return key
+        return self._write(write_chunks, key)
+
+    def put_stream(self, stream, max_bytes=None):
+        def write_chunks(tmp):
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise BlobTooLarge(f"Blob exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                tmp.write(chunk)
+            return digest.hexdigest()
+        return self._write(write_chunks)
+
+    def exists(self, key):
+        return is_valid_key(key) and os.path.exists(self._path(key))
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def local_path(self, key):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+BACKENDS = {
+    'local': LocalBlobStore,
+}
+
+
+class BlobStoreProxy:
+    """Application-wide blob store, configured from BLOB_STORE_* settings"""
+
+    def __init__(self):
+        self.backend = None
+        self.durable = False
+
+    def init_app(self, app):
+        """
+        Create the configured backend
+
+        BLOB_STORE_BACKEND is a name from BACKENDS or a dotted import path to
+        a BlobStore subclass; it is constructed with BLOB_STORE_OPTIONS.
+
+        The default local store under the instance folder is not durable: on
+        hosts like Render that folder is lost on every deploy and not shared
+        between instances. Until BLOB_STORE_PATH points at persistent storage
+        (or another backend is configured) profile pictures keep their bytes
+        in the database too, and the store only acts as a cache of them.
+        """
+        name = app.config.get('BLOB_STORE_BACKEND', 'local')
+        backend_class = BACKENDS.get(name) or import_string(name)
+        options = dict(app.config.get('BLOB_STORE_OPTIONS') or {})
+        self.durable = True
+        if backend_class is LocalBlobStore:
+            self.durable = bool(options.get('root') or app.config.get('BLOB_STORE_PATH'))
+            options.setdefault('root', app.config.get('BLOB_STORE_PATH')
+                               or os.path.join(app.instance_path, 'blobs'))
+        self.backend = backend_class(**options)
+
+    def __getattr__(self, name):
+        backend = self.__dict__.get('backend')
+        if backend is None:
+            raise RuntimeError("Blob store is not configured; call init_app() first")
+        return getattr(backend, name)
+
+
+blob_store = BlobStoreProxy()
@@ -0,0 +1,153 @@
+from typing import NamedTuple, Optional
+from datetime import date, time
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.attendance_report import session_seconds
+from app.attendance_summary import record_checkin, record_checkout, dialect_insert, is_late
+from app.live_board import publish_session
+from app.timezones import time_service, utc_now, TIME_12H_SECONDS
+
+MAX_KEY_LENGTH = 64
+
+
+class AttendanceState(NamedTuple):
+    """Everything the attendance pages show about one employee-day (times in UTC)"""
+    date: date
+    first_checkin: Optional[time] = None
+    last_checkin: Optional[time] = None  # Start of the open session while checked in
+    last_checkout: Optional[time] = None
+    worked_seconds: int = 0  # Closed sessions only
+    open_sessions: int = 0
+    late_login: bool = False
+
+    @classmethod
+    def from_summary(cls, summary, day):
+        if summary is None:
+            return cls(day)
+        return cls(day, summary.first_checkin, summary.last_checkin, summary.last_checkout,
+                   summary.worked_seconds, summary.open_sessions, summary.late_login)
+
+    @property
+    def checked_in(self):
+        return self.open_sessions > 0
+
+    def worked_seconds_at(self, now):
+        """Worked time including the running session, as of a UTC datetime"""
+        if not self.checked_in or self.last_checkin is None or now.date() != self.date:
+            return self.worked_seconds
+        return self.worked_seconds + session_seconds(self.last_checkin, now.time())
+
+    def to_dict(self, now=None, zone_name=None, fmt=TIME_12H_SECONDS):
+        now = now or utc_now()
+
+        def local(value):
+            return time_service.format(self.date, value, fmt, zone_name)
+        return {
+            'date': self.date.isoformat(),
+            'checked_in': self.checked_in,
+            'first_checkin': local(self.first_checkin),
+            'checkin': local(self.last_checkin),
+            'checkout': None if self.checked_in else local(self.last_checkout),
+            'worked_seconds': self.worked_seconds_at(now),
+            'late_login': self.late_login,
+        }
+
+
+class CheckinResult(NamedTuple):
+    changed: bool  # False when the request was a repeat or had nothing to do
+    state: AttendanceState
+
+
+def clean_key(key):
+    """Accept a client idempotency key, or None if it is missing or unusable"""
+    key = (key or '').strip()
+    return key if 0 < len(key) <= MAX_KEY_LENGTH else None
+
+
+def attendance_state(employee_id, day):
+    """State of an employee-day, from its summary row (one primary key lookup)"""
+    from app.models import DailyAttendanceSummary as Summary
+    return AttendanceState.from_summary(db.session.get(Summary, (employee_id, day)), day)
+
+
+def check_in(employee_id, key=None, now=None):
+    """
+    Open a session for the employee, atomically and idempotently
+
+    The insert relies on the unique index on open sessions (one per
+    employee-day) and on the unique check-in key, so double submits and
+    retries do nothing. The summary upsert in the same transaction returns
+    the state for the response.
+
+    Returns:
+        CheckinResult
+    """
+    from app.models import Attendance
+    now = now or utc_now()
+    day, checkin = now.date(), now.time()
+    values = dict(employee_id=employee_id, date=day, checkin_time=checkin, checkout_time=None,
+                  late_login=is_late(day, checkin), checkin_key=clean_key(key))
+    insert = dialect_insert(Attendance.__table__)
+    if insert is not None:
+        session_id = db.session.execute(
+            insert.values(**values).on_conflict_do_nothing().returning(Attendance.__table__.c.id)
+        ).scalar()
+    else:
+        try:
+            with db.session.begin_nested():
+                attendance = Attendance(**values)
+                db.session.add(attendance)
+            session_id = attendance.id
+        except IntegrityError:
+            session_id = None
+    if session_id is None:
+        db.session.rollback()
+        return CheckinResult(False, attendance_state(employee_id, day))
+    summary = record_checkin(employee_id, day, checkin)
+    publish_session(db.session, session_id, employee_id, day, checkin, None)
+    db.session.commit()
+    return CheckinResult(True, AttendanceState.from_summary(summary, day))
+
+
+def check_out(employee_id, key=None, now=None):
+    """
+    Close the employee's open session for today, atomically and idempotently
+
+    One UPDATE ... RETURNING closes the (single) open session. A repeated
+    check-out key matches nothing, so a replayed request cannot close a
+    session opened after it.
+
+    Returns:
+        CheckinResult
+    """
+    from app.models import Attendance
+    now = now or utc_now()
+    day, checkout = now.date(), now.time()
+    key = clean_key(key)
+    table = Attendance.__table__
+    columns = table.c
+    statement = db.update(table).where(
+        columns.employee_id == employee_id,
+        columns.date == day,
+        columns.checkout_time.is_(None),
+    ).values(checkout_time=checkout, checkout_key=key)
+    if key is not None:
+        previous = table.alias('previous')
+        statement = statement.where(~db.exists().where(previous.c.checkout_key == key))
+    if dialect_insert(table) is not None:
+        closed = db.session.execute(statement.returning(columns.id, columns.checkin_time)).first()
+    else:
+        session = (Attendance.query.filter_by(employee_id=employee_id, date=day, checkout_time=None)
+                   .with_for_update().first())
+        if session is not None and (key is None or not Attendance.query.filter_by(checkout_key=key).count()):
+            session.checkout_time, session.checkout_key = checkout, key
+            closed = session
+        else:
+            closed = None
+    if closed is None:
+        db.session.rollback()
+        return CheckinResult(False, attendance_state(employee_id, day))
+    summary = record_checkout(employee_id, day, closed.checkin_time, checkout)
+    publish_session(db.session, closed.id, employee_id, day, closed.checkin_time, checkout)
+    db.session.commit()
+    return CheckinResult(True, AttendanceState.from_summary(summary, day))
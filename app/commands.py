@@ -0,0 +1,452 @@
+import click
+from datetime import date
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+from app import db
+
+hash_policy_cli = AppGroup('hash-policy', help='Manage password hashing policies.')
+blobs_cli = AppGroup('blobs', help='Manage the profile picture blob store.')
+reports_cli = AppGroup('reports', help='Attendance report tools.')
+holidays_cli = AppGroup('holidays', help='Manage holiday calendars.')
+db_cli = AppGroup('db', help='Database schema migrations.')
+api_tokens_cli = AppGroup('api-tokens', help='Manage JSON API tokens.')
+
+
+def _refuse_weaker_policy(method):
+    from app import hash_policy
+    active = hash_policy.current_policy(refresh=True)
+    for floor in (active.method, hash_policy.DEFAULT_METHOD):
+        if hash_policy.is_weaker(method, floor):
+            raise click.ClickException(
+                f'{method} is weaker than {floor}; refusing to activate it. '
+                'Raise the target latency or run calibration on the production host.')
+
+
+@hash_policy_cli.command('calibrate')
+@click.option('--target-ms', type=float, default=None,
+              help='Target verify latency in milliseconds (default: HASH_TARGET_VERIFY_MS).')
+@click.option('--algorithm', default='sha256', show_default=True, help='PBKDF2 hash algorithm.')
+@click.option('--activate/--dry-run', default=False,
+              help='Activate the new policy, or only print the measurement.')
+def calibrate_command(target_ms, algorithm, activate):
+    """Benchmark this host and create a policy for the target verify latency."""
+    from app import hash_policy
+    from app.models import HashPolicy
+    if target_ms is None:
+        target_ms = current_app.config.get('HASH_TARGET_VERIFY_MS', 250)
+    min_iterations = current_app.config.get('HASH_MIN_ITERATIONS', hash_policy.DEFAULT_PBKDF2_ITERATIONS)
+    method, measured_ms = hash_policy.calibrate(target_ms, algorithm, min_iterations)
+    click.echo(f'{method}: {measured_ms:.1f} ms per verify (target {target_ms:.0f} ms)')
+    if not activate:
+        click.echo('Dry run, nothing saved. Re-run with --activate to use this policy.')
+        return
+    _refuse_weaker_policy(method)
+    HashPolicy.query.filter_by(is_active=True).update({'is_active': False})
+    policy = HashPolicy(method=method, target_ms=target_ms, measured_ms=measured_ms, is_active=True)
+    db.session.add(policy)
+    db.session.commit()
+    hash_policy.invalidate_policy_cache()
+    click.echo(f'Activated policy version {policy.id}. Hashes are upgraded on each user\'s next login.')
+
+
+@hash_policy_cli.command('activate')
+@click.argument('version', type=int)
+def activate_command(version):
+    """Make an existing policy VERSION the active one."""
+    from app import hash_policy
+    from app.models import HashPolicy
+    policy = HashPolicy.query.get(version)
+    if not policy:
+        raise click.ClickException(f'No hashing policy with version {version}.')
+    _refuse_weaker_policy(policy.method)
+    HashPolicy.query.filter(HashPolicy.id != version).update({'is_active': False})
+    policy.is_active = True
+    db.session.commit()
+    hash_policy.invalidate_policy_cache()
+    click.echo(f'Activated policy version {version} ({policy.method}).')
+
+
+@hash_policy_cli.command('show')
+def show_command():
+    """List policies and how many users' hashes use each one."""
+    from app import hash_policy
+    from app.models import HashPolicy, User
+    active = hash_policy.current_policy(refresh=True)
+    counts = dict(
+        db.session.query(User.hash_policy_version, func.count(User.id))
+        .group_by(User.hash_policy_version).all()
+    )
+    click.echo(f'Active: version {active.version} ({active.method})')
+    click.echo(f'  v0  {hash_policy.DEFAULT_METHOD:<28} built-in default   users: {counts.pop(0, 0)}')
+    for policy in HashPolicy.query.order_by(HashPolicy.id).all():
+        marker = '*' if policy.is_active else ' '
+        measured = f'{policy.measured_ms:.1f} ms' if policy.measured_ms is not None else '-'
+        click.echo(f'{marker} v{policy.id:<3}{policy.method:<28} {measured:<18} users: {counts.pop(policy.id, 0)}')
+    if counts.get(None):
+        click.echo(f'  unversioned hashes (upgraded on next login): {counts[None]}')
+
+
+@blobs_cli.command('migrate-profile-pics')
+@click.option('--batch-size', default=50, show_default=True, help='Pictures moved per transaction.')
+@click.option('--keep-original', is_flag=True, help='Leave the bytes in employee.profile_pic as well.')
+def migrate_profile_pics_command(batch_size, keep_original):
+    """Move profile pictures out of the employee table into the blob store."""
+    from app.blob_store import blob_store
+    from app.models import Employee
+    if not keep_original and not blob_store.durable:
+        raise click.ClickException(
+            'The blob store is the default folder under the instance path, which is not persistent '
+            'on most hosts. Set BLOB_STORE_PATH to persistent storage, or pass --keep-original.')
+    pending_ids = [row.id for row in db.session.query(Employee.id).filter(
+        Employee.profile_pic.isnot(None), Employee.profile_pic_key.is_(None)
+    ).order_by(Employee.id)]
+    moved = 0
+    for start in range(0, len(pending_ids), batch_size):
+        batch = (Employee.query.options(Employee.with_blobs())
+                 .filter(Employee.id.in_(pending_ids[start:start + batch_size])).all())
+        for employee in batch:
+            employee.profile_pic_key = blob_store.put(employee.profile_pic)
+            if not keep_original:
+                employee.profile_pic = None
+        db.session.commit()
+        # Drop the loaded blobs before fetching the next batch
+        db.session.expunge_all()
+        moved += len(batch)
+        click.echo(f'Moved {moved}/{len(pending_ids)} profile pictures')
+    click.echo(f'Done. {moved} profile pictures now served from the blob store.')
+
+
+@blobs_cli.command('build-variants')
+def build_variants_command():
+    """Render missing size variants for every stored profile picture."""
+    from app.models import Employee
+    from app.thumbnails import variant_worker
+    if not variant_worker.available:
+        raise click.ClickException('Pillow is not installed; cannot render variants.')
+    keys = [row.profile_pic_key for row in db.session.query(Employee.profile_pic_key)
+            .filter(Employee.profile_pic_key.isnot(None)).distinct()]
+    written = 0
+    for key in keys:
+        written += variant_worker.build_variants(key)
+    click.echo(f'Rendered {written} variants for {len(keys)} pictures (sizes: {variant_worker.sizes}).')
+
+
+@reports_cli.command('rebuild-summaries')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First day to rebuild (default: earliest attendance).')
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day to rebuild (default: latest attendance).')
+@click.option('--employee', 'employee_ids', type=int, multiple=True, help='Only rebuild these employee ids.')
+def rebuild_summaries_command(start_date, end_date, employee_ids):
+    """Recompute the daily attendance summaries from raw check-ins."""
+    from app import attendance_summary
+    written = attendance_summary.rebuild(
+        start_date.date() if start_date else None,
+        end_date.date() if end_date else None,
+        employee_ids or None,
+        on_progress=lambda day, rows: click.echo(f'  through {day}: {rows} employee-days'),
+    )
+    click.echo(f'Rebuilt {written} daily summaries.')
+
+
+@reports_cli.command('bench')
+@click.option('--employees', default=100, show_default=True, help='Employees in the synthetic report.')
+@click.option('--days', default=365, show_default=True, help='Length of the date range.')
+@click.option('--repeat', default=3, show_default=True, help='Runs to take the best time from.')
+def bench_reports_command(employees, days, repeat):
+    """Benchmark the attendance report engine on synthetic sessions (no database)."""
+    import random
+    import time as timer
+    from datetime import date, time, timedelta
+    from app.attendance_report import compute_report
+    from app.holidays import builtin_calendar
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    rng = random.Random(42)
+    sessions = []
+    for employee_id in range(1, employees + 1):
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            if builtin_calendar.is_holiday(day) or rng.random() < 0.05:
+                continue
+            checkin = time(3, rng.randrange(0, 60), rng.randrange(0, 60))
+            sessions.append((employee_id, day, checkin, time(12, rng.randrange(0, 60))))
+    employee_ids = list(range(1, employees + 1))
+    best = None
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        compute_report(sessions, employee_ids, start_date, end_date)
+        elapsed = timer.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    rows = employees * days
+    click.echo(f'{employees} employees x {days} days, {len(sessions)} sessions: '
+               f'{best * 1000:.1f} ms ({rows / best:,.0f} employee-days/s)')
+
+
+@reports_cli.command('bench-reads')
+@click.option('--rows', default=20000, show_default=True, help='Leave requests in the synthetic table.')
+@click.option('--repeat', default=3, show_default=True, help='Runs to take the best time from.')
+def bench_reads_command(rows, repeat):
+    """Compare ORM entities with read_models projections on an in-memory database."""
+    import time as timer
+    import tracemalloc
+    from datetime import date, timedelta
+    import sqlalchemy as sa
+    from sqlalchemy.orm import Session, joinedload
+    from app.models import User, Employee, LeaveRequest
+    from app.read_models import leave_select, LeaveRow
+    engine = sa.create_engine('sqlite://')
+    tables = [User.__table__, Employee.__table__, LeaveRequest.__table__]
+    db.metadata.create_all(engine, tables=tables)
+    employees = max(rows // 20, 1)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': n, 'username': f'user{n}', 'password': '-', 'role': 'employee'} for n in range(1, employees + 1)])
+        connection.execute(Employee.__table__.insert(), [
+            {'id': n, 'name': f'Employee {n}', 'gender': 'Other', 'address': '-', 'phone_number': '-',
+             'unique_id_number': f'ID{n}', 'user_id': n} for n in range(1, employees + 1)])
+        connection.execute(LeaveRequest.__table__.insert(), [
+            {'employee_id': n % employees + 1, 'leave_type': 'Casual', 'reason': 'Bench', 'status': 'Pending',
+             'start_date': date(2025, 1, 1) + timedelta(days=n % 365),
+             'end_date': date(2025, 1, 2) + timedelta(days=n % 365), 'request_date': date(2025, 1, 1)}
+            for n in range(rows)])
+
+    def orm_entities(session):
+        # What the listing did before: entities, then copy the shown fields
+        return [(leave.id, leave.employee.name, leave.leave_type, leave.start_date, leave.end_date,
+                 leave.reason, leave.status)
+                for leave in session.query(LeaveRequest).options(joinedload(LeaveRequest.employee))]
+
+    def projections(session):
+        return [LeaveRow._make(row) for row in session.execute(leave_select())]
+
+    for label, load in (('ORM entities', orm_entities), ('Projections', projections)):
+        best = None
+        for _ in range(repeat):
+            with Session(engine) as session:
+                started = timer.perf_counter()
+                load(session)
+                elapsed = timer.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        with Session(engine) as session:
+            tracemalloc.start()
+            result = load(session)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del result
+        click.echo(f'{label:>13}: {best * 1000:8.1f} ms, peak {peak / 1024 / 1024:6.1f} MiB for {rows} rows')
+    engine.dispose()
+
+
+def _find_calendar(name):
+    from app.models import HolidayCalendar
+    if name is None:
+        calendar = HolidayCalendar.query.filter_by(is_default=True).first()
+        if not calendar:
+            raise click.ClickException('No default calendar; create one with `flask holidays create-calendar --default`.')
+        return calendar
+    calendar = HolidayCalendar.query.filter_by(name=name).first()
+    if not calendar:
+        raise click.ClickException(f'No holiday calendar named {name!r}.')
+    return calendar
+
+
+@holidays_cli.command('create-calendar')
+@click.argument('name')
+@click.option('--region', default=None, help='Region or office the calendar applies to.')
+@click.option('--weekly-offs', default='SUN,SAT2', show_default=True,
+              help='Weekly-off rules, e.g. SUN,SAT2 or SAT,SUN.')
+@click.option('--default', 'is_default', is_flag=True, help='Use for employees without a calendar.')
+def create_calendar_command(name, region, weekly_offs, is_default):
+    """Create a holiday calendar NAME."""
+    from app.holidays import parse_weekly_offs
+    from app.invalidation import invalidation_bus, HOLIDAY_CALENDAR
+    from app.models import HolidayCalendar
+    try:
+        parse_weekly_offs(weekly_offs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if is_default:
+        HolidayCalendar.query.filter_by(is_default=True).update({'is_default': False})
+    db.session.add(HolidayCalendar(name=name, region=region, weekly_offs=weekly_offs.upper(), is_default=is_default))
+    invalidation_bus.changed(db.session, HOLIDAY_CALENDAR)
+    db.session.commit()
+    click.echo(f'Created calendar {name!r} (weekly offs {weekly_offs.upper()}).')
+
+
+@holidays_cli.command('add')
+@click.argument('day', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('name')
+@click.option('--calendar', 'calendar_name', default=None, help='Calendar name (default calendar if omitted).')
+def add_holiday_command(day, name, calendar_name):
+    """Add a public holiday on DAY (YYYY-MM-DD)."""
+    from app.invalidation import invalidation_bus, HOLIDAY_CALENDAR
+    from app.models import Holiday
+    calendar = _find_calendar(calendar_name)
+    db.session.add(Holiday(calendar_id=calendar.id, date=day.date(), name=name))
+    invalidation_bus.changed(db.session, HOLIDAY_CALENDAR)
+    db.session.commit()
+    click.echo(f'Added {name!r} on {day.date()} to {calendar.name!r}.')
+
+
+@holidays_cli.command('remove')
+@click.argument('day', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--calendar', 'calendar_name', default=None, help='Calendar name (default calendar if omitted).')
+def remove_holiday_command(day, calendar_name):
+    """Remove the public holiday on DAY (YYYY-MM-DD)."""
+    from app.invalidation import invalidation_bus, HOLIDAY_CALENDAR
+    from app.models import Holiday
+    calendar = _find_calendar(calendar_name)
+    deleted = Holiday.query.filter_by(calendar_id=calendar.id, date=day.date()).delete()
+    invalidation_bus.changed(db.session, HOLIDAY_CALENDAR)
+    db.session.commit()
+    click.echo(f'Removed {deleted} holiday(s) from {calendar.name!r}.')
+
+
+@holidays_cli.command('list')
+@click.option('--calendar', 'calendar_name', default=None, help='Calendar name (default calendar if omitted).')
+@click.option('--year', type=int, default=None, help='Only show holidays in this year.')
+def list_holidays_command(calendar_name, year):
+    """List a calendar's public holidays."""
+    from app.models import Holiday
+    calendar = _find_calendar(calendar_name)
+    query = Holiday.query.filter_by(calendar_id=calendar.id)
+    if year:
+        query = query.filter(Holiday.date >= date(year, 1, 1), Holiday.date <= date(year, 12, 31))
+    click.echo(f'{calendar.name} (region: {calendar.region or "-"}, weekly offs: {calendar.weekly_offs})')
+    for holiday in query.order_by(Holiday.date).all():
+        click.echo(f'  {holiday.date}  {holiday.name}')
+
+
+@holidays_cli.command('assign')
+@click.argument('calendar_name')
+@click.argument('employee_ids', nargs=-1, type=int, required=True)
+def assign_calendar_command(calendar_name, employee_ids):
+    """Assign CALENDAR_NAME to the given employee ids."""
+    from app.invalidation import invalidation_bus, EMPLOYEE
+    from app.models import Employee
+    calendar = _find_calendar(calendar_name)
+    updated = Employee.query.filter(Employee.id.in_(employee_ids)).update(
+        {'holiday_calendar_id': calendar.id}, synchronize_session=False)
+    invalidation_bus.changed(db.session, EMPLOYEE, *employee_ids)
+    db.session.commit()
+    click.echo(f'Assigned {calendar.name!r} to {updated} employee(s).')
+
+
+@api_tokens_cli.command('create')
+@click.argument('username')
+@click.option('--name', default='API client', show_default=True, help='Label for the token, e.g. the device.')
+@click.option('--days', type=int, default=None,
+              help='Lifetime in days (default: API_TOKEN_LIFETIME_DAYS; 0 never expires).')
+def create_api_token_command(username, name, days):
+    """Issue a bearer token for USERNAME and print it once."""
+    from datetime import timedelta
+    from app.api_tokens import issue_token
+    from app.models import User
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f'No user named {username!r}.')
+    if days is None:
+        days = current_app.config.get('API_TOKEN_LIFETIME_DAYS', 90)
+    record, token = issue_token(user, name, timedelta(days=days) if days else None)
+    expires = record.expires_at.strftime('%Y-%m-%d') if record.expires_at else 'never'
+    click.echo(f'Token {record.id} for {username} (expires {expires}). It will not be shown again:')
+    click.echo(token)
+
+
+@api_tokens_cli.command('list')
+@click.option('--user', 'username', default=None, help='Only show this user\'s tokens.')
+def list_api_tokens_command(username):
+    """List API tokens (never the tokens themselves)."""
+    from app.models import ApiToken, User
+    query = db.session.query(ApiToken, User.username).join(User, User.id == ApiToken.user_id)
+    if username:
+        query = query.filter(User.username == username)
+    for token, owner in query.order_by(ApiToken.id).all():
+        state = 'revoked' if token.revoked else f'expires {token.expires_at:%Y-%m-%d}' if token.expires_at else 'active'
+        used = f'{token.last_used_at:%Y-%m-%d %H:%M}' if token.last_used_at else 'never'
+        click.echo(f'  {token.id:>4}  {owner:<20} {token.name:<24} {state:<18} last used {used}')
+
+
+@api_tokens_cli.command('revoke')
+@click.argument('token_ids', nargs=-1, type=int, required=True)
+def revoke_api_tokens_command(token_ids):
+    """Revoke the tokens with the given ids."""
+    from app.models import ApiToken
+    revoked = ApiToken.query.filter(ApiToken.id.in_(token_ids)).update(
+        {'revoked': True}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f'Revoked {revoked} token(s).')
+
+
+def _echo_migration(migration):
+    click.echo(f'  {migration.version:04d}  {migration.description}')
+
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this version (default: latest).')
+def db_upgrade_command(target):
+    """Apply pending schema migrations."""
+    from app import migrations
+    click.echo('Applying migrations:')
+    applied = migrations.upgrade(target, on_apply=_echo_migration)
+    if not applied:
+        click.echo('  nothing to do')
+    click.echo(f'Database is at version {migrations.current_version()}.')
+
+
+@db_cli.command('downgrade')
+@click.option('--to', 'target', type=int, required=True, help='Version to return to.')
+def db_downgrade_command(target):
+    """Revert migrations above a version."""
+    from app import migrations
+    click.echo('Reverting migrations:')
+    try:
+        reverted = migrations.downgrade(target, on_apply=_echo_migration)
+    except migrations.MigrationError as e:
+        raise click.ClickException(str(e))
+    if not reverted:
+        click.echo('  nothing to do')
+    click.echo(f'Database is at version {migrations.current_version()}.')
+
+
+@db_cli.command('stamp')
+@click.argument('version', type=int)
+def db_stamp_command(version):
+    """Mark migrations up to VERSION as applied without running them."""
+    from app import migrations
+    migrations.stamp(version)
+    click.echo(f'Database stamped at version {migrations.current_version()}.')
+
+
+@db_cli.command('status')
+def db_status_command():
+    """Show applied and pending migrations."""
+    from app import migrations
+    applied = migrations.applied_versions()
+    for migration in migrations.load_migrations():
+        state = 'applied' if migration.version in applied else 'pending'
+        click.echo(f'{migration.version:04d}  {state:<8} {migration.description}')
+
+
+@db_cli.command('verify')
+def db_verify_command():
+    """Check for pending migrations and missing indexes; exits non-zero on problems."""
+    from app import migrations
+    problems = migrations.check_schema()
+    for problem in problems:
+        click.echo(f'- {problem}')
+    if problems:
+        raise click.ClickException('Database schema is out of date.')
+    click.echo(f'Schema is up to date (version {migrations.current_version()}).')
+
+
+def register_commands(app):
+    """Attach the project's CLI command groups to the app"""
+    app.cli.add_command(hash_policy_cli)
+    app.cli.add_command(blobs_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(holidays_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(api_tokens_cli)
@@ -0,0 +1,114 @@
+import threading
+import time
+from typing import NamedTuple
+from app import db
+from app.invalidation import invalidation_bus, EMPLOYEE, USER, LEAVE_REQUEST
+
+EMPLOYEES = 'employees'
+USERS = 'users'
+PENDING_LEAVES = 'pending_leaves'
+
+
+def _count_employees():
+    from app.models import Employee
+    return db.session.query(db.func.count(Employee.id)).scalar()
+
+
+def _count_users():
+    from app.models import User
+    return db.session.query(db.func.count(User.id)).scalar()
+
+
+def _count_pending_leaves():
+    from app.models import LeaveRequest
+    return db.session.query(db.func.count(LeaveRequest.id)).filter(LeaveRequest.status == 'Pending').scalar()
+
+
+COUNTERS = {
+    EMPLOYEES: _count_employees,
+    USERS: _count_users,
+    PENDING_LEAVES: _count_pending_leaves,
+}
+
+
+class DashboardCounts(NamedTuple):
+    employees: int
+    users: int
+    pending_leaves: int
+    late_today: int  # From the presence index, which follows check-ins itself
+
+
+class DashboardMetrics:
+    """
+    The HR and admin dashboard counters, cached per process.
+
+    A counter is recounted on the next read after the invalidation bus
+    reports a change to its entity (from any worker with the 'postgres'
+    event bus backend). Each counter is also recounted every
+    DASHBOARD_RECONCILE_SECONDS, which corrects drift from changes made
+    without an invalidation event (shell scripts, bulk updates, other
+    workers with the 'local' backend).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.reconcile_seconds = 60
+        self._lock = threading.Lock()
+        self._values = {}  # counter -> (value, counted at)
+        self._generations = dict.fromkeys(COUNTERS, 0)  # Bumped by every invalidation
+
+    def init_app(self, app):
+        self.enabled = app.config.get('DASHBOARD_METRICS_ENABLED', True)
+        self.reconcile_seconds = app.config.get('DASHBOARD_RECONCILE_SECONDS', self.reconcile_seconds)
+        invalidation_bus.subscribe(EMPLOYEE, self._employees_changed)
+        invalidation_bus.subscribe(USER, self._users_changed)
+        invalidation_bus.subscribe(LEAVE_REQUEST, self._leaves_changed)
+
+    def invalidate(self, counter):
+        """Recount a counter on its next read"""
+        with self._lock:
+            self._generations[counter] += 1
+            self._values.pop(counter, None)
+
+    def _employees_changed(self, ids):
+        self.invalidate(EMPLOYEES)
+
+    def _users_changed(self, ids):
+        self.invalidate(USERS)
+
+    def _leaves_changed(self, ids):
+        self.invalidate(PENDING_LEAVES)
+
+    def reset(self):
+        """Recount everything on the next read"""
+        with self._lock:
+            for counter in COUNTERS:
+                self._generations[counter] += 1
+            self._values.clear()
+
+    def get(self, counter):
+        """Current value of a counter, counting it if stale"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(counter)
+            generation = self._generations[counter]
+        if self.enabled and cached and now - cached[1] < self.reconcile_seconds:
+            return cached[0]
+        value = COUNTERS[counter]()
+        with self._lock:
+            # An invalidation that raced with the count may not be in it; keep it stale
+            if self._generations[counter] == generation:
+                self._values[counter] = (value, now)
+        return value
+
+    def counts(self):
+        from app.presence import presence
+        return DashboardCounts(
+            employees=self.get(EMPLOYEES),
+            users=self.get(USERS),
+            pending_leaves=self.get(PENDING_LEAVES),
+            late_today=presence.counts().late,
+        )
+
+
+dashboard_metrics = DashboardMetrics()
@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, abort
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, abort, current_app
 from werkzeug.utils import secure_filename
+import mimetypes
 import os
 import io
+from app import db
 from app.models import Employee, User
+from app.identity import current_identity
+from app.invalidation import invalidation_bus, USER, EMPLOYEE
+from app.blob_store import blob_store, blob_key, is_valid_key, BlobTooLarge
+from app.thumbnails import variant_worker, variant_key, verify_image, VARIANT_MIMETYPE, IMAGE_MIMETYPES, IMAGE_CSP
+from app.timezones import time_service, is_valid_zone, zone_choices
 from functools import wraps
 
 # Authentication decorator
@@ -35,65 +42,161 @@ employee = Blueprint('employee', __name__)
 @employee.route('/profile_pic/<int:employee_id>')
 @login_required
 def employee_profile_pic(employee_id):
+    """Redirect to the content-addressed URL of an employee's profile picture"""
+    size = request.args.get('size', type=int)
     employee = Employee.query.get_or_404(employee_id)
-    if not employee.profile_pic:
+    if employee.profile_pic_key:
+        return redirect(employee.profile_pic_url_for(size))
+    # Pictures uploaded before the blob store existed are served from the
+    # database until `flask blobs migrate-profile-pics` moves them
+    if employee.profile_pic is None:
         abort(404)
-    return send_file(
+    # Old uploads stored the browser-supplied mimetype; only image types are served as such
+    mimetype = employee.profile_pic_mimetype or 'image/jpeg'
+    response = send_file(
         io.BytesIO(employee.profile_pic),
-        mimetype=employee.profile_pic_mimetype,
+        mimetype=mimetype if mimetype in IMAGE_MIMETYPES else 'application/octet-stream',
+        download_name='profile',
+        etag=blob_key(employee.profile_pic),
+        conditional=True,
+        max_age=60
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return harden_image_response(response)
+
+def harden_image_response(response):
+    """Stop browsers from sniffing a picture into a document or running anything in it"""
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = IMAGE_CSP
+    return response
+
+def restore_blob(key):
+    """
+    Put a profile picture back into a non-durable blob store from its database copy
+
+    Returns:
+        bool: True if the blob exists now
+    """
+    if blob_store.durable:
+        return False
+    data = db.session.query(Employee.profile_pic).filter(
+        Employee.profile_pic_key == key, Employee.profile_pic.isnot(None)).limit(1).scalar()
+    if data is None:
+        return False
+    blob_store.put(data)
+    return True
+
+def send_blob(key, mimetype, download_name, immutable=True):
+    """Send a blob by path with a strong ETag and conditional GET support"""
+    # Serving by path lets the WSGI server use sendfile instead of copying
+    source = blob_store.local_path(key) or blob_store.open(key)
+    response = send_file(
+        source,
+        mimetype=mimetype,
         as_attachment=False,
-        download_name=f"profile_{employee_id}.jpg"
+        download_name=download_name,
+        etag=key,
+        conditional=True,
+        max_age=31536000 if immutable else 60
     )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    # The URL changes whenever the content does, so browsers never need to revalidate
+    response.cache_control.immutable = immutable
+    return harden_image_response(response)
+
+@employee.route('/media/profile_pics/<key>.<ext>')
+@login_required
+def profile_pic_blob(key, ext):
+    """Serve a profile picture (or a ?size= variant of it) from the blob store"""
+    # The type comes from the upload's sniffed content; the URL's extension must agree with it
+    mimetype = mimetypes.guess_type(f'blob.{ext}')[0]
+    if not is_valid_key(key) or mimetype not in IMAGE_MIMETYPES:
+        abort(404)
+    stored = db.session.query(Employee.id).filter(
+        Employee.profile_pic_key == key, Employee.profile_pic_mimetype == mimetype).limit(1).scalar()
+    if stored is None or not (blob_store.exists(key) or restore_blob(key)):
+        abort(404)
+    size = request.args.get('size', type=int)
+    if size and variant_worker.available:
+        variant_size = variant_worker.nearest_size(size)
+        variant = variant_key(key, variant_size)
+        if blob_store.exists(variant):
+            return send_blob(variant, VARIANT_MIMETYPE, f"profile_{variant_size}.webp")
+        # Not rendered yet: serve the original with a short cache so the variant is picked up soon
+        variant_worker.enqueue(key)
+        return send_blob(key, mimetype, f"profile.{ext}", immutable=False)
+    return send_blob(key, mimetype, f"profile.{ext}")
 
 @employee.app_context_processor
 def inject_profile_pic_url():
-    user_id = session.get('user_id')
+    identity = current_identity()
     profile_pic_url = None
-    if user_id:
-        employee_obj = Employee.query.filter_by(user_id=user_id).first()
-        if employee_obj and employee_obj.profile_pic:
-            profile_pic_url = url_for('employee.employee_profile_pic', employee_id=employee_obj.id)
+    if identity and identity.has_profile_pic:
+        # 160px covers the 70-90px avatars on high-DPI screens
+        profile_pic_url = (identity.employee.profile_pic_url_for(160)
+                           or url_for('employee.employee_profile_pic', employee_id=identity.employee_id, size=160))
     return dict(profile_pic_url=profile_pic_url)
 
 @employee.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 @role_required(['employee'])
 def employee_edit_profile():
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
-    employee_obj = Employee.query.filter_by(user_id=user_id).first()
-    profile_pic_url = url_for('employee.employee_profile_pic', employee_id=employee_obj.id) if employee_obj and employee_obj.profile_pic else None
+    identity = current_identity()
+    user = identity.user
+    employee_obj = identity.employee
+    profile_pic_url = inject_profile_pic_url()['profile_pic_url']
 
     if request.method == 'POST':
-        employee_obj.phone_number = request.form.get('phone_number')
-        employee_obj.address = request.form.get('address')
         file = request.files.get('profile_pic')
         if file and file.filename:
-            employee_obj.profile_pic = file.read()
-            employee_obj.profile_pic_mimetype = file.mimetype
-        from app import db
+            # Trust the file's content, not the browser-supplied mimetype
+            mimetype = verify_image(file.stream)
+            if not mimetype:
+                flash('Profile picture must be a JPEG, PNG, GIF or WebP image.', 'danger')
+                return redirect(url_for('employee.employee_edit_profile'))
+            max_bytes = current_app.config.get('PROFILE_PIC_MAX_BYTES')
+            try:
+                key = blob_store.put_stream(file.stream, max_bytes=max_bytes)
+            except BlobTooLarge:
+                flash(f'Profile picture must be smaller than {max_bytes / (1024 * 1024):g} MB.', 'danger')
+                return redirect(url_for('employee.employee_edit_profile'))
+            employee_obj.profile_pic_key = key
+            employee_obj.profile_pic_mimetype = mimetype
+            # Without persistent blob storage the database copy is the one that survives a deploy
+            file.stream.seek(0)
+            employee_obj.profile_pic = None if blob_store.durable else file.stream.read()
+            variant_worker.enqueue(key)
+        timezone = request.form.get('timezone') or None
+        if timezone and not is_valid_zone(timezone):
+            flash('Please choose a valid timezone.', 'danger')
+            return redirect(url_for('employee.employee_edit_profile'))
+        user.timezone = None if timezone == time_service.default_zone else timezone
+        employee_obj.phone_number = request.form.get('phone_number')
+        employee_obj.address = request.form.get('address')
+        invalidation_bus.changed(db.session, EMPLOYEE, employee_obj.id)
+        invalidation_bus.changed(db.session, USER, user.id)
         db.session.commit()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('employee.employee_profile'))
 
-    return render_template('employee/profile_edit.html', user=user, employee=employee_obj, profile_pic_url=profile_pic_url)
+    return render_template('employee/profile_edit.html', user=user, employee=employee_obj, profile_pic_url=profile_pic_url,
+                           timezones=zone_choices(), current_timezone=user.timezone or time_service.default_zone)
 
 @employee.route('/profile')
 @login_required
 @role_required(['employee'])
 def employee_profile():
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
-    employee_obj = Employee.query.filter_by(user_id=user_id).first()
-    return render_template('employee/profile.html', user=user, employee=employee_obj)
+    identity = current_identity()
+    return render_template('employee/profile.html', user=identity.user, employee=identity.employee)
 
 @employee.route('/change_password', methods=['GET', 'POST'])
 @login_required
 @role_required(['employee'])
 def change_password():
     """Allow employees to change their password from temporary to permanent"""
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
+    user = current_identity().user
     
     if request.method == 'POST':
         current_password = request.form.get('current_password')
@@ -117,9 +220,9 @@ def change_password():
         
         # Set new password (this will hash it automatically)
         user.set_password(new_password)
+        invalidation_bus.changed(db.session, USER, user.id)
         
         # Commit to database
-        from app import db
         db.session.commit()
         
         flash('Password changed successfully! You can now use your new password for future logins.', 'success')
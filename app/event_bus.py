@@ -0,0 +1,245 @@
+import collections
+import itertools
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from typing import NamedTuple
+from sqlalchemy import event as sa_event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('local', 'postgres')
+NOTIFY_CHANNEL = 'hrms_events'
+NOTIFY_MAX_BYTES = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+PENDING_KEY = 'event_bus_pending'
+
+
+class Event(NamedTuple):
+    id: str  # '<process token>-<sequence>', the SSE event id
+    channel: str
+    payload: dict
+
+
+class Subscription:
+    """A subscriber's queue; overflowed is set when events had to be dropped"""
+
+    def __init__(self, channels, max_queue):
+        self.channels = frozenset(channels)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """Next event, or None after timeout seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """
+    Publishes small JSON events to subscribers in this process.
+
+    publish() is transactional: events are held on the SQLAlchemy session
+    and delivered when it commits (dropped on rollback), so subscribers never
+    see a change that did not happen. With the 'postgres' backend they are
+    sent with NOTIFY inside the transaction instead and a LISTEN thread in
+    each worker process delivers them, so subscribers on every worker see
+    every event.
+
+    Each process keeps the last EVENT_BUS_BUFFER events so a reconnecting
+    subscriber can resume from its last event id.
+
+    Listeners (add_listener) are called synchronously on delivery. They
+    also see this process's own events as soon as it commits, even with the
+    'postgres' backend, so they must ignore the NOTIFY echo (be idempotent).
+    """
+
+    def __init__(self):
+        self.backend = 'local'
+        self.max_queue = 1000
+        self.buffer_size = 1000
+        self._token = None
+        self._token_pid = None
+        self._sequence = None
+        self._buffer = None
+        self._subscribers = set()
+        self._listeners = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        self._engine = None
+        self._listener = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.backend = app.config.get('EVENT_BUS_BACKEND', 'local')
+        if self.backend not in BACKENDS:
+            raise ValueError(f"EVENT_BUS_BACKEND must be one of {', '.join(BACKENDS)}, not {self.backend!r}")
+        self.max_queue = app.config.get('EVENT_BUS_SUBSCRIBER_QUEUE', self.max_queue)
+        self.buffer_size = app.config.get('EVENT_BUS_BUFFER', self.buffer_size)
+        if not sa_event.contains(Session, 'after_commit', self._after_commit):
+            sa_event.listen(Session, 'after_commit', self._after_commit)
+            sa_event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def publish(self, session, channel, payload):
+        """
+        Queue an event for when session's transaction commits
+
+        Args:
+            session: The SQLAlchemy session making the change
+            channel (str): Event channel, e.g. 'attendance'
+            payload (dict): JSON-serialisable event data
+        """
+        if self.backend == 'postgres' and session.get_bind().dialect.name == 'postgresql':
+            message = json.dumps({'channel': channel, 'payload': payload}, separators=(',', ':'))
+            if len(message.encode('utf-8')) > NOTIFY_MAX_BYTES:
+                raise ValueError(f'Event payload too large for NOTIFY ({len(message)} bytes)')
+            session.execute(text('SELECT pg_notify(:channel, :message)'),
+                            {'channel': NOTIFY_CHANNEL, 'message': message})
+        session.info.setdefault(PENDING_KEY, []).append((channel, payload))
+
+    def _after_commit(self, session):
+        for channel, payload in session.info.pop(PENDING_KEY, ()):
+            if self.backend == 'postgres' and session.get_bind().dialect.name == 'postgresql':
+                # Subscribers get it from the LISTEN thread like every other worker
+                self._call_listeners(channel, payload)
+            else:
+                self.deliver(channel, payload)
+
+    def _after_rollback(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+    def _check_process(self):
+        # Event ids must differ between worker processes, including ones
+        # forked from a master that imported the app; call with the lock held
+        if self._token_pid != os.getpid():
+            self._token = uuid.uuid4().hex[:8]
+            self._token_pid = os.getpid()
+            self._sequence = itertools.count(1)
+            self._buffer = collections.deque(maxlen=self.buffer_size)
+            self._subscribers = set()
+
+    def add_listener(self, channel, callback):
+        """Call callback(payload) for every event on channel, in the delivering thread"""
+        if callback not in self._listeners[channel]:
+            self._listeners[channel].append(callback)
+
+    def _call_listeners(self, channel, payload):
+        for callback in self._listeners.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Event listener %r failed", callback)
+
+    def deliver(self, channel, payload):
+        """Hand an event to this process's listeners and subscribers straight away"""
+        self._call_listeners(channel, payload)
+        with self._lock:
+            self._check_process()
+            event = Event(f'{self._token}-{next(self._sequence)}', channel, payload)
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if channel not in subscription.channels:
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def last_event_id(self):
+        """Id of the newest event, to resume from; None before the first one"""
+        with self._lock:
+            self._check_process()
+            return self._buffer[-1].id if self._buffer else None
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Start receiving events on channels
+
+        Args:
+            channels (iterable): Channel names
+            last_event_id (str, optional): Resume after this event
+
+        Returns:
+            tuple: (Subscription, backlog) where backlog lists the buffered
+            events after last_event_id, or is None when they are no longer
+            all buffered and the subscriber must reload its state. Ids from
+            another process (or from before a restart) resume from now.
+        """
+        self.ensure_listener()
+        subscription = Subscription(channels, self.max_queue)
+        with self._lock:
+            self._check_process()
+            self._subscribers.add(subscription)
+            backlog = []
+            if last_event_id and last_event_id.startswith(f'{self._token}-'):
+                try:
+                    sequence = int(last_event_id.rpartition('-')[2])
+                except ValueError:
+                    sequence = None
+                oldest = int(self._buffer[0].id.rpartition('-')[2]) if self._buffer else None
+                if sequence is None or (oldest is not None and sequence < oldest - 1):
+                    backlog = None
+                else:
+                    backlog = [event for event in self._buffer
+                               if event.channel in subscription.channels
+                               and int(event.id.rpartition('-')[2]) > sequence]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def ensure_listener(self):
+        # Started lazily so every gunicorn worker gets its own thread after fork
+        if self.backend != 'postgres':
+            return
+        from app import db
+        with self._lock:
+            if self._listener is None or self._pid != os.getpid() or not self._listener.is_alive():
+                self._engine = db.engine
+                self._pid = os.getpid()
+                self._listener = threading.Thread(target=self._listen, name='event-bus-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        delay = 1
+        connected_before = False
+        while True:
+            try:
+                connection = self._engine.raw_connection()
+                try:
+                    dbapi = connection.driver_connection
+                    dbapi.autocommit = True
+                    with dbapi.cursor() as cursor:
+                        cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                    if connected_before:
+                        # Notifications sent while disconnected are lost
+                        with self._lock:
+                            for subscription in self._subscribers:
+                                subscription.overflowed = True
+                    connected_before = True
+                    delay = 1
+                    while True:
+                        if select.select([dbapi], [], [], 30) == ([], [], []):
+                            continue
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            notify = dbapi.notifies.pop(0)
+                            message = json.loads(notify.payload)
+                            self.deliver(message['channel'], message['payload'])
+                finally:
+                    connection.invalidate()
+            except Exception:
+                logger.exception("Event bus listener failed; reconnecting in %s s", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+
+event_bus = EventBus()
@@ -0,0 +1,204 @@
+import csv
+import io
+import os
+import tempfile
+from app import db
+from app.attendance_report import session_seconds
+from app.timezones import time_service, utc_to_local
+
+try:
+    import xlsxwriter
+except ImportError:  # XlsxWriter is optional; without it only CSV is offered
+    xlsxwriter = None
+
+FETCH_BATCH = 1000  # Rows per server-side cursor fetch
+CSV_FLUSH_ROWS = 500  # Rows per chunk written to the response
+FILE_CHUNK_SIZE = 64 * 1024
+
+DATASETS = ('attendance', 'summary', 'leave')
+FORMATS = ('csv', 'xlsx')
+
+
+class ExportError(ValueError):
+    """Raised for an unknown dataset or an unavailable format"""
+
+
+def xlsx_available():
+    return xlsxwriter is not None
+
+
+def _hours(seconds):
+    return round(seconds / 3600, 2)
+
+
+def _clock(value):
+    return value.strftime('%H:%M:%S') if value is not None else ''
+
+
+def _stream(query):
+    # yield_per streams from a server-side cursor (stream_results) on Postgres,
+    # so only one batch of rows is held in memory at a time
+    return db.session.execute(query.execution_options(yield_per=FETCH_BATCH))
+
+
+def _filter_employees(query, column, employee_ids, job_role):
+    from app.models import Employee
+    if employee_ids:
+        query = query.where(column.in_(employee_ids))
+    if job_role:
+        query = query.where(Employee.job_role == job_role)
+    return query
+
+
+def attendance_rows(start_date, end_date, employee_ids=None, job_role=None, zone_name=None):
+    """Raw check-in/out sessions, one row per session"""
+    from app.models import Attendance, Employee
+    zone_name = zone_name or time_service.display_zone()
+    yield ('employee_id', 'employee_name', 'job_role', 'date', 'checkin', 'checkout', 'hours')
+    query = db.select(
+        Attendance.employee_id, Employee.name, Employee.job_role, Attendance.date,
+        Attendance.checkin_time, Attendance.checkout_time,
+    ).join(Employee, Employee.id == Attendance.employee_id).where(
+        Attendance.date >= start_date, Attendance.date <= end_date,
+    ).order_by(Attendance.employee_id, Attendance.date, Attendance.checkin_time)
+    query = _filter_employees(query, Attendance.employee_id, employee_ids, job_role)
+    for employee_id, name, role, day, checkin, checkout in _stream(query):
+        hours = _hours(session_seconds(checkin, checkout)) if checkin and checkout else ''
+        yield (
+            employee_id, name, role or '', day.isoformat(),
+            _clock(utc_to_local(day, checkin, zone_name) if checkin else None),
+            _clock(utc_to_local(day, checkout, zone_name) if checkout else None),
+            hours,
+        )
+
+
+def summary_rows(start_date, end_date, employee_ids=None, job_role=None, zone_name=None):
+    """Per employee-day summaries, the basis for payroll"""
+    from app.models import DailyAttendanceSummary as Summary, Employee
+    zone_name = zone_name or time_service.display_zone()
+    yield ('employee_id', 'employee_name', 'job_role', 'date', 'status', 'first_checkin',
+           'last_checkout', 'worked_hours', 'sessions', 'late_login')
+    query = db.select(
+        Summary.employee_id, Employee.name, Employee.job_role, Summary.date, Summary.status,
+        Summary.first_checkin, Summary.last_checkout, Summary.worked_seconds,
+        Summary.session_count, Summary.late_login,
+    ).join(Employee, Employee.id == Summary.employee_id).where(
+        Summary.date >= start_date, Summary.date <= end_date,
+    ).order_by(Summary.employee_id, Summary.date)
+    query = _filter_employees(query, Summary.employee_id, employee_ids, job_role)
+    for employee_id, name, role, day, status, first, last, worked, sessions, late in _stream(query):
+        yield (
+            employee_id, name, role or '', day.isoformat(), status,
+            _clock(utc_to_local(day, first, zone_name) if first else None),
+            _clock(utc_to_local(day, last, zone_name) if last else None),
+            _hours(worked), sessions, 'yes' if late else 'no',
+        )
+
+
+def leave_rows(start_date, end_date, employee_ids=None, job_role=None, zone_name=None):
+    """Leave requests overlapping the range, with working days per holiday calendar"""
+    from app.holidays import holiday_calendars
+    from app.models import LeaveRequest, Employee
+    yield ('employee_id', 'employee_name', 'job_role', 'leave_type', 'start_date', 'end_date',
+           'working_days', 'status', 'request_date')
+    query = db.select(
+        LeaveRequest.employee_id, Employee.name, Employee.job_role, Employee.holiday_calendar_id,
+        LeaveRequest.leave_type, LeaveRequest.start_date, LeaveRequest.end_date,
+        LeaveRequest.status, LeaveRequest.request_date,
+    ).join(Employee, Employee.id == LeaveRequest.employee_id).where(
+        LeaveRequest.start_date <= end_date, LeaveRequest.end_date >= start_date,
+    ).order_by(LeaveRequest.employee_id, LeaveRequest.start_date)
+    query = _filter_employees(query, LeaveRequest.employee_id, employee_ids, job_role)
+    for employee_id, name, role, calendar_id, leave_type, first, last, status, requested in _stream(query):
+        yield (
+            employee_id, name, role or '', leave_type, first.isoformat(), last.isoformat(),
+            holiday_calendars.get(calendar_id).working_days_between(first, last),
+            status or '', requested.isoformat() if requested else '',
+        )
+
+
+ROW_SOURCES = {
+    'attendance': attendance_rows,
+    'summary': summary_rows,
+    'leave': leave_rows,
+}
+
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """Quote text that a spreadsheet would run as a formula (names and reasons are user input)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(rows):
+    """Encode rows as CSV, yielding a chunk of bytes every CSV_FLUSH_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([csv_safe(value) for value in row])
+        if count % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_xlsx(rows, sheet_name):
+    """
+    Write rows to an XLSX file and yield its bytes
+
+    Unlike CSV this is buffered, not streamed: an XLSX is a zip whose
+    directory comes last, so the whole workbook is written to a temporary
+    file before the first byte goes out. XlsxWriter's constant_memory mode
+    flushes each row to disk, so memory stays flat, but the download only
+    starts once every row has been read.
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        # Text is always written as text, never as a formula
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_formulas': False})
+        worksheet = workbook.add_worksheet(sheet_name)
+        for row_number, row in enumerate(rows):
+            worksheet.write_row(row_number, 0, row)
+        workbook.close()
+        with open(path, 'rb') as workbook_file:
+            for chunk in iter(lambda: workbook_file.read(FILE_CHUNK_SIZE), b''):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export_stream(dataset, fmt, start_date, end_date, employee_ids=None, job_role=None):
+    """
+    Build a lazily evaluated export
+
+    CSV is sent as rows are read; XLSX is written to a temporary file first
+    (see iter_xlsx).
+
+    Returns:
+        tuple: (iterator of bytes, mimetype, download filename)
+
+    Raises:
+        ExportError: For an unknown dataset or format, or XLSX without XlsxWriter
+    """
+    if dataset not in ROW_SOURCES:
+        raise ExportError(f"Unknown export {dataset!r}; choose one of {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose one of {', '.join(FORMATS)}")
+    if fmt == 'xlsx' and not xlsx_available():
+        raise ExportError('XLSX export needs the XlsxWriter package; use CSV instead')
+    # Resolve the zone now; the rows are produced after the view has returned
+    rows = ROW_SOURCES[dataset](start_date, end_date, employee_ids, job_role,
+                                zone_name=time_service.display_zone())
+    filename = f'{dataset}_{start_date.isoformat()}_{end_date.isoformat()}.{fmt}'
+    if fmt == 'xlsx':
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return iter_xlsx(rows, dataset), mimetype, filename
+    return iter_csv(rows), 'text/csv; charset=utf-8', filename
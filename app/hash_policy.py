@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import namedtuple
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Policy used when no HashPolicy row has been activated yet
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+ActivePolicy = namedtuple('ActivePolicy', ['version', 'method'])
+
+_lock = threading.Lock()
+_cached_policy = None
+_cached_until = 0.0
+
+
+def normalize_method(method):
+    """
+    Return a werkzeug pbkdf2 method string with explicit iterations
+
+    Args:
+        method (str): e.g. 'pbkdf2', 'pbkdf2:sha256' or 'pbkdf2:sha256:600000'
+
+    Returns:
+        str: e.g. 'pbkdf2:sha256:600000'
+    """
+    parts = method.split(':')
+    if parts[0] != 'pbkdf2':
+        return method
+    algorithm = parts[1] if len(parts) > 1 else 'sha256'
+    iterations = int(parts[2]) if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+    return f'pbkdf2:{algorithm}:{iterations}'
+
+
+def method_of(hashed_password):
+    """Return the normalized method a stored hash was produced with"""
+    return normalize_method(hashed_password.split('$', 1)[0])
+
+
+def iterations_of(method):
+    """PBKDF2 iterations of a method string, or None for other methods"""
+    method = normalize_method(method)
+    return int(method.split(':')[2]) if method.startswith('pbkdf2:') else None
+
+
+def is_weaker(method, than):
+    """True if method is a PBKDF2 method with fewer iterations than the method than"""
+    iterations, other = iterations_of(method), iterations_of(than)
+    return iterations is not None and other is not None and iterations < other
+
+
+def current_policy(refresh=False):
+    """
+    Return the active hashing policy
+
+    The active row is cached per process for HASH_POLICY_REFRESH seconds so
+    logins do not pay an extra query each time.
+
+    Returns:
+        ActivePolicy: (version, method). Version 0 is the built-in default.
+    """
+    global _cached_policy, _cached_until
+    now = time.monotonic()
+    with _lock:
+        if not refresh and _cached_policy is not None and now < _cached_until:
+            return _cached_policy
+    from app.models import HashPolicy
+    row = HashPolicy.query.filter_by(is_active=True).order_by(HashPolicy.id.desc()).first()
+    if row:
+        policy = ActivePolicy(row.id, normalize_method(row.method))
+    else:
+        policy = ActivePolicy(0, DEFAULT_METHOD)
+    with _lock:
+        _cached_policy = policy
+        _cached_until = now + current_app.config.get('HASH_POLICY_REFRESH', 60)
+    return policy
+
+
+def invalidate_policy_cache():
+    """Forget the cached active policy (after activating a new one)"""
+    global _cached_policy
+    with _lock:
+        _cached_policy = None
+
+
+def needs_rehash(hashed_password, policy):
+    """
+    True if a stored hash should be replaced by one made with the policy's method
+
+    A hash with more iterations than the policy asks for is kept: a policy
+    calibrated on a slow host must not weaken existing hashes.
+    """
+    stored = method_of(hashed_password)
+    return stored != policy.method and not is_weaker(policy.method, stored)
+
+
+def measure_verify_ms(method, samples=5):
+    """
+    Measure the median time to verify a hash produced with method
+
+    Args:
+        method (str): werkzeug method string
+        samples (int): Number of verifications to time
+
+    Returns:
+        float: Median verify time in milliseconds
+    """
+    hashed = generate_password_hash('calibration-password', method=method)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        check_password_hash(hashed, 'calibration-password')
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def calibrate(target_ms, algorithm='sha256', min_iterations=DEFAULT_PBKDF2_ITERATIONS, samples=5):
+    """
+    Pick a PBKDF2 iteration count that verifies in about target_ms on this host
+
+    Args:
+        target_ms (float): Target verify latency in milliseconds
+        algorithm (str): PBKDF2 hash algorithm
+        min_iterations (int): Lower bound, regardless of how fast the host is
+        samples (int): Timings taken per measurement
+
+    Returns:
+        tuple: (method, measured_ms) for the chosen iteration count
+    """
+    probe_iterations = 100000
+    probe_ms = measure_verify_ms(f'pbkdf2:{algorithm}:{probe_iterations}', samples)
+    iterations = int(probe_iterations * target_ms / max(probe_ms, 0.001))
+    # Round to a readable number and never go below the floor
+    iterations = max(min_iterations, round(iterations, -4))
+    method = f'pbkdf2:{algorithm}:{iterations}'
+    return method, measure_verify_ms(method, samples)
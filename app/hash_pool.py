@@ -0,0 +1,154 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import check_password_hash
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing pool cannot take on more work right now"""
+
+
+def _check_password_hash(hashed_password, password):
+    # Module-level so it can be pickled into the worker processes
+    return check_password_hash(hashed_password, password)
+
+
+class HashingPool:
+    """
+    Runs password hash verification in a dedicated process pool.
+
+    Hashing is CPU bound, so the pools of all web workers together are sized
+    to the number of cores (HASH_POOL_WORKERS) and fronted by a bounded
+    admission queue. When the queue is full, or when a single username/IP
+    already has too many verifications in flight, callers get HashPoolBusy
+    immediately instead of piling up behind the hashing work.
+
+    The caller's thread still waits for the result, so this only frees the
+    web worker with threaded gunicorn workers (gthread, see gunicorn.conf.py):
+    a login blocks one thread while the others keep serving pages. With sync
+    workers there is one request per process and the per-key limits never
+    trip.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_workers = os.cpu_count() or 1
+        self.max_queue = self.max_workers * 4
+        self.per_key_limit = 2
+        self.timeout = 10.0
+        self._lock = threading.Lock()
+        self._slots = None
+        self._in_flight = {}
+        self._executor = None
+        self._executor_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read pool settings from the app config"""
+        self.enabled = app.config.get('HASH_POOL_ENABLED', True)
+        self.max_workers = app.config.get('HASH_POOL_WORKERS') or os.cpu_count() or 1
+        max_queue = app.config.get('HASH_POOL_MAX_QUEUE')
+        self.max_queue = max_queue if max_queue is not None else self.max_workers * 4
+        self.per_key_limit = app.config.get('HASH_POOL_PER_KEY_LIMIT', 2)
+        self.timeout = app.config.get('HASH_POOL_TIMEOUT', 10.0)
+        self.shutdown()
+
+    def _get_executor(self):
+        # The pool is created lazily and per process so that gunicorn workers
+        # forked after create_app() each get their own hashing processes
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._executor_pid = pid
+                self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+                self._in_flight = {}
+            return self._executor
+
+    def _admit(self, keys):
+        """Take a queue slot and count keys in flight; returns what _release() needs"""
+        with self._lock:
+            for key in keys:
+                if self._in_flight.get(key, 0) >= self.per_key_limit:
+                    raise HashPoolBusy(f"Too many concurrent attempts for {key}")
+            if not self._slots.acquire(blocking=False):
+                raise HashPoolBusy("Hashing queue is full")
+            for key in keys:
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            # A restarted pool gets new ones; release into the ones admitted against
+            return self._slots, self._in_flight
+
+    def _release(self, admission, keys):
+        slots, in_flight = admission
+        with self._lock:
+            for key in keys:
+                remaining = in_flight.get(key, 0) - 1
+                if remaining > 0:
+                    in_flight[key] = remaining
+                else:
+                    in_flight.pop(key, None)
+            slots.release()
+
+    def submit(self, fn, *args, keys=()):
+        """
+        Run fn(*args) in the pool and wait for its result
+
+        Args:
+            fn (callable): Picklable, module-level function to run
+            *args: Arguments passed to fn
+            keys (iterable, optional): Admission keys (e.g. username, client IP)
+                that are each limited to per_key_limit concurrent calls
+
+        Returns:
+            The return value of fn
+
+        Raises:
+            HashPoolBusy: If the queue is full, a key is over its limit, or the
+                result did not arrive within the configured timeout
+        """
+        if not self.enabled:
+            return fn(*args)
+        keys = tuple(key for key in keys if key)
+        executor = self._get_executor()
+        admission = self._admit(keys)
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release(admission, keys)
+            raise
+        # The slot is held until the hash finishes, not until we stop waiting:
+        # a timed out hash that already started keeps its process busy
+        future.add_done_callback(lambda _: self._release(admission, keys))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashPoolBusy("Timed out waiting for the hashing pool")
+
+    def verify_password(self, hashed_password, password, keys=()):
+        """Verify a password hash in the pool, see submit() for keys and errors"""
+        return self.submit(_check_password_hash, hashed_password, password, keys=keys)
+
+    def stats(self):
+        """Return a snapshot of the pool's configuration and in-flight work"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'per_key_limit': self.per_key_limit,
+                'in_flight_keys': len(self._in_flight),
+            }
+
+    def shutdown(self, wait=False):
+        """Stop the worker processes (a new pool is started on next use)"""
+        with self._lock:
+            executor, pid = self._executor, self._executor_pid
+            self._executor = None
+            self._executor_pid = None
+        # A pool inherited through fork belongs to the parent process
+        if executor is not None and pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+hash_pool = HashingPool()
@@ -0,0 +1,201 @@
+import calendar
+import threading
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+
+DEFAULT_WEEKLY_OFFS = 'SUN,SAT2'  # Sundays and the second Saturday of each month
+WEEKDAYS = ('MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN')
+COMPILE_MARGIN_YEARS = 5
+
+
+def parse_weekly_offs(rules):
+    """
+    Parse a weekly-off rule string
+
+    Each comma separated token is a weekday, optionally followed by the
+    occurrence within the month: 'SUN' is every Sunday, 'SAT2' only the
+    second Saturday, so 'SUN,SAT2,SAT4' gives Sundays plus alternate Saturdays.
+
+    Returns:
+        tuple: (weekday, nth or None) pairs, weekday 0 = Monday
+    """
+    parsed = []
+    for token in (rules or '').upper().replace(' ', '').split(','):
+        if not token:
+            continue
+        weekday, nth = token[:3], token[3:]
+        if weekday not in WEEKDAYS or (nth and (not nth.isdigit() or not 1 <= int(nth) <= 5)):
+            raise ValueError(f"Invalid weekly-off rule: {token!r}")
+        parsed.append((WEEKDAYS.index(weekday), int(nth) if nth else None))
+    return tuple(parsed)
+
+
+@lru_cache(maxsize=4096)
+def weekly_off_bitmap(rules, year, month):
+    """Bitmap of a month's weekly offs for parsed rules (bit 0 = day 1)"""
+    first_weekday, days_in_month = calendar.monthrange(year, month)
+    bitmap = 0
+    for weekday, nth in rules:
+        first = 1 + (weekday - first_weekday) % 7
+        if nth:
+            day = first + 7 * (nth - 1)
+            if day <= days_in_month:
+                bitmap |= 1 << (day - 1)
+        else:
+            for day in range(first, days_in_month + 1, 7):
+                bitmap |= 1 << (day - 1)
+    return bitmap
+
+
+class CompiledCalendar:
+    """
+    A holiday calendar compiled into per-month bitmaps and prefix sums.
+
+    Each month is an int whose bit d-1 is set when day d is a weekly off or
+    public holiday. A running count of working days before each month makes
+    is_holiday() and working_days_between() constant time. The compiled span
+    grows automatically when a date outside it is asked for.
+    """
+
+    def __init__(self, weekly_offs=DEFAULT_WEEKLY_OFFS, holidays=None, name='Default', calendar_id=None):
+        self.id = calendar_id
+        self.name = name
+        self.rules = parse_weekly_offs(weekly_offs)
+        self.holidays = dict(holidays or {})  # date -> holiday name
+        years = [day.year for day in self.holidays]
+        this_year = date.today().year
+        self._compile(min(years + [this_year]) - COMPILE_MARGIN_YEARS,
+                      max(years + [this_year]) + COMPILE_MARGIN_YEARS)
+
+    def _compile(self, first_year, last_year):
+        bitmaps = []
+        prefix = [0]
+        for year in range(first_year, last_year + 1):
+            for month in range(1, 13):
+                bitmap = weekly_off_bitmap(self.rules, year, month)
+                bitmaps.append(bitmap)
+                prefix.append(prefix[-1] + calendar.monthrange(year, month)[1] - bitmap.bit_count())
+        for day in self.holidays:
+            if first_year <= day.year <= last_year:
+                index = (day.year - first_year) * 12 + day.month - 1
+                bit = 1 << (day.day - 1)
+                if not bitmaps[index] & bit:
+                    bitmaps[index] |= bit
+                    for later in range(index + 1, len(prefix)):
+                        prefix[later] -= 1
+        # Swap in the new tables together so concurrent readers see a consistent span
+        self._tables = (first_year, last_year, bitmaps, prefix)
+
+    def _tables_for(self, *days):
+        first_year, last_year = self._tables[:2]
+        low, high = min(day.year for day in days), max(day.year for day in days)
+        if low < first_year or high > last_year:
+            self._compile(min(first_year, low), max(last_year, high))
+        return self._tables
+
+    def _month(self, day, tables=None):
+        first_year, _, bitmaps, prefix = tables or self._tables_for(day)
+        index = (day.year - first_year) * 12 + day.month - 1
+        return bitmaps[index], prefix[index]
+
+    def month_bitmap(self, year, month):
+        """Holiday bitmap of a month (bit 0 = day 1)"""
+        return self._month(date(year, month, 1))[0]
+
+    def is_holiday(self, day):
+        """True if day is a weekly off or public holiday"""
+        bitmap, _ = self._month(day)
+        return bool(bitmap >> (day.day - 1) & 1)
+
+    def holiday_name(self, day):
+        """Name of the public holiday on day, 'Weekly Off', or None"""
+        if day in self.holidays:
+            return self.holidays[day]
+        return 'Weekly Off' if self.is_holiday(day) else None
+
+    def _working_days_through(self, day, tables):
+        bitmap, before = self._month(day, tables)
+        return before + day.day - (bitmap & ((1 << day.day) - 1)).bit_count()
+
+    def working_days_between(self, start_date, end_date):
+        """Number of working days from start_date to end_date, both inclusive"""
+        if end_date < start_date:
+            return 0
+        day_before = start_date - timedelta(days=1)
+        # Read both counts from one compiled span; prefix sums of different spans don't subtract
+        tables = self._tables_for(day_before, end_date)
+        return self._working_days_through(end_date, tables) - self._working_days_through(day_before, tables)
+
+
+builtin_calendar = CompiledCalendar()
+
+
+class CalendarRegistry:
+    """
+    Per-process cache of compiled calendars.
+
+    Calendars are compiled on first use and kept for HOLIDAY_CACHE_TTL
+    seconds, or until invalidate() is called after holidays are edited.
+    """
+
+    def __init__(self):
+        self.ttl = 300
+        self._lock = threading.Lock()
+        self._compiled = {}  # calendar id (None = default) -> (expires_at, CompiledCalendar)
+
+    def init_app(self, app):
+        from app.invalidation import invalidation_bus, HOLIDAY_CALENDAR
+        self.ttl = app.config.get('HOLIDAY_CACHE_TTL', self.ttl)
+        self.invalidate()
+        invalidation_bus.subscribe(HOLIDAY_CALENDAR, self._calendars_changed)
+
+    def _calendars_changed(self, ids):
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._compiled.clear()
+
+    def get(self, calendar_id=None):
+        """
+        Return the compiled calendar for an id (None for the default calendar)
+
+        Falls back to the built-in Sunday/second-Saturday calendar when no
+        calendar is configured.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._compiled.get(calendar_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        compiled = self._load(calendar_id)
+        with self._lock:
+            self._compiled[calendar_id] = (now + self.ttl, compiled)
+        return compiled
+
+    def _load(self, calendar_id):
+        from app.models import HolidayCalendar, Holiday
+        if calendar_id is None:
+            row = HolidayCalendar.query.filter_by(is_default=True).first()
+        else:
+            row = HolidayCalendar.query.get(calendar_id)
+        if row is None:
+            return builtin_calendar if calendar_id is None else self.get(None)
+        holidays = {
+            holiday.date: holiday.name
+            for holiday in Holiday.query.filter_by(calendar_id=row.id).all()
+        }
+        return CompiledCalendar(row.weekly_offs, holidays, name=row.name, calendar_id=row.id)
+
+    def for_employees(self, employee_ids):
+        """Map employee ids to their compiled calendars in one query"""
+        from app import db
+        from app.models import Employee
+        rows = db.session.query(Employee.id, Employee.holiday_calendar_id).filter(
+            Employee.id.in_(list(employee_ids))
+        ).all()
+        return {employee_id: self.get(calendar_id) for employee_id, calendar_id in rows}
+
+
+holiday_calendars = CalendarRegistry()
@@ -0,0 +1,51 @@
+from flask import g
+from app import db
+
+
+class Identity:
+    """The logged-in user, loaded once per request by the login guard"""
+
+    __slots__ = ('user', 'employee', 'has_profile_pic')
+
+    def __init__(self, user, employee, has_profile_pic):
+        self.user = user
+        self.employee = employee  # Employee row (blob columns deferred) or None
+        self.has_profile_pic = has_profile_pic
+
+    @property
+    def user_id(self):
+        return self.user.id
+
+    @property
+    def role(self):
+        return self.user.role
+
+    @property
+    def employee_id(self):
+        return self.employee.id if self.employee else None
+
+
+def load_identity(user_id):
+    """
+    Load the user, their employee record and whether they have a profile
+    picture in a single query, without fetching the picture itself.
+
+    Returns:
+        Identity or None if the user no longer exists
+    """
+    from app.models import User, Employee
+    row = (
+        db.session.query(User, Employee)
+        .outerjoin(Employee, Employee.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+    user, employee = row
+    return Identity(user, employee, bool(employee and employee.has_profile_pic))
+
+
+def current_identity():
+    """Return the Identity for this request, or None outside a logged-in request"""
+    return g.get('identity')
@@ -0,0 +1,78 @@
+import collections
+import logging
+from app.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'invalidate'
+
+# Entities caches can follow
+USER = 'user'
+EMPLOYEE = 'employee'
+LEAVE_REQUEST = 'leave_request'
+ATTENDANCE = 'attendance'  # Changes outside check-in/check-out, which publish their own events
+HOLIDAY_CALENDAR = 'holiday_calendar'
+ENTITIES = (USER, EMPLOYEE, LEAVE_REQUEST, ATTENDANCE, HOLIDAY_CALENDAR)
+
+# Longer id lists are sent as "any row", which keeps every event well under NOTIFY_MAX_BYTES
+MAX_IDS = 200
+
+
+class InvalidationBus:
+    """
+    Entity-change events for the per-process caches.
+
+    Writers call changed() before committing; once the transaction commits
+    every subscriber of the entity is called with the changed ids, in every
+    process that shares the event bus. EVENT_BUS_BACKEND picks the
+    transport: 'postgres' sends the events with NOTIFY and each worker
+    (and CLI process) receives them on its LISTEN thread, 'local' delivers
+    them in memory within this process only, which is what tests and single
+    worker setups use. Every request makes sure this worker's LISTEN thread
+    is running, so caches hear other workers' changes even when nothing else
+    (presence index, live board) has started it.
+
+    Subscribers must be cheap and idempotent: with the 'postgres' backend the
+    writing process hears its own events twice.
+    """
+
+    def __init__(self):
+        self._subscribers = collections.defaultdict(list)
+
+    def init_app(self, app):
+        event_bus.add_listener(CHANNEL, self._deliver)
+        app.before_request(self._ensure_listener)
+
+    def _ensure_listener(self):
+        # Per worker process, after fork; a no-op once the thread runs or with the 'local' backend
+        event_bus.ensure_listener()
+
+    def changed(self, session, entity, *ids):
+        """
+        Announce that rows of an entity changed, once session commits
+
+        Args:
+            session: The SQLAlchemy session making the change
+            entity (str): One of ENTITIES
+            ids (int): Primary keys of the changed rows; none (or more than
+                MAX_IDS) means "any row"
+        """
+        if entity not in ENTITIES:
+            raise ValueError(f'Unknown entity {entity!r}')
+        ids = sorted(set(ids))
+        event_bus.publish(session, CHANNEL, {'entity': entity, 'ids': ids if 0 < len(ids) <= MAX_IDS else None})
+
+    def subscribe(self, entity, callback):
+        """Call callback(ids) after changes to entity; ids is None for "any row" """
+        if callback not in self._subscribers[entity]:
+            self._subscribers[entity].append(callback)
+
+    def _deliver(self, payload):
+        for callback in self._subscribers.get(payload['entity'], ()):
+            try:
+                callback(payload['ids'])
+            except Exception:
+                logger.exception("Invalidation subscriber %r failed", callback)
+
+
+invalidation_bus = InvalidationBus()
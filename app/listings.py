@@ -0,0 +1,128 @@
+from datetime import date
+from typing import NamedTuple, Optional
+from app import db
+from app.pagination import keyset_page, DEFAULT_PER_PAGE
+
+LEAVE_STATUSES = ('Pending', 'Accepted', 'Rejected')
+LEAVE_TYPES = ('Sick', 'Casual', 'Earned', 'Loss of Pay')
+
+
+class LeaveFilters(NamedTuple):
+    status: Optional[str] = None
+    leave_type: Optional[str] = None
+    start: Optional[date] = None  # Leaves ending on or after this day
+    end: Optional[date] = None  # Leaves starting on or before this day
+    employee_id: Optional[int] = None
+    search: Optional[str] = None  # Employee name contains
+
+    def args(self):
+        """The filters as query arguments, for links to other pages"""
+        return {
+            'status': self.status,
+            'leave_type': self.leave_type,
+            'start_date': self.start.isoformat() if self.start else None,
+            'end_date': self.end.isoformat() if self.end else None,
+            'employee_id': self.employee_id,
+            'q': self.search,
+        }
+
+
+class EmployeeFilters(NamedTuple):
+    search: Optional[str] = None  # Name contains
+    job_role: Optional[str] = None
+
+    def args(self):
+        return {'q': self.search, 'job_role': self.job_role}
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def parse_leave_filters(args):
+    """
+    Read LeaveFilters from request arguments
+
+    Raises:
+        ValueError: If a date is not YYYY-MM-DD
+    """
+    start, end = _parse_date(args.get('start_date')), _parse_date(args.get('end_date'))
+    if start and end and start > end:
+        start, end = end, start
+    return LeaveFilters(
+        status=args.get('status') if args.get('status') in LEAVE_STATUSES else None,
+        leave_type=args.get('leave_type') or None,
+        start=start,
+        end=end,
+        employee_id=args.get('employee_id', type=int),
+        search=args.get('q', '').strip() or None,
+    )
+
+
+def parse_employee_filters(args):
+    return EmployeeFilters(
+        search=args.get('q', '').strip() or None,
+        job_role=args.get('job_role') or None,
+    )
+
+
+def leave_page(filters, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    A page of leave requests, newest first, as read-only LeaveRow projections
+
+    Sorted on the primary key (request_date may be empty on old rows), so
+    every filter combination is an index range scan on (filter column, id).
+
+    Raises:
+        CursorError: If the cursor is malformed
+    """
+    from app.models import LeaveRequest, Employee
+    from app.read_models import leave_select, LeaveRow
+    query = leave_select()
+    if filters.status:
+        query = query.filter(LeaveRequest.status == filters.status)
+    if filters.leave_type:
+        query = query.filter(LeaveRequest.leave_type == filters.leave_type)
+    if filters.start:
+        query = query.filter(LeaveRequest.end_date >= filters.start)
+    if filters.end:
+        query = query.filter(LeaveRequest.start_date <= filters.end)
+    if filters.employee_id:
+        query = query.filter(LeaveRequest.employee_id == filters.employee_id)
+    if filters.search:
+        query = query.filter(Employee.name.ilike(f'%{filters.search}%'))
+    page = keyset_page(query, [LeaveRequest.id], lambda row: (row.id,),
+                       cursor=cursor, per_page=per_page, descending=True)
+    return page._replace(items=[LeaveRow._make(row) for row in page.items])
+
+
+def employee_page(filters, cursor=None, per_page=DEFAULT_PER_PAGE, with_user=False):
+    """
+    A page of employees by name
+
+    Args:
+        with_user (bool): Return read-only EmployeeRow projections with the
+            username and role, joining the users in the same query
+
+    Raises:
+        CursorError: If the cursor is malformed
+    """
+    from app.models import Employee
+    from app.read_models import employee_select, EmployeeRow
+    query = employee_select() if with_user else Employee.query
+    if filters.search:
+        query = query.filter(Employee.name.ilike(f'%{filters.search}%'))
+    if filters.job_role:
+        query = query.filter(Employee.job_role == filters.job_role)
+    page = keyset_page(query, [Employee.name, Employee.id], lambda employee: (employee.name, employee.id),
+                       cursor=cursor, per_page=per_page)
+    if with_user:
+        page = page._replace(items=[EmployeeRow._make(row) for row in page.items])
+    return page
+
+
+def job_roles():
+    """Distinct job roles, for filter drop-downs"""
+    from app.models import Employee
+    return [role for (role,) in db.session.query(Employee.job_role).filter(
+        Employee.job_role.isnot(None)).distinct().order_by(Employee.job_role)]
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from datetime import time as dt_time
+from app import db
+from app.attendance_report import session_seconds
+from app.attendance_summary import is_late
+from app.event_bus import event_bus
+from app.timezones import time_service
+
+CHANNEL = 'attendance'
+NAME_CACHE_TTL = 3600  # Seconds an employee name is reused; renames are dropped at once through the invalidation bus
+RETRY_MS = 2000  # EventSource reconnect delay
+BUSY_RETRY_MS = 30000  # Reconnect delay when this worker already has its maximum of streams
+
+_names = {}  # employee_id -> (name, loaded at)
+_streams_lock = threading.Lock()
+_open_streams = 0  # Streams served by this process right now, each holding a worker thread
+
+
+def publish_session(session, session_id, employee_id, day, checkin, checkout):
+    """
+    Announce a new or closed attendance session to live boards
+
+    Call before committing the change; the event is sent on commit.
+    """
+    event_bus.publish(session, CHANNEL, {
+        'session_id': session_id,
+        'employee_id': employee_id,
+        'date': day.isoformat(),
+        'checkin': checkin.isoformat() if checkin else None,
+        'checkout': checkout.isoformat() if checkout else None,
+    })
+
+
+def _duration(checkin, checkout):
+    if checkin is None or checkout is None:
+        return '-'
+    seconds = session_seconds(checkin, checkout)
+    return f'{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}'
+
+
+def board_row(session_id, employee_id, name, day, checkin, checkout, zone_name=None):
+    """One row of the board as shown on the page"""
+    return {
+        'session_id': session_id,
+        'employee_id': employee_id,
+        'employee_name': name,
+        'date': day.isoformat(),
+        'checkin_time': time_service.format(day, checkin, zone_name=zone_name, placeholder='-'),
+        'checkout_time': time_service.format(day, checkout, zone_name=zone_name, placeholder='-'),
+        'duration': _duration(checkin, checkout),
+        # Judged in the organisation's zone, whatever the viewer's zone
+        'late_login': is_late(day, checkin),
+    }
+
+
+def board_rows(day, zone_name=None):
+    """All sessions of a day, newest check-in first, in one query"""
+    from app.read_models import day_sessions
+    rows = day_sessions(day)
+    zone_name = zone_name or time_service.display_zone()
+    return [board_row(*row, zone_name=zone_name) for row in rows]
+
+
+def forget_names(employee_ids):
+    """Invalidation bus subscriber for employee changes"""
+    if employee_ids is None:
+        _names.clear()
+        return
+    for employee_id in employee_ids:
+        _names.pop(employee_id, None)
+
+
+def employee_names(employee_ids):
+    """Names for board events, cached per process for NAME_CACHE_TTL seconds"""
+    from app.models import Employee
+    now = time.monotonic()
+    missing = [employee_id for employee_id in employee_ids
+               if employee_id not in _names or now - _names[employee_id][1] > NAME_CACHE_TTL]
+    if missing:
+        for employee_id, name in db.session.query(Employee.id, Employee.name).filter(Employee.id.in_(missing)):
+            _names[employee_id] = (name, now)
+        # Release the connection; streams hold their request open for minutes
+        db.session.close()
+    return {employee_id: _names[employee_id][0] for employee_id in employee_ids if employee_id in _names}
+
+
+def _sse(event_type, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _open_stream(max_streams):
+    global _open_streams
+    with _streams_lock:
+        if max_streams is not None and _open_streams >= max_streams:
+            return False
+        _open_streams += 1
+        return True
+
+
+def _close_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+def event_stream(day, zone_name, last_event_id=None, heartbeat=15, max_seconds=300, max_streams=None):
+    """
+    Server-Sent Events for a day's board
+
+    Sends a 'row' event per new or closed session (with the presence
+    counts as of that batch) and a 'resync' event when
+    events were missed (the page then reloads). The stream ends after
+    max_seconds; EventSource reconnects and resumes from the last event id,
+    which keeps worker threads from being held indefinitely. Once this
+    process serves max_streams streams, new ones end at once and the browser
+    retries after BUSY_RETRY_MS, so open boards cannot take every thread.
+
+    Yields:
+        str: SSE frames
+    """
+    if not _open_stream(max_streams):
+        yield f'retry: {BUSY_RETRY_MS}\n\n'
+        return
+    try:
+        yield from _board_events(day, zone_name, last_event_id, heartbeat, max_seconds)
+    finally:
+        _close_stream()
+
+
+def _board_events(day, zone_name, last_event_id, heartbeat, max_seconds):
+    from app.presence import presence
+    subscription, backlog = event_bus.subscribe([CHANNEL], last_event_id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if backlog is None:
+            yield _sse('resync', {})
+            return
+        pending = list(backlog)
+        deadline = time.monotonic() + max_seconds
+        while True:
+            if subscription.overflowed:
+                yield _sse('resync', {})
+                return
+            events = [event for event in pending if event.payload['date'] == day.isoformat()]
+            pending = []
+            if events:
+                names = employee_names({event.payload['employee_id'] for event in events})
+                counts = presence.counts()._asdict()
+                for event in events:
+                    payload = event.payload
+                    row = board_row(
+                        payload['session_id'], payload['employee_id'],
+                        names.get(payload['employee_id'], ''), day,
+                        dt_time.fromisoformat(payload['checkin']) if payload['checkin'] else None,
+                        dt_time.fromisoformat(payload['checkout']) if payload['checkout'] else None,
+                        zone_name=zone_name,
+                    )
+                    row['counts'] = counts
+                    yield _sse('row', row, event.id)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = subscription.get(timeout=min(heartbeat, remaining))
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            pending.append(event)
+            # Drain whatever else arrived so one name lookup covers the batch
+            while len(pending) < 100:
+                event = subscription.get(timeout=0)
+                if event is None:
+                    break
+                pending.append(event)
+    finally:
+        event_bus.unsubscribe(subscription)
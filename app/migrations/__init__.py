@@ -0,0 +1,327 @@
+"""
+Versioned schema migrations.
+
+Each module in app/migrations/versions defines VERSION (int), DESCRIPTION,
+upgrade(op) and optionally downgrade(op). Applied versions are recorded in
+the schema_migrations table. Run them with `flask db upgrade`.
+
+Migrations are written to be idempotent (every operation checks first),
+because databases created by db.create_all() may already have some of the
+objects a migration adds. Each one declares the tables and columns it
+touches inline, as they were at that version, and never imports models or
+other app code: those keep changing, and a migration must not.
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+import click
+import sqlalchemy as sa
+from app import db
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_INDEX_DIALECTS = ('postgresql', 'sqlite')
+
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    'schema_migrations', _metadata,
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('description', sa.String(255), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+
+class MigrationError(RuntimeError):
+    """Raised when migrations cannot be applied or the schema is out of date"""
+
+
+class Migration:
+    def __init__(self, module):
+        self.module = module
+        self.version = module.VERSION
+        self.description = module.DESCRIPTION
+        # Non-transactional migrations run in autocommit mode, e.g. to build
+        # Postgres indexes CONCURRENTLY without locking writes
+        self.transactional = getattr(module, 'TRANSACTIONAL', True)
+
+    @property
+    def reversible(self):
+        return hasattr(self.module, 'downgrade')
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d} {self.description}>'
+
+
+class Operations:
+    """Schema helpers handed to upgrade()/downgrade(); all of them check first"""
+
+    def __init__(self, connection, transactional=True):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.transactional = transactional
+        self._quote = connection.dialect.identifier_preparer.quote
+
+    def _inspector(self):
+        # Fresh per call so objects created earlier in the migration are seen
+        return sa.inspect(self.connection)
+
+    def execute(self, statement, **params):
+        if isinstance(statement, str):
+            statement = sa.text(statement)
+        return self.connection.execute(statement, params)
+
+    def has_table(self, table):
+        return self._inspector().has_table(table)
+
+    def has_column(self, table, column):
+        return any(col['name'] == column for col in self._inspector().get_columns(table))
+
+    def has_index(self, table, name):
+        return any(index['name'] == name for index in self._inspector().get_indexes(table))
+
+    def create_table(self, table):
+        """Create a Table declared in the migration, and its indexes, if it does not exist"""
+        if self.has_table(table.name):
+            return False
+        table.create(self.connection)
+        return True
+
+    def drop_table(self, table):
+        if not self.has_table(table):
+            return False
+        self.execute(f'DROP TABLE {self._quote(table)}')
+        return True
+
+    def bulk_insert(self, table, rows):
+        """Insert a list of dicts into a Table in one executemany"""
+        if rows:
+            self.connection.execute(table.insert(), rows)
+        return len(rows)
+
+    def add_column(self, table, name, type_, nullable=True, references=None):
+        """
+        Add a column to an existing table
+
+        Args:
+            table (str): Table name
+            name (str): Column name
+            type_: SQLAlchemy type instance
+            nullable (bool): New columns on populated tables must be nullable
+            references (str, optional): Foreign key target, e.g. 'user(id)'
+        """
+        if self.has_column(table, name):
+            return False
+        type_sql = type_.compile(dialect=self.connection.dialect)
+        sql = f'ALTER TABLE {self._quote(table)} ADD COLUMN {self._quote(name)} {type_sql}'
+        if not nullable:
+            sql += ' NOT NULL'
+        if references:
+            target, _, column = references.partition('(')
+            sql += f' REFERENCES {self._quote(target)}({column}'
+        self.execute(sql)
+        return True
+
+    def create_index(self, name, table, columns, where=None, unique=False):
+        """
+        Create an index unless one with the same name exists
+
+        where is a SQL predicate for a partial index; it is dropped (giving a
+        plain index) on databases without partial index support. On Postgres
+        the index is built CONCURRENTLY when the migration is non-transactional.
+        """
+        if self.has_index(table, name):
+            return False
+        concurrently = ' CONCURRENTLY' if self.dialect == 'postgresql' and not self.transactional else ''
+        column_sql = ', '.join(self._quote(column) for column in columns)
+        sql = (f'CREATE {"UNIQUE " if unique else ""}INDEX{concurrently} {self._quote(name)} '
+               f'ON {self._quote(table)} ({column_sql})')
+        if where and self.dialect in PARTIAL_INDEX_DIALECTS:
+            sql += f' WHERE {where}'
+        self.execute(sql)
+        return True
+
+    def drop_index(self, name, table):
+        if not self.has_index(table, name):
+            return False
+        concurrently = ' CONCURRENTLY' if self.dialect == 'postgresql' and not self.transactional else ''
+        self.execute(f'DROP INDEX{concurrently} {self._quote(name)}')
+        return True
+
+
+def load_migrations():
+    """All migrations in version order"""
+    from app.migrations import versions
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        module = importlib.import_module(f'{versions.__name__}.{module_info.name}')
+        migrations.append(Migration(module))
+    migrations.sort(key=lambda migration: migration.version)
+    seen = set()
+    for migration in migrations:
+        if migration.version in seen:
+            raise MigrationError(f'Duplicate migration version {migration.version}')
+        seen.add(migration.version)
+    return migrations
+
+
+def head_version(migrations=None):
+    migrations = load_migrations() if migrations is None else migrations
+    return migrations[-1].version if migrations else 0
+
+
+def applied_versions():
+    """Set of versions recorded in schema_migrations (empty if it does not exist)"""
+    with db.engine.connect() as connection:
+        if not sa.inspect(connection).has_table(schema_migrations.name):
+            return set()
+        return {row.version for row in connection.execute(sa.select(schema_migrations.c.version))}
+
+
+def current_version():
+    return max(applied_versions(), default=0)
+
+
+def pending_migrations(migrations=None):
+    migrations = load_migrations() if migrations is None else migrations
+    applied = applied_versions()
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+def _run(migration, direction):
+    engine = db.engine
+    if migration.transactional:
+        context = engine.begin()
+    else:
+        context = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+    with context as connection:
+        getattr(migration.module, direction)(Operations(connection, migration.transactional))
+        if direction == 'upgrade':
+            connection.execute(schema_migrations.insert().values(
+                version=migration.version, description=migration.description, applied_at=datetime.utcnow()))
+        else:
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+        if not migration.transactional:
+            connection.commit()
+
+
+def upgrade(target=None, on_apply=None):
+    """
+    Apply pending migrations up to target (default: all)
+
+    Args:
+        target (int, optional): Highest version to apply
+        on_apply (callable, optional): Called with each Migration before it runs
+
+    Returns:
+        list: The migrations that were applied
+    """
+    _metadata.create_all(db.engine)
+    applied = []
+    for migration in pending_migrations():
+        if target is not None and migration.version > target:
+            break
+        if on_apply:
+            on_apply(migration)
+        logger.info("Applying migration %04d: %s", migration.version, migration.description)
+        _run(migration, 'upgrade')
+        applied.append(migration)
+    return applied
+
+
+def downgrade(target, on_apply=None):
+    """Revert applied migrations above target, newest first"""
+    done = applied_versions()
+    to_revert = [m for m in reversed(load_migrations()) if m.version in done and m.version > target]
+    irreversible = [m for m in to_revert if not m.reversible]
+    if irreversible:
+        raise MigrationError(f'{irreversible[0]!r} cannot be reverted')
+    for migration in to_revert:
+        if on_apply:
+            on_apply(migration)
+        logger.info("Reverting migration %04d: %s", migration.version, migration.description)
+        _run(migration, 'downgrade')
+    return to_revert
+
+
+def stamp(version):
+    """Record every migration up to version as applied without running it"""
+    _metadata.create_all(db.engine)
+    done = applied_versions()
+    with db.engine.begin() as connection:
+        for migration in load_migrations():
+            if migration.version <= version and migration.version not in done:
+                connection.execute(schema_migrations.insert().values(
+                    version=migration.version, description=migration.description,
+                    applied_at=datetime.utcnow()))
+
+
+def missing_columns():
+    """(table, column name) pairs declared on the models but absent from the database"""
+    inspector = sa.inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            missing.append((table.name, None))
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend((table.name, column.name) for column in table.columns if column.name not in present)
+    return missing
+
+
+def missing_indexes():
+    """(table, index name) pairs declared on the models but absent from the database"""
+    inspector = sa.inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not table.indexes or not inspector.has_table(table.name):
+            continue
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend((table.name, index.name) for index in table.indexes if index.name not in present)
+    return missing
+
+
+def check_schema():
+    """
+    List problems with the database schema
+
+    Returns:
+        list: Human readable problems; empty when the schema is up to date
+    """
+    problems = []
+    pending = pending_migrations()
+    if pending:
+        versions = ', '.join(f'{migration.version:04d}' for migration in pending)
+        problems.append(f'{len(pending)} pending migration(s): {versions}; run `flask db upgrade`')
+    for table, column in missing_columns():
+        problems.append(f'missing table {table}' if column is None else f'missing column {table}.{column}')
+    for table, index in missing_indexes():
+        problems.append(f'missing index {index} on {table}')
+    return problems
+
+
+def prepare_database(app):
+    """
+    Create a fresh database or verify an existing one at startup
+
+    An empty database is built from the models and stamped with the latest
+    version. An existing one is only changed by `flask db upgrade`; its
+    schema is checked according to MIGRATIONS_VERIFY: 'strict' refuses to
+    start, 'warn' logs problems, 'off' skips the check. Flask CLI commands
+    (`flask db upgrade` among them) only warn, so they can fix the schema.
+    """
+    from app import models
+    if not sa.inspect(db.engine).has_table(models.User.__tablename__):
+        db.create_all()
+        stamp(head_version())
+        return
+    mode = app.config.get('MIGRATIONS_VERIFY', 'strict')
+    if mode == 'off':
+        return
+    problems = check_schema()
+    if not problems:
+        return
+    if mode == 'strict' and click.get_current_context(silent=True) is None:
+        raise MigrationError('Database schema is out of date: ' + '; '.join(problems))
+    for problem in problems:
+        logger.warning("Database schema: %s", problem)
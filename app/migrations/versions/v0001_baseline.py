@@ -0,0 +1,62 @@
+"""Original schema: users, employees, attendance and leave requests"""
+import sqlalchemy as sa
+
+VERSION = 1
+DESCRIPTION = 'Baseline tables'
+
+# The tables as the app first shipped them; later migrations change them
+metadata = sa.MetaData()
+
+user = sa.Table(
+    'user', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('username', sa.String(80), unique=True, nullable=False),
+    sa.Column('password', sa.String(255), nullable=False),
+    sa.Column('salt', sa.String(255), nullable=True),
+    sa.Column('temporary_password', sa.Boolean),
+    sa.Column('role', sa.String(20), nullable=False),
+    sa.Column('name', sa.String(100), nullable=True),
+)
+
+employee = sa.Table(
+    'employee', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('name', sa.String(100), nullable=False),
+    sa.Column('gender', sa.String(10), nullable=False),
+    sa.Column('address', sa.String(255), nullable=False),
+    sa.Column('phone_number', sa.String(20), nullable=False),
+    sa.Column('unique_id_number', sa.String(50), unique=True, nullable=False),
+    sa.Column('job_role', sa.String(100), nullable=True),
+    sa.Column('salary', sa.Float, nullable=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    sa.Column('profile_pic', sa.LargeBinary, nullable=True),
+    sa.Column('profile_pic_mimetype', sa.String(255), nullable=True),
+)
+
+attendance = sa.Table(
+    'attendance', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('employee_id', sa.Integer, sa.ForeignKey('employee.id', ondelete='CASCADE'), nullable=False),
+    sa.Column('date', sa.Date, nullable=False),
+    sa.Column('checkin_time', sa.Time),
+    sa.Column('checkout_time', sa.Time),
+    sa.Column('late_login', sa.Boolean),
+)
+
+leave_request = sa.Table(
+    'leave_request', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('employee_id', sa.Integer, sa.ForeignKey('employee.id', ondelete='CASCADE'), nullable=False),
+    sa.Column('leave_type', sa.String(50), nullable=False),
+    sa.Column('start_date', sa.Date, nullable=False),
+    sa.Column('end_date', sa.Date, nullable=False),
+    sa.Column('reason', sa.Text, nullable=False),
+    sa.Column('status', sa.String(20)),
+    sa.Column('request_date', sa.Date),
+)
+
+
+def upgrade(op):
+    # Existing deployments were built by db.create_all(); this only fills gaps
+    for table in (user, employee, attendance, leave_request):
+        op.create_table(table)
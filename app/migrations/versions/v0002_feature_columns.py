@@ -0,0 +1,45 @@
+"""Tables and columns added since the baseline, which db.create_all() never added to existing tables"""
+import sqlalchemy as sa
+
+VERSION = 2
+DESCRIPTION = 'Hash policies, blob keys, holiday calendars and user timezones'
+
+metadata = sa.MetaData()
+
+hash_policy = sa.Table(
+    'hash_policy', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('method', sa.String(50), nullable=False),
+    sa.Column('target_ms', sa.Float, nullable=True),
+    sa.Column('measured_ms', sa.Float, nullable=True),
+    sa.Column('is_active', sa.Boolean),
+    sa.Column('created_at', sa.DateTime),
+)
+
+holiday_calendar = sa.Table(
+    'holiday_calendar', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('name', sa.String(100), unique=True, nullable=False),
+    sa.Column('region', sa.String(100), nullable=True),
+    sa.Column('weekly_offs', sa.String(50), nullable=False),
+    sa.Column('is_default', sa.Boolean),
+)
+
+holiday = sa.Table(
+    'holiday', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('calendar_id', sa.Integer, sa.ForeignKey('holiday_calendar.id', ondelete='CASCADE'), nullable=False),
+    sa.Column('date', sa.Date, nullable=False),
+    sa.Column('name', sa.String(100), nullable=False),
+    sa.UniqueConstraint('calendar_id', 'date'),
+)
+
+
+def upgrade(op):
+    op.create_table(hash_policy)
+    op.create_table(holiday_calendar)
+    op.create_table(holiday)
+    op.add_column('user', 'hash_policy_version', sa.Integer())
+    op.add_column('user', 'timezone', sa.String(64))
+    op.add_column('employee', 'profile_pic_key', sa.String(64))
+    op.add_column('employee', 'holiday_calendar_id', sa.Integer(), references='holiday_calendar(id)')
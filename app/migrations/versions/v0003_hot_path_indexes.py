@@ -0,0 +1,26 @@
+"""Indexes for the attendance, leave and identity lookups every page makes"""
+
+VERSION = 3
+DESCRIPTION = 'Hot-path composite indexes'
+# Lets Postgres build the indexes CONCURRENTLY, without blocking check-ins
+TRANSACTIONAL = False
+
+INDEXES = (
+    # (name, table, columns, partial index predicate)
+    ('ix_attendance_employee_date', 'attendance', ('employee_id', 'date'), None),
+    ('ix_attendance_open_session', 'attendance', ('employee_id', 'date'), 'checkout_time IS NULL'),
+    ('ix_attendance_date_late_login', 'attendance', ('date', 'late_login'), None),
+    ('ix_leave_request_employee_status', 'leave_request', ('employee_id', 'status'), None),
+    ('ix_leave_request_status', 'leave_request', ('status',), None),
+    ('ix_employee_user_id', 'employee', ('user_id',), None),
+)
+
+
+def upgrade(op):
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, where=where)
+
+
+def downgrade(op):
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table)
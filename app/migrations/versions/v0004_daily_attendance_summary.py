@@ -0,0 +1,85 @@
+"""Daily attendance rollup, backfilled from the raw attendance rows"""
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+import sqlalchemy as sa
+from flask import current_app
+
+VERSION = 4
+DESCRIPTION = 'Daily attendance summary table'
+
+# First check-ins after this local time (in DISPLAY_TIMEZONE) were late
+LATE_AFTER = time(9, 30)
+
+metadata = sa.MetaData()
+
+sa.Table('employee', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+attendance = sa.Table(
+    'attendance', metadata,
+    sa.Column('employee_id', sa.Integer),
+    sa.Column('date', sa.Date),
+    sa.Column('checkin_time', sa.Time),
+    sa.Column('checkout_time', sa.Time),
+)
+
+daily_attendance_summary = sa.Table(
+    'daily_attendance_summary', metadata,
+    sa.Column('employee_id', sa.Integer, sa.ForeignKey('employee.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('date', sa.Date, primary_key=True),
+    sa.Column('first_checkin', sa.Time, nullable=True),
+    sa.Column('last_checkout', sa.Time, nullable=True),
+    sa.Column('worked_seconds', sa.Integer, nullable=False),
+    sa.Column('session_count', sa.Integer, nullable=False),
+    sa.Column('open_sessions', sa.Integer, nullable=False),
+    sa.Column('late_login', sa.Boolean, nullable=False),
+    sa.Column('status', sa.String(20), nullable=False),
+    sa.Index('ix_daily_attendance_summary_date_late_login', 'date', 'late_login'),
+)
+
+
+def _seconds(checkin, checkout):
+    return max((checkout.hour - checkin.hour) * 3600 + (checkout.minute - checkin.minute) * 60
+               + checkout.second - checkin.second, 0)
+
+
+def _summaries(sessions, zone):
+    days = {}
+    for employee_id, day, checkin, checkout in sessions:
+        row = days.get((employee_id, day))
+        if row is None:
+            row = days[(employee_id, day)] = {
+                'employee_id': employee_id, 'date': day, 'first_checkin': None, 'last_checkout': None,
+                'worked_seconds': 0, 'session_count': 0, 'open_sessions': 0,
+            }
+        row['session_count'] += 1
+        if checkin is not None:
+            if row['first_checkin'] is None or checkin < row['first_checkin']:
+                row['first_checkin'] = checkin
+            if checkout is None:
+                row['open_sessions'] += 1
+            else:
+                row['worked_seconds'] += _seconds(checkin, checkout)
+        if checkout is not None and (row['last_checkout'] is None or checkout > row['last_checkout']):
+            row['last_checkout'] = checkout
+    for row in days.values():
+        first = row['first_checkin']
+        row['late_login'] = first is not None and datetime.combine(
+            row['date'], first, timezone.utc).astimezone(zone).time() > LATE_AFTER
+        if first is None:
+            row['status'] = 'No Record'
+        else:
+            row['status'] = 'Checked In' if row['open_sessions'] else 'Present'
+    return list(days.values())
+
+
+def upgrade(op):
+    op.create_table(daily_attendance_summary)
+    op.execute(daily_attendance_summary.delete())
+    zone = ZoneInfo(current_app.config.get('DISPLAY_TIMEZONE', 'Asia/Kolkata'))
+    sessions = op.execute(sa.select(
+        attendance.c.employee_id, attendance.c.date, attendance.c.checkin_time, attendance.c.checkout_time))
+    op.bulk_insert(daily_attendance_summary, _summaries(sessions, zone))
+
+
+def downgrade(op):
+    op.drop_table('daily_attendance_summary')
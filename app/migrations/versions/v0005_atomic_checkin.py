@@ -0,0 +1,107 @@
+"""Idempotency keys and the one-open-session rule behind atomic check-in/out"""
+import sqlalchemy as sa
+
+VERSION = 5
+DESCRIPTION = 'Atomic check-in: open session uniqueness and idempotency keys'
+# Every step checks first, so an interrupted run can be repeated; lets
+# Postgres build the indexes CONCURRENTLY
+TRANSACTIONAL = False
+
+INDEXES = (
+    # (name, columns)
+    ('uq_attendance_checkin_key', ('checkin_key',)),
+    ('uq_attendance_checkout_key', ('checkout_key',)),
+)
+# Dialects that support the partial unique index on open sessions
+PARTIAL_INDEX_DIALECTS = ('postgresql', 'sqlite')
+
+metadata = sa.MetaData()
+
+attendance = sa.Table(
+    'attendance', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('employee_id', sa.Integer),
+    sa.Column('date', sa.Date),
+    sa.Column('checkin_time', sa.Time),
+    sa.Column('checkout_time', sa.Time),
+)
+
+daily_attendance_summary = sa.Table(
+    'daily_attendance_summary', metadata,
+    sa.Column('employee_id', sa.Integer, primary_key=True),
+    sa.Column('date', sa.Date, primary_key=True),
+    sa.Column('last_checkout', sa.Time),
+    sa.Column('open_sessions', sa.Integer),
+    sa.Column('status', sa.String(20)),
+)
+
+
+def _close_duplicate_sessions(op):
+    """
+    Keep the earliest open session per employee-day and close the others
+    with a zero length, so the unique index can be built
+
+    Returns:
+        set: (employee_id, date) pairs that were changed
+    """
+    rows = op.execute(sa.select(
+        attendance.c.id, attendance.c.employee_id, attendance.c.date,
+    ).where(attendance.c.checkout_time.is_(None)).order_by(
+        attendance.c.employee_id, attendance.c.date, attendance.c.checkin_time, attendance.c.id,
+    )).fetchall()
+    seen = set()
+    changed = set()
+    for session_id, employee_id, day in rows:
+        if (employee_id, day) not in seen:
+            seen.add((employee_id, day))
+            continue
+        op.execute(attendance.update().where(attendance.c.id == session_id).values(checkout_time=attendance.c.checkin_time))
+        changed.add((employee_id, day))
+    return changed
+
+
+def _refresh_summaries(op, days):
+    """Recount the open sessions, last check-out and status of changed summary rows"""
+    summary = daily_attendance_summary
+    for employee_id, day in days:
+        sessions = sa.and_(attendance.c.employee_id == employee_id, attendance.c.date == day)
+        open_sessions = op.execute(sa.select(sa.func.count()).where(
+            sessions, attendance.c.checkin_time.isnot(None), attendance.c.checkout_time.is_(None))).scalar()
+        last_checkout = op.execute(sa.select(sa.func.max(attendance.c.checkout_time)).where(sessions)).scalar()
+        op.execute(summary.update().where(
+            summary.c.employee_id == employee_id, summary.c.date == day,
+        ).values(open_sessions=open_sessions, last_checkout=last_checkout,
+                 status='Checked In' if open_sessions else 'Present'))
+
+
+def upgrade(op):
+    op.add_column('attendance', 'checkin_key', sa.String(64))
+    op.add_column('attendance', 'checkout_key', sa.String(64))
+    op.add_column('daily_attendance_summary', 'last_checkin', sa.Time())
+    op.execute(
+        'UPDATE daily_attendance_summary SET last_checkin = ('
+        'SELECT MAX(attendance.checkin_time) FROM attendance '
+        'WHERE attendance.employee_id = daily_attendance_summary.employee_id '
+        'AND attendance.date = daily_attendance_summary.date) '
+        'WHERE last_checkin IS NULL'
+    )
+    for name, columns in INDEXES:
+        op.create_index(name, 'attendance', columns, unique=True)
+    # Without partial indexes the rule cannot be expressed (a plain unique
+    # index would allow one session per day); check-in then relies on the
+    # check-in key alone
+    if op.dialect in PARTIAL_INDEX_DIALECTS and not op.has_index('attendance', 'uq_attendance_open_session'):
+        _refresh_summaries(op, _close_duplicate_sessions(op))
+        op.create_index('uq_attendance_open_session', 'attendance', ('employee_id', 'date'),
+                        where='checkout_time IS NULL', unique=True)
+    op.drop_index('ix_attendance_open_session', 'attendance')
+
+
+def downgrade(op):
+    op.create_index('ix_attendance_open_session', 'attendance', ('employee_id', 'date'),
+                    where='checkout_time IS NULL')
+    op.drop_index('uq_attendance_open_session', 'attendance')
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, 'attendance')
+    # The key and last_checkin columns are left in place; they are nullable
+    # and ignored by the earlier code
@@ -0,0 +1,29 @@
+"""Bearer tokens for the JSON check-in API"""
+import sqlalchemy as sa
+
+VERSION = 6
+DESCRIPTION = 'API tokens'
+
+metadata = sa.MetaData()
+
+sa.Table('user', metadata, sa.Column('id', sa.Integer, primary_key=True))
+
+api_token = sa.Table(
+    'api_token', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True),
+    sa.Column('name', sa.String(100), nullable=False),
+    sa.Column('token_hash', sa.String(64), unique=True, nullable=False),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('expires_at', sa.DateTime, nullable=True),
+    sa.Column('last_used_at', sa.DateTime, nullable=True),
+    sa.Column('revoked', sa.Boolean, nullable=False),
+)
+
+
+def upgrade(op):
+    op.create_table(api_token)
+
+
+def downgrade(op):
+    op.drop_table('api_token')
@@ -0,0 +1,28 @@
+"""Indexes for keyset pagination of the HR leave and employee lists"""
+
+VERSION = 7
+DESCRIPTION = 'Listing indexes'
+TRANSACTIONAL = False
+
+INDEXES = (
+    # (name, table, columns)
+    ('ix_leave_request_status_id', 'leave_request', ('status', 'id')),
+    ('ix_leave_request_leave_type_id', 'leave_request', ('leave_type', 'id')),
+    ('ix_leave_request_employee_id_id', 'leave_request', ('employee_id', 'id')),
+    ('ix_leave_request_end_date', 'leave_request', ('end_date',)),
+    ('ix_employee_name_id', 'employee', ('name', 'id')),
+    ('ix_employee_job_role_name_id', 'employee', ('job_role', 'name', 'id')),
+)
+
+
+def upgrade(op):
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+    # A prefix of ix_leave_request_status_id
+    op.drop_index('ix_leave_request_status', 'leave_request')
+
+
+def downgrade(op):
+    op.create_index('ix_leave_request_status', 'leave_request', ('status',))
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table)
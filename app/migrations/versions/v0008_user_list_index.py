@@ -0,0 +1,13 @@
+"""Index for keyset pagination of the admin user list"""
+
+VERSION = 8
+DESCRIPTION = 'User list index'
+TRANSACTIONAL = False
+
+
+def upgrade(op):
+    op.create_index('ix_user_role_username', 'user', ('role', 'username'))
+
+
+def downgrade(op):
+    op.drop_index('ix_user_role_username', 'user')
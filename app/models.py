@@ -1,7 +1,15 @@
 from app import db
-from datetime import date
+from datetime import date, datetime
 from flask import url_for
 from app.password_utils import PasswordManager
+from app import hash_policy
+import mimetypes
+
+
+def profile_pic_extension(mimetype):
+    """File extension used in profile picture URLs for a mimetype"""
+    extension = mimetypes.guess_extension(mimetype or '') or '.jpg'
+    return extension.lstrip('.')
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,29 +19,67 @@ class User(db.Model):
     temporary_password = db.Column(db.Boolean, default=False)  # Flag for temporary passwords
     role = db.Column(db.String(20), nullable=False)  # 'employee', 'hr', 'admin'
     name = db.Column(db.String(100), nullable=True)  # Full name for HR and Admin users
+    hash_policy_version = db.Column(db.Integer, nullable=True)  # HashPolicy the password hash was made with
+    timezone = db.Column(db.String(64), nullable=True)  # IANA zone for displayed times; None = DISPLAY_TIMEZONE
     
     def set_password(self, password):
         """Set a hashed password for the user"""
-        self.password = PasswordManager.hash_password(password)
+        policy = hash_policy.current_policy()
+        self.password = PasswordManager.hash_password(password, policy.method)
+        self.hash_policy_version = policy.version
         # Clear temporary password flag when setting new password
         self.temporary_password = False
+        # Keys derived from the old password must not outlive it
+        if self.id is not None:
+            PasswordManager.forget_user_keys(self.id)
     
-    def check_password(self, password):
+    def check_password(self, password, admission_keys=None):
         """Check if the provided password matches the stored hash"""
-        return PasswordManager.verify_password(self.password, password)
+        return PasswordManager.verify_password(self.password, password, admission_keys)
+    
+    def upgrade_password_hash(self, password):
+        """
+        Re-hash a just-verified password if the active hashing policy changed
+        
+        Returns True if the user needs to be committed. May raise HashPoolBusy,
+        in which case the upgrade is simply retried on a later login.
+        """
+        policy = hash_policy.current_policy()
+        if hash_policy.needs_rehash(self.password, policy):
+            self.password = PasswordManager.hash_password(password, policy.method, admission_keys=())
+        elif self.hash_policy_version == policy.version or hash_policy.method_of(self.password) != policy.method:
+            # Up to date, or a stronger hash than the policy asks for, which is kept as is
+            return False
+        self.hash_policy_version = policy.version
+        return True
     
-    def encrypt_sensitive_data(self, data, password):
-        """Encrypt sensitive data using the user's password"""
-        encrypted_data, salt = PasswordManager.encrypt_data(data, password)
+    def encrypt_sensitive_data(self, data, password=None):
+        """
+        Encrypt sensitive data using the user's password (or cached key)
+        
+        Raises:
+            ValueError: If no password was given and this process has no cached key
+        """
+        salt = PasswordManager.string_to_salt(self.salt) if self.salt else None
+        encrypted_data, salt = PasswordManager.encrypt_data(data, password, salt, user_id=self.id)
         self.salt = PasswordManager.salt_to_string(salt)
         return encrypted_data
     
-    def decrypt_sensitive_data(self, encrypted_data, password):
-        """Decrypt sensitive data using the user's password"""
+    def decrypt_sensitive_data(self, encrypted_data, password=None):
+        """Decrypt sensitive data using the user's password (or cached key)"""
+        return self.decrypt_sensitive_fields([encrypted_data], password)[0]
+    
+    def decrypt_sensitive_fields(self, encrypted_values, password=None):
+        """Decrypt several values with one key derivation (or cached key)"""
         if not self.salt:
             raise ValueError("No salt available for decryption")
         salt = PasswordManager.string_to_salt(self.salt)
-        return PasswordManager.decrypt_data(encrypted_data, password, salt)
+        return PasswordManager.decrypt_many(encrypted_values, password, salt, user_id=self.id)
+
+    __table_args__ = (
+        # Keyset pages of the admin user list
+        db.Index('ix_user_role_username', 'role', 'username'),
+    )
 
 class Employee(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -44,10 +90,40 @@ class Employee(db.Model):
     unique_id_number = db.Column(db.String(50), unique=True, nullable=False)
     job_role = db.Column(db.String(100), nullable=True)
     salary = db.Column(db.Float, nullable=True)  # Employee salary
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     user = db.relationship('User', backref=db.backref('employee', uselist=False, cascade="all, delete"))
-    profile_pic = db.Column(db.LargeBinary, nullable=True)  # Store image data as binary
+    # Legacy image bytes, moved to the blob store by `flask blobs migrate-profile-pics`.
+    # Deferred: only loaded on access or with Employee.with_blobs()
+    profile_pic = db.deferred(db.Column(db.LargeBinary, nullable=True), group='blobs')
     profile_pic_mimetype = db.Column(db.String(255), nullable=True)  # Store the image mimetype
+    profile_pic_key = db.Column(db.String(64), nullable=True)  # Blob store key (sha256) of the profile picture
+    holiday_calendar_id = db.Column(db.Integer, db.ForeignKey('holiday_calendar.id'), nullable=True)  # None: default calendar
+    # Cheap flag loaded with every row instead of the blob itself
+    has_profile_pic = db.column_property(
+        db.or_(profile_pic_key.isnot(None), profile_pic.expression.isnot(None))
+    )
+    
+    @staticmethod
+    def with_blobs():
+        """Query option that loads the deferred blob columns up front"""
+        return db.undefer_group('blobs')
+    
+    @property
+    def profile_pic_url(self):
+        return self.profile_pic_url_for()
+    
+    def profile_pic_url_for(self, size=None):
+        """Cacheable, content-addressed URL of the profile picture (None if not in the blob store)"""
+        if not self.profile_pic_key:
+            return None
+        return url_for('employee.profile_pic_blob', key=self.profile_pic_key,
+                       ext=profile_pic_extension(self.profile_pic_mimetype), size=size)
+
+    __table_args__ = (
+        # Keyset pages of the employee lists, by name
+        db.Index('ix_employee_name_id', 'name', 'id'),
+        db.Index('ix_employee_job_role_name_id', 'job_role', 'name', 'id'),
+    )
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -56,7 +132,37 @@ class Attendance(db.Model):
     checkin_time = db.Column(db.Time)
     checkout_time = db.Column(db.Time)
     late_login = db.Column(db.Boolean, default=False)  # Track if employee logged in after 9:30 AM
+    checkin_key = db.Column(db.String(64), nullable=True)  # Idempotency key of the check-in request
+    checkout_key = db.Column(db.String(64), nullable=True)  # Idempotency key of the check-out request
     employee = db.relationship('Employee', backref=db.backref('attendances', lazy=True, cascade="all, delete"))
+    # Keep in sync with app/migrations/versions/v0003_hot_path_indexes.py and v0005_atomic_checkin.py
+    __table_args__ = (
+        db.Index('ix_attendance_employee_date', 'employee_id', 'date'),
+        # At most one open session (checked in, not yet out) per employee-day
+        db.Index('uq_attendance_open_session', 'employee_id', 'date', unique=True,
+                 postgresql_where=db.text('checkout_time IS NULL'),
+                 sqlite_where=db.text('checkout_time IS NULL')),
+        db.Index('ix_attendance_date_late_login', 'date', 'late_login'),
+        db.Index('uq_attendance_checkin_key', 'checkin_key', unique=True),
+        db.Index('uq_attendance_checkout_key', 'checkout_key', unique=True),
+    )
+
+class DailyAttendanceSummary(db.Model):
+    """One row per employee-day with attendance, kept up to date by app.attendance_summary"""
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    first_checkin = db.Column(db.Time, nullable=True)  # UTC, like Attendance
+    last_checkin = db.Column(db.Time, nullable=True)  # UTC; start of the open session while checked in
+    last_checkout = db.Column(db.Time, nullable=True)  # UTC
+    worked_seconds = db.Column(db.Integer, nullable=False, default=0)  # Closed sessions only
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    open_sessions = db.Column(db.Integer, nullable=False, default=0)  # Checked in, not yet out
+    late_login = db.Column(db.Boolean, nullable=False, default=False)  # First check-in after LATE_AFTER (org zone)
+    status = db.Column(db.String(20), nullable=False)  # 'Present', 'Checked In' or 'No Record'
+    employee = db.relationship('Employee', backref=db.backref('attendance_summaries', lazy=True, cascade="all, delete"))
+    __table_args__ = (
+        db.Index('ix_daily_attendance_summary_date_late_login', 'date', 'late_login'),
+    )
 
 class LeaveRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,5 +174,53 @@ class LeaveRequest(db.Model):
     status = db.Column(db.String(20), default='Pending')  # Pending, Accepted, Rejected
     request_date = db.Column(db.Date, default=date.today)
     employee = db.relationship('Employee', backref=db.backref('leave_requests', lazy=True, cascade="all, delete"))
+    __table_args__ = (
+        db.Index('ix_leave_request_employee_status', 'employee_id', 'status'),
+        # Keyset pages of the HR leave list: (filter column, id)
+        db.Index('ix_leave_request_status_id', 'status', 'id'),
+        db.Index('ix_leave_request_leave_type_id', 'leave_type', 'id'),
+        db.Index('ix_leave_request_employee_id_id', 'employee_id', 'id'),
+        db.Index('ix_leave_request_end_date', 'end_date'),
+    )
+    
+    @property
+    def working_days(self):
+        """Working days covered by the leave, per the employee's holiday calendar"""
+        from app.holidays import holiday_calendars
+        calendar = holiday_calendars.get(self.employee.holiday_calendar_id if self.employee else None)
+        return calendar.working_days_between(self.start_date, self.end_date)
 
+class HolidayCalendar(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    region = db.Column(db.String(100), nullable=True)  # e.g. state or office location
+    weekly_offs = db.Column(db.String(50), nullable=False, default='SUN,SAT2')  # See app.holidays.parse_weekly_offs
+    is_default = db.Column(db.Boolean, default=False)  # Used for employees without a calendar
 
+class Holiday(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.Integer, db.ForeignKey('holiday_calendar.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    calendar = db.relationship('HolidayCalendar', backref=db.backref('holidays', lazy=True, cascade="all, delete"))
+    __table_args__ = (db.UniqueConstraint('calendar_id', 'date'),)
+
+class HashPolicy(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Policy version
+    method = db.Column(db.String(50), nullable=False)  # Werkzeug hash method, e.g. 'pbkdf2:sha256:600000'
+    target_ms = db.Column(db.Float, nullable=True)  # Verify latency the policy was calibrated for
+    measured_ms = db.Column(db.Float, nullable=True)  # Verify latency measured at calibration time
+    is_active = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ApiToken(db.Model):
+    """Bearer token for the JSON API (see `flask api-tokens`); only a hash is stored"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)  # e.g. 'Lobby kiosk' or 'Phone'
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 hex of the token
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)  # None = does not expire
+    last_used_at = db.Column(db.DateTime, nullable=True)
+    revoked = db.Column(db.Boolean, default=False, nullable=False)
+    user = db.relationship('User', backref=db.backref('api_tokens', lazy=True, cascade="all, delete"))
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+from sqlalchemy.sql import Select
+from app import db
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+class CursorError(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor()"""
+
+
+class KeysetPage(NamedTuple):
+    items: list
+    next_cursor: Optional[str]  # None on the last page
+    prev_cursor: Optional[str]  # None on the first page
+    per_page: int
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value, python_type):
+    if isinstance(value, dict):
+        try:
+            if 'dt' in value:
+                value = datetime.fromisoformat(value['dt'])
+            elif 'd' in value:
+                value = date.fromisoformat(value['d'])
+            else:
+                raise CursorError('Unknown cursor value')
+        except (TypeError, ValueError) as error:
+            raise CursorError('Invalid cursor value') from error
+    if python_type is not None and not _is_a(value, python_type):
+        raise CursorError('Cursor value does not match its key')
+    return value
+
+
+def _is_a(value, python_type):
+    # bool is an int and datetime is a date, but neither belongs in the other's column
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+    if isinstance(value, datetime) and python_type is date:
+        return False
+    return isinstance(value, python_type)
+
+
+def _python_type(key):
+    """The Python type of a key column's values, None if the column type doesn't say"""
+    try:
+        return key.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def encode_cursor(values, direction):
+    """Opaque URL-safe cursor for the sort key values of a row"""
+    raw = json.dumps([direction, [_encode_value(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key_types):
+    """
+    Args:
+        cursor (str): A cursor from encode_cursor()
+        key_types (list): The Python type of each key value, None to accept any
+
+    Returns:
+        tuple: (direction, list of key values)
+
+    Raises:
+        CursorError: If the cursor is malformed or its values don't fit the keys
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as error:
+        raise CursorError('Invalid cursor') from error
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != len(key_types):
+        raise CursorError('Invalid cursor')
+    return direction, [_decode_value(value, python_type) for value, python_type in zip(values, key_types)]
+
+
+def clamp_per_page(value, default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def keyset_page(query, keys, key_of, cursor=None, per_page=DEFAULT_PER_PAGE, descending=False):
+    """
+    One page of a query, seeking past the previous page's last row
+
+    Instead of OFFSET, the next page starts with WHERE (keys) > (last row's
+    keys), so with an index on the keys every page costs the same however
+    deep it is.
+
+    Args:
+        query: An ORM query or Core select() without ORDER BY or LIMIT
+        keys (list): Column expressions that together are unique and non-null
+            (end with the primary key)
+        key_of (callable): Returns the key values of a result row
+        cursor (str, optional): next_cursor/prev_cursor of an earlier page
+        per_page (int): Rows per page
+        descending (bool): Sort newest/highest first
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        CursorError: If the cursor is malformed or doesn't fit the keys
+    """
+    direction, values = decode_cursor(cursor, [_python_type(key) for key in keys]) if cursor else ('next', None)
+    # Going back walks the index the other way, then flips the rows
+    reverse = direction == 'prev'
+    forward_desc = descending != reverse
+    if values is not None:
+        key_tuple, value_tuple = db.tuple_(*keys), db.tuple_(*[db.literal(value) for value in values])
+        query = query.filter(key_tuple < value_tuple if forward_desc else key_tuple > value_tuple)
+    order = [key.desc() if forward_desc else key.asc() for key in keys]
+    query = query.order_by(*order).limit(per_page + 1)
+    rows = db.session.execute(query).all() if isinstance(query, Select) else query.all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+    if not rows:
+        return KeysetPage([], None, None, per_page)
+    has_next = more if not reverse else True
+    has_prev = (values is not None) if not reverse else more
+    return KeysetPage(
+        rows,
+        encode_cursor(key_of(rows[-1]), 'next') if has_next else None,
+        encode_cursor(key_of(rows[0]), 'prev') if has_prev else None,
+        per_page,
+    )
@@ -4,35 +4,137 @@ import base64
 import os
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import threading
+import time
+from collections import OrderedDict
+from app.hash_pool import hash_pool
+
+
+class DerivedKeyCache:
+    """
+    Bounded, TTL-evicting cache of PBKDF2-derived encryption keys.
+    
+    Keys are stored per (user id, salt) so a user's data can be encrypted and
+    decrypted during their session without re-running the key derivation for
+    every field. Entries are evicted least-recently-used once max_entries is
+    reached, and expire ttl seconds after they were derived.
+    
+    The cache is only an accelerator: it is per process, so a request served
+    by another worker (or after expiry) finds no key. Callers must be able to
+    ask for the password again when get_encryption_key() raises ValueError.
+    A key is cached the first time it is derived from a password, never at
+    login, so users who never touch encrypted data pay nothing for it.
+    """
+    
+    def __init__(self, max_entries=1024, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Read cache settings from the app config"""
+        self.max_entries = app.config.get('KEY_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('KEY_CACHE_TTL', self.ttl)
+        self.clear()
+        from app.invalidation import invalidation_bus, USER
+        invalidation_bus.subscribe(USER, self.forget_users)
+    
+    def get(self, user_id, salt):
+        """Return the cached key for (user_id, salt), or None"""
+        cache_key = (user_id, bytes(salt))
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            key, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return key
+    
+    def put(self, user_id, salt, key):
+        """Store a derived key, evicting the oldest entries when full"""
+        if self.max_entries <= 0:
+            return
+        cache_key = (user_id, bytes(salt))
+        with self._lock:
+            self._entries[cache_key] = (key, time.monotonic() + self.ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate_user(self, user_id):
+        """Drop every cached key belonging to a user"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[cache_key]
+    
+    def forget_users(self, user_ids):
+        """Invalidation bus subscriber: a user's password may have changed in another process"""
+        if user_ids is None:
+            self.clear()
+            return
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+    
+    def clear(self):
+        """Drop all cached keys"""
+        with self._lock:
+            self._entries.clear()
+
+
+key_cache = DerivedKeyCache()
+
 
 class PasswordManager:
     """Handles password hashing, verification, and encryption/decryption"""
     
     @staticmethod
-    def hash_password(password):
+    def hash_password(password, method='pbkdf2:sha256', admission_keys=None):
         """
         Hash a password using Werkzeug's secure hashing
         
         Args:
             password (str): Plain text password
+            method (str, optional): Werkzeug hash method, normally the active
+                hashing policy's method (see app.hash_policy)
+            admission_keys (iterable, optional): When given, hashing runs in
+                the hashing pool instead of the request thread
             
         Returns:
             str: Hashed password
+            
+        Raises:
+            HashPoolBusy: If the hashing pool cannot accept the work right now
         """
-        return generate_password_hash(password, method='pbkdf2:sha256')
+        if admission_keys is not None:
+            return hash_pool.submit(generate_password_hash, password, method, keys=admission_keys)
+        return generate_password_hash(password, method=method)
     
     @staticmethod
-    def verify_password(hashed_password, password):
+    def verify_password(hashed_password, password, admission_keys=None):
         """
         Verify a password against its hash
         
+        When admission_keys are given (e.g. username and client IP), the check
+        runs in the dedicated hashing pool instead of the request thread.
+        
         Args:
             hashed_password (str): Hashed password from database
             password (str): Plain text password to verify
+            admission_keys (iterable, optional): Keys used for per-username/IP
+                concurrency limits in the hashing pool
             
         Returns:
             bool: True if password matches, False otherwise
+            
+        Raises:
+            HashPoolBusy: If the hashing pool cannot accept the check right now
         """
+        if admission_keys is not None:
+            return hash_pool.verify_password(hashed_password, password, keys=admission_keys)
         return check_password_hash(hashed_password, password)
     
     @staticmethod
@@ -60,7 +162,45 @@ class PasswordManager:
         return key, salt
     
     @staticmethod
-    def encrypt_data(data, password, salt=None):
+    def get_encryption_key(password, salt, user_id=None):
+        """
+        Return the encryption key for a password/salt, using the key cache
+        
+        The key is derived (and cached) on first use; later calls in this
+        process within KEY_CACHE_TTL may omit the password.
+        
+        Args:
+            password (str, optional): Password to derive the key from. May be
+                None when the key for (user_id, salt) is already cached.
+            salt (bytes): Salt for key derivation
+            user_id (int, optional): Owner of the key. When given, the derived
+                key is looked up in and stored to the key cache.
+            
+        Returns:
+            bytes: Encryption key
+            
+        Raises:
+            ValueError: If the key is not cached and no password was given;
+                ask the user for their password and call again
+        """
+        if user_id is not None:
+            key = key_cache.get(user_id, salt)
+            if key is not None:
+                return key
+        if password is None:
+            raise ValueError("Encryption key is not cached; the password is required")
+        key, _ = PasswordManager.generate_encryption_key(password, salt)
+        if user_id is not None:
+            key_cache.put(user_id, salt, key)
+        return key
+    
+    @staticmethod
+    def forget_user_keys(user_id):
+        """Remove a user's encryption keys from the key cache"""
+        key_cache.invalidate_user(user_id)
+    
+    @staticmethod
+    def encrypt_data(data, password, salt=None, user_id=None):
         """
         Encrypt data using a password-derived key
         
@@ -68,17 +208,20 @@ class PasswordManager:
             data (str): Data to encrypt
             password (str): Password to derive encryption key from
             salt (bytes, optional): Salt for key derivation. If None, generates new salt.
+            user_id (int, optional): Owner of the key, enables the key cache
             
         Returns:
             tuple: (encrypted_data, salt)
         """
-        key, salt = PasswordManager.generate_encryption_key(password, salt)
+        if salt is None:
+            salt = PasswordManager.generate_salt()
+        key = PasswordManager.get_encryption_key(password, salt, user_id)
         fernet = Fernet(key)
         encrypted_data = fernet.encrypt(data.encode())
         return encrypted_data, salt
     
     @staticmethod
-    def decrypt_data(encrypted_data, password, salt):
+    def decrypt_data(encrypted_data, password, salt, user_id=None):
         """
         Decrypt data using a password-derived key
         
@@ -86,6 +229,7 @@ class PasswordManager:
             encrypted_data (bytes): Encrypted data
             password (str): Password to derive decryption key from
             salt (bytes): Salt used for key derivation
+            user_id (int, optional): Owner of the key, enables the key cache
             
         Returns:
             str: Decrypted data
@@ -93,11 +237,34 @@ class PasswordManager:
         Raises:
             Exception: If decryption fails (wrong password or corrupted data)
         """
+        return PasswordManager.decrypt_many([encrypted_data], password, salt, user_id)[0]
+    
+    @staticmethod
+    def decrypt_many(encrypted_values, password, salt, user_id=None):
+        """
+        Decrypt several values with a single key derivation
+        
+        Args:
+            encrypted_values (iterable): Encrypted values (bytes). None entries
+                are passed through unchanged.
+            password (str): Password to derive decryption key from
+            salt (bytes): Salt used for key derivation
+            user_id (int, optional): Owner of the key, enables the key cache
+            
+        Returns:
+            list: Decrypted strings, in the same order as encrypted_values
+            
+        Raises:
+            ValueError: If the key is not cached and no password was given
+            Exception: If decryption fails (wrong password or corrupted data)
+        """
+        key = PasswordManager.get_encryption_key(password, salt, user_id)
         try:
-            key, _ = PasswordManager.generate_encryption_key(password, salt)
             fernet = Fernet(key)
-            decrypted_data = fernet.decrypt(encrypted_data)
-            return decrypted_data.decode()
+            return [
+                fernet.decrypt(value).decode() if value is not None else None
+                for value in encrypted_values
+            ]
         except Exception as e:
             raise Exception("Decryption failed. Check your password or data integrity.") from e
     
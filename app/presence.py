@@ -0,0 +1,192 @@
+import threading
+import time
+from array import array
+from datetime import time as dt_time
+from typing import NamedTuple
+from app import db
+from app.attendance_summary import is_late
+from app.event_bus import event_bus
+from app.invalidation import invalidation_bus, ATTENDANCE
+from app.live_board import CHANNEL
+from app.timezones import utc_now
+
+NO_TIME = -1
+MICROS_PER_SECOND = 1000000
+
+
+def _micros(value):
+    """A time as microseconds after midnight, NO_TIME for None"""
+    if value is None:
+        return NO_TIME
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * MICROS_PER_SECOND + value.microsecond
+
+
+class PresenceCounts(NamedTuple):
+    present: int  # Employees with at least one check-in today
+    checked_in: int  # Employees with an open session right now
+    late: int  # Employees whose first check-in today was late
+
+
+class PresenceIndex:
+    """
+    Today's present, checked-in and late counts, held in memory per process.
+
+    Each employee with attendance today gets a slot in a set of parallel
+    arrays (first check-in, open sessions, late flag), and the counts are
+    kept up to date as sessions change, so "how many are in" and "how many
+    were late" need no query. The index is only ever used for these
+    aggregates: a per-employee answer could be stale for up to
+    PRESENCE_RESYNC_SECONDS with the 'local' backend, so pages showing one
+    employee read the summary row instead (app.checkin.attendance_state).
+
+    The index is warmed with one query over today's attendance rows, then
+    follows the attendance events that check-in and check-out publish on the
+    event bus (from every worker with the 'postgres' backend). Events are
+    applied by session id, so repeats are ignored. It starts over when the
+    attendance day changes and is re-read from the database every
+    PRESENCE_RESYNC_SECONDS to pick up changes made outside check-in/out
+    (summary rebuilds, other workers with the 'local' backend); deletions
+    announced on the invalidation bus trigger a re-read straight away.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.resync_seconds = 300
+        self._lock = threading.RLock()
+        self._warm_lock = threading.Lock()  # One lazy re-read at a time; see _current()
+        self._day = None
+        self._loaded_at = 0.0
+        self._warm_buffers = []  # Per warm() call, the events that arrive while it is querying
+        self._reset(None)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PRESENCE_INDEX_ENABLED', True)
+        self.resync_seconds = app.config.get('PRESENCE_RESYNC_SECONDS', self.resync_seconds)
+        if self.enabled:
+            event_bus.add_listener(CHANNEL, self.apply_event)
+            invalidation_bus.subscribe(ATTENDANCE, self._attendance_changed)
+
+    def _reset(self, day):
+        self._day = day
+        self._slots = {}  # employee_id -> index into the arrays
+        self._first_checkin = array('q')
+        self._open = array('H')
+        self._late = bytearray()
+        self._sessions = {}  # session_id -> True while open, False once closed
+        self._present = 0
+        self._checked_in = 0
+        self._late_count = 0
+
+    def _slot(self, employee_id):
+        slot = self._slots.get(employee_id)
+        if slot is None:
+            slot = self._slots[employee_id] = len(self._open)
+            self._first_checkin.append(NO_TIME)
+            self._open.append(0)
+            self._late.append(0)
+        return slot
+
+    def _apply(self, session_id, employee_id, day, checkin, checkout):
+        # Callers hold the lock
+        known = self._sessions.get(session_id)
+        if known is False or (known is True and checkout is None):
+            return  # Already applied
+        slot = self._slot(employee_id)
+        if known is None:
+            checkin_micros = _micros(checkin)
+            if self._first_checkin[slot] == NO_TIME:
+                self._present += 1
+            if self._first_checkin[slot] == NO_TIME or checkin_micros < self._first_checkin[slot]:
+                self._first_checkin[slot] = checkin_micros
+                late = int(is_late(day, checkin))
+                self._late_count += late - self._late[slot]
+                self._late[slot] = late
+            if self._open[slot] == 0:
+                self._checked_in += 1
+            self._open[slot] += 1
+        if checkout is None:
+            self._sessions[session_id] = True
+            return
+        self._sessions[session_id] = False
+        self._open[slot] -= 1
+        if self._open[slot] == 0:
+            self._checked_in -= 1
+
+    def warm(self, day=None):
+        """Load a day (default today) from the database in one query"""
+        from app.models import Attendance
+        day = day or utc_now().date()
+        event_bus.ensure_listener()
+        buffer = []
+        with self._lock:
+            self._warm_buffers.append(buffer)
+        try:
+            rows = db.session.query(
+                Attendance.id, Attendance.employee_id, Attendance.checkin_time, Attendance.checkout_time,
+            ).filter(Attendance.date == day).order_by(Attendance.checkin_time).all()
+        except Exception:
+            with self._lock:
+                self._warm_buffers.remove(buffer)
+            raise
+        with self._lock:
+            self._warm_buffers.remove(buffer)
+            self._reset(day)
+            for session_id, employee_id, checkin, checkout in rows:
+                if checkin is not None:
+                    self._apply(session_id, employee_id, day, checkin, checkout)
+            # Replay events that raced with the query; the ones it saw are skipped
+            for payload in buffer:
+                self._apply_payload(payload)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Re-read the database on the next lookup"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _attendance_changed(self, ids):
+        self.invalidate()
+
+    def _current(self):
+        # Roll over at the start of a new attendance day and resync
+        # periodically; when disabled every lookup reads the database
+        today = utc_now().date()
+        event_bus.ensure_listener()  # Once per worker process, after fork
+        if self._fresh(today):
+            return today
+        # Requests that find the index stale together wait for one re-read
+        with self._warm_lock:
+            if not self._fresh(today):
+                self.warm(today)
+        return today
+
+    def _fresh(self, today):
+        with self._lock:
+            return (self.enabled and self._day == today
+                    and time.monotonic() - self._loaded_at < self.resync_seconds)
+
+    def _apply_payload(self, payload):
+        if self._day is None or payload['date'] != self._day.isoformat():
+            return  # Not warmed yet, or another day; the next warm reads it
+        checkout = payload['checkout']
+        self._apply(
+            payload['session_id'], payload['employee_id'], self._day,
+            dt_time.fromisoformat(payload['checkin']),
+            dt_time.fromisoformat(checkout) if checkout else None,
+        )
+
+    def apply_event(self, payload):
+        """Event bus listener for attendance events"""
+        with self._lock:
+            for buffer in self._warm_buffers:
+                buffer.append(payload)
+            self._apply_payload(payload)
+
+    def counts(self):
+        """PresenceCounts for today"""
+        self._current()
+        with self._lock:
+            return PresenceCounts(self._present, self._checked_in, self._late_count)
+
+
+presence = PresenceIndex()
@@ -0,0 +1,145 @@
+"""
+Read-only projections for listing and report pages.
+
+Each function runs a Core select() of just the columns a page shows and
+returns plain NamedTuple rows. They skip the ORM identity map, attribute
+instrumentation and change tracking, so never hand these rows to code that
+expects to modify and commit them. `flask reports bench-reads` compares the
+cost with loading ORM entities.
+"""
+from datetime import date, time
+from typing import NamedTuple, Optional
+import sqlalchemy as sa
+from app import db
+
+
+class LeaveRow(NamedTuple):
+    id: int
+    employee_id: int
+    employee_name: str
+    holiday_calendar_id: Optional[int]
+    leave_type: str
+    start_date: date
+    end_date: date
+    reason: str
+    status: Optional[str]
+    request_date: Optional[date]
+
+    @property
+    def working_days(self):
+        """Working days covered by the leave, per the employee's holiday calendar"""
+        from app.holidays import holiday_calendars
+        return holiday_calendars.get(self.holiday_calendar_id).working_days_between(self.start_date, self.end_date)
+
+
+class EmployeeCard(NamedTuple):
+    id: int
+    name: str
+    job_role: Optional[str]
+    unique_id_number: str
+
+
+class EmployeeRow(NamedTuple):
+    id: int
+    name: str
+    gender: str
+    address: str
+    phone_number: str
+    unique_id_number: str
+    job_role: Optional[str]
+    salary: Optional[float]
+    username: Optional[str]  # None when the employee has no user
+    role: Optional[str]
+
+
+class SessionRow(NamedTuple):
+    id: int
+    employee_id: int
+    employee_name: str
+    date: date
+    checkin_time: Optional[time]  # UTC
+    checkout_time: Optional[time]  # UTC
+
+
+class SummaryRow(NamedTuple):
+    employee_id: int
+    date: date
+    first_checkin: Optional[time]  # UTC
+    last_checkout: Optional[time]
+    worked_seconds: int
+    open_sessions: int
+    session_count: int
+    last_checkin: Optional[time]
+
+
+def _rows(row_type, statement):
+    return [row_type._make(row) for row in db.session.execute(statement)]
+
+
+def leave_select():
+    """Leave requests joined to their employee's name and calendar, as LeaveRow columns"""
+    from app.models import LeaveRequest, Employee
+    return sa.select(
+        LeaveRequest.id, LeaveRequest.employee_id, Employee.name, Employee.holiday_calendar_id,
+        LeaveRequest.leave_type, LeaveRequest.start_date, LeaveRequest.end_date,
+        LeaveRequest.reason, LeaveRequest.status, LeaveRequest.request_date,
+    ).join(Employee, Employee.id == LeaveRequest.employee_id)
+
+
+def leave_rows(statement):
+    """Run a leave_select() statement"""
+    return _rows(LeaveRow, statement)
+
+
+def employee_leaves(employee_id):
+    """An employee's leave requests, newest first"""
+    from app.models import LeaveRequest
+    return leave_rows(leave_select().where(LeaveRequest.employee_id == employee_id).order_by(
+        LeaveRequest.request_date.desc(), LeaveRequest.id.desc()))
+
+
+def employee_select():
+    """Employees with their user's username and role, as EmployeeRow columns"""
+    from app.models import Employee, User
+    return sa.select(
+        Employee.id, Employee.name, Employee.gender, Employee.address, Employee.phone_number,
+        Employee.unique_id_number, Employee.job_role, Employee.salary, User.username, User.role,
+    ).outerjoin(User, User.id == Employee.user_id)
+
+
+def employee_rows(statement):
+    """Run an employee_select() statement"""
+    return _rows(EmployeeRow, statement)
+
+
+def employee_card(employee_id):
+    """Name, role and id number of an employee, or None"""
+    from app.models import Employee
+    row = db.session.execute(sa.select(
+        Employee.id, Employee.name, Employee.job_role, Employee.unique_id_number,
+    ).where(Employee.id == employee_id)).first()
+    return EmployeeCard._make(row) if row else None
+
+
+def day_sessions(day):
+    """All attendance sessions of a day with employee names, newest check-in first"""
+    from app.models import Attendance, Employee
+    return _rows(SessionRow, sa.select(
+        Attendance.id, Attendance.employee_id, Employee.name, Attendance.date,
+        Attendance.checkin_time, Attendance.checkout_time,
+    ).join(Employee, Employee.id == Attendance.employee_id).where(
+        Attendance.date == day,
+    ).order_by(Attendance.checkin_time.desc(), Attendance.id.desc()))
+
+
+def summary_days(employee_ids, start_date, end_date):
+    """Daily attendance summaries of employees over a date range"""
+    from app.models import DailyAttendanceSummary as Summary
+    return _rows(SummaryRow, sa.select(
+        Summary.employee_id, Summary.date, Summary.first_checkin, Summary.last_checkout,
+        Summary.worked_seconds, Summary.open_sessions, Summary.session_count, Summary.last_checkin,
+    ).where(
+        Summary.employee_id.in_(list(employee_ids)),
+        Summary.date >= start_date,
+        Summary.date <= end_date,
+    ))
@@ -1,8 +1,12 @@
-import pytz
-from flask import render_template, request, redirect, url_for, session, flash, Blueprint, send_file, abort
+from flask import render_template, request, redirect, url_for, session, flash, Blueprint, send_file, abort, jsonify, Response, stream_with_context
 from functools import wraps
 from app import db
 from app.models import User, Employee, Attendance, LeaveRequest
+from app.hash_pool import HashPoolBusy
+from app.identity import current_identity
+from app.timezones import time_service, utc_now
+from app.invalidation import invalidation_bus, USER, EMPLOYEE, LEAVE_REQUEST, ATTENDANCE
+from app.sql_metrics import query_budget
 from datetime import datetime, date, timedelta
 import calendar
 
@@ -51,10 +55,24 @@ def login():
         username = request.form['username']
         password = request.form['password']
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        # Hash verification runs in the hashing pool; when it is saturated we
+        # answer straight away instead of holding the worker
+        admission_keys = (f'user:{username}', f'ip:{request.remote_addr}')
+        try:
+            password_ok = user is not None and user.check_password(password, admission_keys)
+        except HashPoolBusy:
+            flash('The server is busy handling other logins. Please try again in a few seconds.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
+        if password_ok:
             session.permanent = True  # Make session permanent with timeout
             session['user_id'] = user.id
             session['role'] = user.role
+            # Bring the stored hash up to the active hashing policy
+            try:
+                if user.upgrade_password_hash(password):
+                    db.session.commit()
+            except HashPoolBusy:
+                pass
             if user.role == 'employee':
                 return redirect(url_for('main.employee_attendance'))
             elif user.role == 'hr':
@@ -83,86 +101,34 @@ def not_found_error(error):
 @login_required
 @role_required(['employee'])
 def employee_attendance():
-    from app.models import Employee, Attendance, User
-    from datetime import datetime, date
-    today = date.today()
-    today_checkin_12 = None
-    today_checkout_12 = None
-    today_checkin_24 = None
-    today_checkout_24 = None
-    worked_seconds = 0
+    from app.checkin import check_in, check_out, attendance_state
+    from uuid import uuid4
+    identity = current_identity()
+    employee = identity.employee
 
-    user_id = session.get('user_id')
-    user = User.query.get(user_id) if user_id else None
-    employee = Employee.query.filter_by(user_id=user_id).first() if user_id else None
-
-    print(f"User ID: {user_id}, Employee: {employee}")
+    # Form fallback for browsers without JavaScript; the page itself talks
+    # to the JSON API (app.api) and never re-renders for a check-in
+    if request.method == 'POST':
+        action = request.form.get('action')
+        key = request.form.get('idempotency_key')
+        if not employee:
+            flash('No employee record found for this user.', 'error')
+        elif action == 'checkin':
+            changed, _ = check_in(employee.id, key)
+            flash('Checked in.' if changed else 'You are already checked in.', 'success' if changed else 'info')
+        elif action == 'checkout':
+            changed, _ = check_out(employee.id, key)
+            flash('Checked out.' if changed else 'You are not checked in.', 'success' if changed else 'info')
+        else:
+            flash('Unknown action.', 'error')
+        # Post/redirect/get: reloading the page does not resubmit the form
+        return redirect(url_for('main.employee_attendance'), 303)
 
-    if employee:
-        if request.method == 'POST':
-            action = request.form.get('action')
-            now = datetime.now().time()
-            if action == 'checkin':
-                # Check if login is late (after 9:30 AM)
-                late_login = now > datetime.strptime('09:30:00', '%H:%M:%S').time()
-                new_attendance = Attendance(
-                    employee_id=employee.id, 
-                    date=today, 
-                    checkin_time=now, 
-                    checkout_time=None,
-                    late_login=late_login
-                )
-                db.session.add(new_attendance)
-                db.session.commit()
-            elif action == 'checkout':
-                latest = Attendance.query.filter_by(employee_id=employee.id, date=today, checkout_time=None).order_by(Attendance.checkin_time.desc()).first()
-                if latest:
-                    latest.checkout_time = now
-                    db.session.commit()
-        attendances = Attendance.query.filter_by(employee_id=employee.id, date=today).order_by(Attendance.checkin_time).all()
-        if attendances:
-            latest = attendances[-1]
-            if latest.checkin_time and latest.checkout_time:
-                worked_seconds = (
-                    datetime.combine(today, latest.checkout_time) -
-                    datetime.combine(today, latest.checkin_time)
-                ).seconds
-            elif latest.checkin_time and not latest.checkout_time:
-                worked_seconds = (
-                    datetime.combine(today, datetime.now().time()) -
-                    datetime.combine(today, latest.checkin_time)
-                ).seconds
-            # Convert UTC to IST for check-in and check-out times
-            utc = pytz.utc
-            ist = pytz.timezone('Asia/Kolkata')
-            if latest.checkin_time:
-                dt_utc = datetime.combine(today, latest.checkin_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                today_checkin_24 = dt_ist.strftime('%H:%M:%S')
-                today_checkin_12 = dt_ist.strftime('%I:%M:%S %p')
-            if latest.checkout_time:
-                dt_utc = datetime.combine(today, latest.checkout_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                today_checkout_24 = dt_ist.strftime('%H:%M:%S')
-                today_checkout_12 = dt_ist.strftime('%I:%M:%S %p')
-    else:
-        print("No employee record found for this user.")
-    # Check if today's check-in was late
-    late_login = False
-    if employee:
-        today_attendance = Attendance.query.filter_by(employee_id=employee.id, date=today).order_by(Attendance.checkin_time.desc()).first()
-        if today_attendance and today_attendance.late_login:
-            late_login = True
-    
-    print("today_checkin:", today_checkin_12, "today_checkout:", today_checkout_12)
+    state = attendance_state(employee.id, utc_now().date()).to_dict() if employee else None
     return render_template(
         'employee/attendance.html',
-        today_checkin=today_checkin_12,
-        today_checkout=today_checkout_12,
-        today_checkin_24=today_checkin_24,
-        today_checkout_24=today_checkout_24,
-        worked_seconds=worked_seconds,
-        late_login=late_login
+        state=state,
+        idempotency_key=uuid4().hex,
     )
 
 
@@ -170,110 +136,63 @@ def employee_attendance():
 @login_required
 @role_required(['employee'])
 def employee_dashboard():
-    from app.models import User, Employee, Attendance
-    from datetime import date, datetime
-    employee_name = None
-    today_checkin_12 = None
-    today_checkout_12 = None
-    today_checkin_24 = None
-    today_checkout_24 = None
-    worked_seconds = 0
-
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            employee = Employee.query.filter_by(user_id=user.id).first()
-            if employee:
-                employee_name = employee.name
-            if employee:
-                today = date.today()
-                attendances = Attendance.query.filter_by(employee_id=employee.id, date=today).order_by(Attendance.checkin_time).all()
-                if attendances:
-                    latest = attendances[-1]
-                    # Convert UTC to IST for check-in and check-out times
-                    utc = pytz.utc
-                    ist = pytz.timezone('Asia/Kolkata')
-                    if latest.checkin_time:
-                        dt_utc = datetime.combine(today, latest.checkin_time).replace(tzinfo=utc)
-                        dt_ist = dt_utc.astimezone(ist)
-                        today_checkin_24 = dt_ist.strftime('%H:%M:%S')
-                        today_checkin_12 = dt_ist.strftime('%I:%M:%S %p')
-                    if latest.checkout_time:
-                        dt_utc = datetime.combine(today, latest.checkout_time).replace(tzinfo=utc)
-                        dt_ist = dt_utc.astimezone(ist)
-                        today_checkout_24 = dt_ist.strftime('%H:%M:%S')
-                        today_checkout_12 = dt_ist.strftime('%I:%M:%S %p')
-                    if latest.checkin_time and latest.checkout_time:
-                        worked_seconds = (
-                            datetime.combine(today, latest.checkout_time) -
-                            datetime.combine(today, latest.checkin_time)
-                        ).seconds
-                    elif latest.checkin_time and not latest.checkout_time:
-                        worked_seconds = (
-                            datetime.combine(today, datetime.now().time()) -
-                            datetime.combine(today, latest.checkin_time)
-                        ).seconds
-    
-    # Check if today's check-in was late
-    late_login = False
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            employee = Employee.query.filter_by(user_id=user.id).first()
-            if employee:
-                today_attendance = Attendance.query.filter_by(employee_id=employee.id, date=today).order_by(Attendance.checkin_time.desc()).first()
-                if today_attendance and today_attendance.late_login:
-                    late_login = True
-    
+    from app.checkin import attendance_state
+    identity = current_identity()
+    employee = identity.employee if identity else None
+    state = attendance_state(employee.id, utc_now().date()).to_dict() if employee else {}
     return render_template(
         'employee/dashboard.html',
-        employee_name=employee_name,
-        today_checkin=today_checkin_12,
-        today_checkout=today_checkout_12,
-        today_checkin_24=today_checkin_24,
-        today_checkout_24=today_checkout_24,
-        worked_seconds=worked_seconds,
-        late_login=late_login
+        employee_name=employee.name if employee else None,
+        today_checkin=state.get('checkin'),
+        today_checkout=state.get('checkout'),
+        worked_seconds=state.get('worked_seconds', 0),
+        late_login=state.get('late_login', False),
     )
 
 
 @main.route('/hr/dashboard')
+@query_budget(7)
 @login_required
 @role_required(['hr', 'admin'])
 def hr_dashboard():
-    from app.models import Employee, User, LeaveRequest, Attendance
     from datetime import date
     hr_name = None
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            hr_name = user.username
-    total_employees = Employee.query.count()
-    pending_leaves = LeaveRequest.query.filter_by(status='Pending').count()
-    
-    # Count late logins for today
+    identity = current_identity()
+    if identity:
+        hr_name = identity.user.username
+    # Cached counters; late logins come from the presence index
+    from app.dashboard_metrics import dashboard_metrics
+    counts = dashboard_metrics.counts()
     today = date.today()
-    late_logins_today = Attendance.query.filter_by(date=today, late_login=True).count()
+    
+    # Working days this month from the default holiday calendar
+    from app.holidays import holiday_calendars
+    holiday_calendar = holiday_calendars.get()
+    month_start = today.replace(day=1)
+    month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
     
     return render_template(
         'hr/dashboard.html',
         hr_name=hr_name,
-        total_employees=total_employees,
-        pending_leaves=pending_leaves,
-        attendance_issues=late_logins_today
+        total_employees=counts.employees,
+        pending_leaves=counts.pending_leaves,
+        attendance_issues=counts.late_today,
+        working_days_elapsed=holiday_calendar.working_days_between(month_start, today),
+        working_days_month=holiday_calendar.working_days_between(month_start, month_end),
+        today_holiday=holiday_calendar.holiday_name(today)
     )
 
 @main.route('/admin/dashboard')
+@query_budget(2)
 @login_required
 @role_required(['admin'])
 def admin_dashboard():
-    from app.models import User
     admin_name = None
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            admin_name = user.username
-    total_users = User.query.count()
+    identity = current_identity()
+    if identity:
+        admin_name = identity.user.username
+    from app.dashboard_metrics import dashboard_metrics, USERS
+    total_users = dashboard_metrics.get(USERS)
     # You can add logic for system_health and recent_activity as needed
     return render_template(
         'admin/dashboard.html',
@@ -330,6 +249,8 @@ def add_employee():
             user.set_password(generated_password)  # This will hash the password
             user.temporary_password = True  # Mark as temporary password
             db.session.add(user)
+            db.session.flush()
+            invalidation_bus.changed(db.session, USER, user.id)
             db.session.commit()
             
             employee = Employee(
@@ -343,6 +264,8 @@ def add_employee():
                 user_id=user.id
             )
             db.session.add(employee)
+            db.session.flush()
+            invalidation_bus.changed(db.session, EMPLOYEE, employee.id)
             db.session.commit()
             
             message = f'Employee added successfully! Generated password: {generated_password}'
@@ -378,15 +301,21 @@ def view_new_employee_password():
                          username=username)
 
 @main.route('/hr/employees')
+@query_budget(3)
 @login_required
 @role_required(['hr', 'admin'])
 def view_employees():
-    from app.models import Employee, User
-    employees = Employee.query.all()
+    from app.listings import employee_page, parse_employee_filters, job_roles
+    from app.pagination import clamp_per_page, CursorError
+    filters = parse_employee_filters(request.args)
+    per_page = clamp_per_page(request.args.get('per_page'))
+    try:
+        page = employee_page(filters, request.args.get('cursor'), per_page, with_user=True)
+    except CursorError:
+        return redirect(url_for('main.view_employees', **filters.args()))
     # Prepare a list of dicts with employee and user info
     employee_list = []
-    for emp in employees:
-        user = User.query.get(emp.user_id)
+    for emp in page.items:
         employee_list.append({
             'id': emp.id,
             'name': emp.name,
@@ -394,237 +323,191 @@ def view_employees():
             'address': emp.address,
             'phone_number': emp.phone_number,
             'unique_id_number': emp.unique_id_number,
-            'username': user.username if user else '',
-            'role': user.role if user else '',
+            'username': emp.username or '',
+            'role': emp.role or '',
             'job_role': emp.job_role,
             'salary': emp.salary
         })
-    return render_template('hr/view_employees.html', employees=employee_list)
+    return render_template('hr/view_employees.html', employees=employee_list, page=page,
+                           filters=filters, job_roles=job_roles(), per_page=per_page)
 
 @main.route('/hr/employee_list')
+@query_budget(3)
 @login_required
 @role_required(['hr', 'admin'])
 def employee_list():
-    from app.models import Employee
-    employees = Employee.query.all()
-    return render_template('hr/employee_list.html', employees=employees)
+    from app.listings import employee_page, parse_employee_filters, job_roles
+    from app.pagination import clamp_per_page, CursorError
+    filters = parse_employee_filters(request.args)
+    per_page = clamp_per_page(request.args.get('per_page'))
+    try:
+        page = employee_page(filters, request.args.get('cursor'), per_page)
+    except CursorError:
+        return redirect(url_for('main.employee_list', **filters.args()))
+    return render_template('hr/employee_list.html', employees=page.items, page=page,
+                           filters=filters, job_roles=job_roles(), per_page=per_page)
 
 @main.route('/hr/attendance/<int:employee_id>')
+@query_budget(6)
 @login_required
 @role_required(['hr', 'admin'])
 def employee_attendance_detail(employee_id):
-    from app.models import Employee, Attendance
-    from datetime import datetime, date, timedelta
-    
-    # Get filter parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    # Default to current month if no dates provided
-    if not start_date:
-        start_date = (date.today().replace(day=1)).strftime('%Y-%m-%d')
-    if not end_date:
-        end_date = date.today().strftime('%Y-%m-%d')
+    from app.attendance_report import build_report, parse_report_range
+    from app.read_models import employee_card
     
-    # Convert string dates to date objects
-    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-    
-    # Validate date range
-    if start_date_obj > end_date_obj:
+    # Get filter parameters (default to current month)
+    start_date_obj, end_date_obj, swapped = parse_report_range(
+        request.args.get('start_date'), request.args.get('end_date'))
+    if swapped:
         flash('Start date cannot be after end date.')
-        start_date_obj, end_date_obj = end_date_obj, start_date_obj
-        start_date, end_date = end_date, start_date
-    
-    employee = Employee.query.get_or_404(employee_id)
-    
-    # Get attendance records for the employee in the date range
-    records = Attendance.query.filter_by(employee_id=employee_id)\
-        .filter(Attendance.date >= start_date_obj, Attendance.date <= end_date_obj)\
-        .order_by(Attendance.date.desc()).all()
-    
-    # Create a dictionary of attendance records by date for quick lookup
-    attendance_dict = {}
-    for rec in records:
-        attendance_dict[rec.date] = rec
-    
-    # Generate all dates in the range
-    current_date = start_date_obj
-    attendance_list = []
-    total_hours = 0
-    total_days = 0
-    present_days = 0
-    holiday_days = 0
-    
-    while current_date <= end_date_obj:
-        total_days += 1
-        
-        if current_date in attendance_dict:
-            rec = attendance_dict[current_date]
-            # Calculate duration
-            duration = ""
-            duration_hours = 0
-            if rec.checkin_time and rec.checkout_time:
-                delta = (
-                    datetime.combine(rec.date, rec.checkout_time) -
-                    datetime.combine(rec.date, rec.checkin_time)
-                )
-                total_seconds = int(delta.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                duration = f"{hours:02}:{minutes:02}"
-                duration_hours = hours + (minutes / 60)
-                total_hours += duration_hours
-                present_days += 1
-            
-            # Determine status
-            status = "Complete"
-            if not rec.checkin_time:
-                status = "No Record"
-            elif not rec.checkout_time:
-                status = "Checked In"
-            
-            import pytz
-            utc = pytz.utc
-            ist = pytz.timezone('Asia/Kolkata')
-            if rec.checkin_time:
-                dt_utc = datetime.combine(rec.date, rec.checkin_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                checkin_time_str = dt_ist.strftime('%I:%M %p')
-                # Calculate late login based on IST
-                late_login = dt_ist.time() > datetime.strptime('09:30:00', '%H:%M:%S').time()
-            else:
-                checkin_time_str = '-'
-                late_login = False
-            if rec.checkout_time:
-                dt_utc = datetime.combine(rec.date, rec.checkout_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                checkout_time_str = dt_ist.strftime('%I:%M %p')
-            else:
-                checkout_time_str = '-'
-            attendance_list.append({
-                'date': rec.date.strftime('%Y-%m-%d'),
-                'day_name': rec.date.strftime('%A'),
-                'checkin_time': checkin_time_str,
-                'checkout_time': checkout_time_str,
-                'duration': duration or '-',
-                'duration_hours': duration_hours,
-                'status': status,
-                'late_login': late_login
-            })
-        else:
-            # Check if it's a holiday (Sunday or second Saturday)
-            day_name = current_date.strftime('%A')
-            day_of_month = current_date.day
-            
-            # Check if it's Sunday
-            is_sunday = day_name == 'Sunday'
-            
-            # Check if it's second Saturday (second Saturday of the month)
-            is_second_saturday = False
-            if day_name == 'Saturday':
-                # Count how many Saturdays have occurred in this month up to this date
-                saturday_count = 0
-                for i in range(1, day_of_month + 1):
-                    check_date = current_date.replace(day=i)
-                    if check_date.strftime('%A') == 'Saturday':
-                        saturday_count += 1
-                is_second_saturday = saturday_count == 2
-            
-            if is_sunday or is_second_saturday:
-                # Mark as holiday
-                holiday_days += 1
-                attendance_list.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'day_name': current_date.strftime('%A'),
-                    'checkin_time': '-',
-                    'checkout_time': '-',
-                    'duration': '-',
-                    'duration_hours': 0,
-                    'status': 'Holiday',
-                    'late_login': False
-                })
-            else:
-                # No attendance record for this date - mark as absent
-                attendance_list.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'day_name': current_date.strftime('%A'),
-                    'checkin_time': '-',
-                    'checkout_time': '-',
-                    'duration': '-',
-                    'duration_hours': 0,
-                    'status': 'Absent',
-                    'late_login': False
-                })
-        
-        current_date += timedelta(days=1)
     
-    # Sort by date (newest first) - convert string date back to date object for proper sorting
-    attendance_list.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d').date(), reverse=True)
-    
-    # Calculate working days (excluding holidays)
-    working_days = total_days - holiday_days
+    employee = employee_card(employee_id)
+    if employee is None:
+        abort(404)
+    report = build_report([employee.id], start_date_obj, end_date_obj)[employee.id]
+    totals = report.totals
     
     return render_template('hr/employee_attendance.html', 
                          employee=employee, 
-                         attendance_records=attendance_list,
-                         processed_records=attendance_list,
-                         total_hours=round(total_hours, 2),
-                         total_days=total_days,
-                         present_days=present_days,
-                         working_days=working_days,
-                         start_date=start_date,
-                         end_date=end_date)
+                         attendance_records=report.rows,
+                         processed_records=report.rows,
+                         total_hours=totals.total_hours,
+                         total_days=totals.total_days,
+                         present_days=totals.present_days,
+                         working_days=totals.working_days,
+                         start_date=start_date_obj.isoformat(),
+                         end_date=end_date_obj.isoformat())
+
+def _matrix_request():
+    """Parse the month, paging and filter arguments shared by the matrix views"""
+    from app.attendance_matrix import parse_month, DEFAULT_PER_PAGE
+    year, month = parse_month(request.args.get('month'))
+    return dict(
+        year=year,
+        month=month,
+        page=max(request.args.get('page', 1, type=int), 1),
+        per_page=max(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), 1),
+        search=request.args.get('q', '').strip() or None,
+        job_role=request.args.get('job_role') or None,
+    )
+
+@main.route('/hr/attendance/matrix')
+@query_budget(9)
+@login_required
+@role_required(['hr', 'admin'])
+def attendance_matrix():
+    from app.attendance_matrix import matrix_page, CELL_CODES
+    from app.exports import xlsx_available
+    try:
+        args = _matrix_request()
+    except ValueError:
+        flash('Invalid month.', 'error')
+        return redirect(url_for('main.attendance_matrix'))
+    pagination, rows = matrix_page(**args)
+    year, month = args['year'], args['month']
+    days_in_month = calendar.monthrange(year, month)[1]
+    days = [date(year, month, day) for day in range(1, days_in_month + 1)]
+    job_roles = [role for (role,) in db.session.query(Employee.job_role).filter(
+        Employee.job_role.isnot(None)).distinct().order_by(Employee.job_role)]
+    return render_template('hr/attendance_matrix.html',
+                           rows=rows,
+                           days=days,
+                           pagination=pagination,
+                           cell_codes=CELL_CODES,
+                           job_roles=job_roles,
+                           month=f'{year:04d}-{month:02d}',
+                           month_end=days[-1].isoformat(),
+                           month_label=days[0].strftime('%B %Y'),
+                           search=args['search'] or '',
+                           job_role=args['job_role'] or '',
+                           per_page=pagination.per_page,
+                           xlsx_available=xlsx_available())
+
+@main.route('/hr/attendance/matrix.json')
+@login_required
+@role_required(['hr', 'admin'])
+def attendance_matrix_json():
+    from app.attendance_matrix import matrix_page, CELL_CODES
+    try:
+        args = _matrix_request()
+    except ValueError:
+        return jsonify(error='month must be YYYY-MM'), 400
+    pagination, rows = matrix_page(**args)
+    return jsonify(
+        month=f"{args['year']:04d}-{args['month']:02d}",
+        days=calendar.monthrange(args['year'], args['month'])[1],
+        codes=CELL_CODES,
+        page=pagination.page,
+        per_page=pagination.per_page,
+        pages=pagination.pages,
+        total=pagination.total,
+        employees=[row.to_dict() for row in rows],
+    )
+
+@main.route('/hr/export/<dataset>.<fmt>')
+@login_required
+@role_required(['hr', 'admin'])
+def export_data(dataset, fmt):
+    """Stream attendance, daily summaries or leave as CSV (or a buffered XLSX) for payroll"""
+    from app.attendance_report import parse_report_range
+    from app.exports import export_stream, ExportError
+    try:
+        start_date, end_date, _ = parse_report_range(
+            request.args.get('start_date'), request.args.get('end_date'))
+        stream, mimetype, filename = export_stream(
+            dataset, fmt, start_date, end_date,
+            employee_ids=request.args.getlist('employee_id', type=int) or None,
+            job_role=request.args.get('job_role') or None,
+        )
+    except (ValueError, ExportError) as e:
+        abort(400, description=str(e))
+    return Response(stream_with_context(stream), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',  # Let nginx pass chunks straight through
+    })
 
 @main.route('/hr/attendance')
 @login_required
 @role_required(['hr', 'admin'])
 def view_attendance():
-    from app.models import Attendance, Employee
-    from datetime import date, datetime
-    today = date.today()
-    records = Attendance.query.join(Employee).filter(Attendance.date == today).order_by(Attendance.date.desc()).all()
-    attendance_list = []
-    for rec in records:
-        # Calculate duration
-        duration = ""
-        if rec.checkin_time and rec.checkout_time:
-            delta = (
-                datetime.combine(rec.date, rec.checkout_time) -
-                datetime.combine(rec.date, rec.checkin_time)
-            )
-            total_seconds = int(delta.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            seconds = total_seconds % 60
-            duration = f"{hours:02}:{minutes:02}:{seconds:02}"
-        import pytz
-        utc = pytz.utc
-        ist = pytz.timezone('Asia/Kolkata')
-        if rec.checkin_time:
-            dt_utc = datetime.combine(rec.date, rec.checkin_time).replace(tzinfo=utc)
-            dt_ist = dt_utc.astimezone(ist)
-            checkin_time_str = dt_ist.strftime('%I:%M:%S %p')
-            # Calculate late login based on IST
-            late_login = dt_ist.time() > datetime.strptime('09:30:00', '%H:%M:%S').time()
-        else:
-            checkin_time_str = '-'
-            late_login = False
-        if rec.checkout_time:
-            dt_utc = datetime.combine(rec.date, rec.checkout_time).replace(tzinfo=utc)
-            dt_ist = dt_utc.astimezone(ist)
-            checkout_time_str = dt_ist.strftime('%I:%M:%S %p')
-        else:
-            checkout_time_str = '-'
-        attendance_list.append({
-            'employee_name': rec.employee.name,
-            'date': rec.date.strftime('%Y-%m-%d'),
-            'checkin_time': checkin_time_str,
-            'checkout_time': checkout_time_str,
-            'duration': duration or '-',
-            'late_login': late_login
-        })
-    return render_template('hr/view_attendance.html', attendance=attendance_list)
+    from flask import current_app
+    from app.live_board import board_rows
+    from app.event_bus import event_bus
+    from app.presence import presence
+    # The page then follows check-ins through attendance_stream instead of reloading
+    today = utc_now().date()
+    return render_template(
+        'hr/view_attendance.html',
+        attendance=board_rows(today),
+        presence=presence.counts(),
+        live=current_app.config.get('LIVE_BOARD_ENABLED', False),
+        last_event_id=event_bus.last_event_id(),
+    )
+
+
+@main.route('/hr/attendance/stream')
+@login_required
+@role_required(['hr', 'admin'])
+def attendance_stream():
+    """Server-Sent Events with today's new and closed sessions"""
+    from flask import current_app
+    from app.live_board import event_stream
+    if not current_app.config.get('LIVE_BOARD_ENABLED', False):
+        abort(404)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    stream = event_stream(
+        utc_now().date(), time_service.display_zone(), last_event_id,
+        heartbeat=current_app.config.get('LIVE_BOARD_HEARTBEAT', 15),
+        max_seconds=current_app.config.get('LIVE_BOARD_STREAM_SECONDS', 300),
+        max_streams=current_app.config.get('LIVE_BOARD_MAX_STREAMS'),
+    )
+    # Hand the connection back to the pool; the stream only needs it for name lookups
+    db.session.close()
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Stop nginx/Render from buffering the stream
+    })
 
 @main.route('/hr/edit_employee/<int:employee_id>', methods=['GET', 'POST'])
 @login_required
@@ -656,6 +539,8 @@ def edit_employee(employee_id):
             employee.job_role = job_role
             employee.salary = salary
             user.username = username
+            invalidation_bus.changed(db.session, EMPLOYEE, employee.id)
+            invalidation_bus.changed(db.session, USER, user.id)
             db.session.commit()
             message = 'Employee details updated successfully!'
     return render_template('hr/edit_employee.html', employee=employee, user=user, message=message)
@@ -689,6 +574,7 @@ def reset_password(employee_id):
         temp_password = generate_temp_password()
         user.set_password(temp_password)
         user.temporary_password = True
+        invalidation_bus.changed(db.session, USER, user.id)
         db.session.commit()
         return render_template('hr/reset_password_confirmation.html',
                                temp_password=temp_password,
@@ -726,7 +612,7 @@ def view_reset_password():
 @login_required
 @role_required(['hr', 'admin'])
 def delete_employee(employee_id):
-    from app.models import Employee, User, Attendance, LeaveRequest
+    from app.models import Employee, User, Attendance, LeaveRequest, DailyAttendanceSummary
     try:
         employee = Employee.query.get_or_404(employee_id)
         user = User.query.get(employee.user_id)
@@ -737,6 +623,7 @@ def delete_employee(employee_id):
         for record in attendance_records:
             db.session.delete(record)
         print(f"Deleted {len(attendance_records)} attendance records")
+        DailyAttendanceSummary.query.filter_by(employee_id=employee_id).delete()
         
         # Delete leave requests
         leave_records = LeaveRequest.query.filter_by(employee_id=employee_id).all()
@@ -744,7 +631,9 @@ def delete_employee(employee_id):
             db.session.delete(record)
         print(f"Deleted {len(leave_records)} leave request records")
         
-        # Commit the deletion of related records first
+        # Commit the deletion of related records first; the rows are gone, so caches just re-read
+        invalidation_bus.changed(db.session, ATTENDANCE)
+        invalidation_bus.changed(db.session, LEAVE_REQUEST)
         db.session.commit()
         
         # Now delete the employee
@@ -755,6 +644,9 @@ def delete_employee(employee_id):
             db.session.delete(user)
         
         # Final commit
+        invalidation_bus.changed(db.session, EMPLOYEE, employee_id)
+        if user:
+            invalidation_bus.changed(db.session, USER, user.id)
         db.session.commit()
         flash('Employee and all related records deleted successfully!', 'success')
         
@@ -776,6 +668,9 @@ def home():
 
 @main.route('/logout')
 def logout():
+    from app.password_utils import PasswordManager
+    if 'user_id' in session:
+        PasswordManager.forget_user_keys(session['user_id'])
     session.clear()
     session.permanent = False  # Reset session to non-permanent
     return redirect(url_for('main.login'))
@@ -791,8 +686,7 @@ def leave_request():
         start_date = request.form.get('start_date')
         end_date = request.form.get('end_date')
         reason = request.form.get('reason')
-        user_id = session.get('user_id')
-        employee = Employee.query.filter_by(user_id=user_id).first() if user_id else None
+        employee = current_identity().employee
         if employee:
             leave = LeaveRequest(
                 employee_id=employee.id,
@@ -803,15 +697,20 @@ def leave_request():
                 status='Pending'
             )
             db.session.add(leave)
+            db.session.flush()
+            invalidation_bus.changed(db.session, LEAVE_REQUEST, leave.id)
             db.session.commit()
             message = "Leave request submitted successfully!"
     return render_template('employee/leave_request.html', message=message)
 
 @main.route('/hr/leave_requests', methods=['GET', 'POST'])
+@query_budget(8)
 @login_required
 @role_required(['hr', 'admin'])
 def hr_leave_requests():
-    from app.models import LeaveRequest, Employee
+    from app.models import LeaveRequest
+    from app.listings import leave_page, parse_leave_filters, LEAVE_STATUSES, LEAVE_TYPES
+    from app.pagination import clamp_per_page, CursorError
     message = None
     if request.method == 'POST':
         leave_id = request.form.get('leave_id')
@@ -819,21 +718,32 @@ def hr_leave_requests():
         leave = LeaveRequest.query.get(leave_id)
         if leave and action in ['Accepted', 'Rejected']:
             leave.status = action
+            invalidation_bus.changed(db.session, LEAVE_REQUEST, leave.id)
             db.session.commit()
             message = f"Leave request {action.lower()}."
-    leave_requests = LeaveRequest.query.join(Employee).order_by(LeaveRequest.request_date.desc()).all()
-    return render_template('hr/leave_requests.html', leave_requests=leave_requests, message=message)
+    try:
+        filters = parse_leave_filters(request.args)
+    except ValueError:
+        flash('Invalid date; use YYYY-MM-DD.', 'error')
+        return redirect(url_for('main.hr_leave_requests'))
+    per_page = clamp_per_page(request.args.get('per_page'))
+    try:
+        page = leave_page(filters, request.args.get('cursor'), per_page)
+    except CursorError:
+        return redirect(url_for('main.hr_leave_requests', **filters.args()))
+    return render_template('hr/leave_requests.html', leave_requests=page.items, page=page, message=message,
+                           filters=filters, statuses=LEAVE_STATUSES, leave_types=LEAVE_TYPES, per_page=per_page)
 
 @main.route('/employee/leave_status')
+@query_budget(4)
 @login_required
 @role_required(['employee'])
 def leave_status():
-    from app.models import Employee, LeaveRequest
+    from app.read_models import employee_leaves
     leave_requests = []
-    if 'user_id' in session:
-        employee = Employee.query.filter_by(user_id=session['user_id']).first()
-        if employee:
-            leave_requests = LeaveRequest.query.filter_by(employee_id=employee.id).order_by(LeaveRequest.request_date.desc()).all()
+    employee = current_identity().employee
+    if employee:
+        leave_requests = employee_leaves(employee.id)
     return render_template('employee/leave_status.html', leave_requests=leave_requests)
 
 
@@ -841,181 +751,36 @@ def leave_status():
 @login_required
 @role_required(['employee'])
 def employee_profile():
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
-    employee_obj = Employee.query.filter_by(user_id=user_id).first()
-    return render_template('employee/profile.html', user=user, employee=employee_obj)
-
-@main.app_context_processor
-def inject_profile_pic_url():
-    user_id = session.get('user_id')
-    profile_pic_url = None
-    if user_id:
-        employee = Employee.query.filter_by(user_id=user_id).first()
-        if employee and employee.profile_pic:
-            profile_pic_url = url_for('employee.employee_profile_pic', employee_id=employee.id)
-    return dict(profile_pic_url=profile_pic_url)
+    identity = current_identity()
+    return render_template('employee/profile.html', user=identity.user, employee=identity.employee)
 
 @main.route('/employee/attendance_report', methods=['GET'])
 @login_required
 @role_required(['employee'])
 def employee_attendance_report():
-    from app.models import Employee, Attendance, User
-    from datetime import date, datetime, timedelta
+    from app.attendance_report import build_report, parse_report_range
     
-    # Get filter parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    # Default to current month if no dates provided
-    if not start_date:
-        start_date = (date.today().replace(day=1)).strftime('%Y-%m-%d')
-    if not end_date:
-        end_date = date.today().strftime('%Y-%m-%d')
-    
-    # Convert string dates to date objects
-    start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-    
-    # Validate date range
-    if start_date_obj > end_date_obj:
+    # Get filter parameters (default to current month)
+    start_date_obj, end_date_obj, swapped = parse_report_range(
+        request.args.get('start_date'), request.args.get('end_date'))
+    if swapped:
         flash('Start date cannot be after end date.')
-        start_date_obj, end_date_obj = end_date_obj, start_date_obj
-        start_date, end_date = end_date, start_date
     
     # Get current employee
-    user_id = session.get('user_id')
-    user = User.query.get(user_id) if user_id else None
-    employee = Employee.query.filter_by(user_id=user_id).first() if user_id else None
+    employee = current_identity().employee
     
     if not employee:
         flash('Employee record not found.')
         return redirect(url_for('main.employee_dashboard'))
     
-    # Get attendance records for the employee in the date range
-    records = Attendance.query.filter_by(employee_id=employee.id)\
-        .filter(Attendance.date >= start_date_obj, Attendance.date <= end_date_obj)\
-        .order_by(Attendance.date.desc()).all()
-    
-    # Create a dictionary of attendance records by date for quick lookup
-    attendance_dict = {}
-    for rec in records:
-        attendance_dict[rec.date] = rec
-    
-    # Generate all dates in the range
-    current_date = start_date_obj
-    attendance_list = []
-    total_hours = 0
-    total_days = 0
-    present_days = 0
-    
-    while current_date <= end_date_obj:
-        total_days += 1
-        
-        if current_date in attendance_dict:
-            rec = attendance_dict[current_date]
-            # Calculate duration
-            duration = ""
-            duration_hours = 0
-            if rec.checkin_time and rec.checkout_time:
-                delta = (
-                    datetime.combine(rec.date, rec.checkout_time) -
-                    datetime.combine(rec.date, rec.checkin_time)
-                )
-                total_seconds = int(delta.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                duration = f"{hours:02}:{minutes:02}"
-                duration_hours = hours + (minutes / 60)
-                total_hours += duration_hours
-                present_days += 1
-            
-            # Determine status
-            status = "Present"
-            if not rec.checkin_time:
-                status = "Absent"
-            elif not rec.checkout_time:
-                status = "Checked In"
-            
-            import pytz
-            utc = pytz.utc
-            ist = pytz.timezone('Asia/Kolkata')
-            if rec.checkin_time:
-                dt_utc = datetime.combine(rec.date, rec.checkin_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                checkin_time_str = dt_ist.strftime('%I:%M %p')
-            else:
-                checkin_time_str = '-'
-            if rec.checkout_time:
-                dt_utc = datetime.combine(rec.date, rec.checkout_time).replace(tzinfo=utc)
-                dt_ist = dt_utc.astimezone(ist)
-                checkout_time_str = dt_ist.strftime('%I:%M %p')
-            else:
-                checkout_time_str = '-'
-            attendance_list.append({
-                'date': rec.date.strftime('%Y-%m-%d'),
-                'day_name': rec.date.strftime('%A'),
-                'checkin_time': checkin_time_str,
-                'checkout_time': checkout_time_str,
-                'duration': duration or '-',
-                'duration_hours': duration_hours,
-                'status': status,
-                'late_login': rec.late_login
-            })
-        else:
-            # Check if it's a holiday (Sunday or second Saturday)
-            day_name = current_date.strftime('%A')
-            day_of_month = current_date.day
-            
-            # Check if it's Sunday
-            is_sunday = day_name == 'Sunday'
-            
-            # Check if it's second Saturday (second Saturday of the month)
-            is_second_saturday = False
-            if day_name == 'Saturday':
-                # Count how many Saturdays have occurred in this month up to this date
-                saturday_count = 0
-                for i in range(1, day_of_month + 1):
-                    check_date = current_date.replace(day=i)
-                    if check_date.strftime('%A') == 'Saturday':
-                        saturday_count += 1
-                is_second_saturday = saturday_count == 2
-            
-            if is_sunday or is_second_saturday:
-                # Mark as holiday
-                attendance_list.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'day_name': current_date.strftime('%A'),
-                    'checkin_time': '-',
-                    'checkout_time': '-',
-                    'duration': '-',
-                    'duration_hours': 0,
-                    'status': 'Holiday',
-                    'late_login': False
-                })
-            else:
-                # No attendance record for this date - mark as absent
-                attendance_list.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'day_name': current_date.strftime('%A'),
-                    'checkin_time': '-',
-                    'checkout_time': '-',
-                    'duration': '-',
-                    'duration_hours': 0,
-                    'status': 'Absent',
-                    'late_login': False
-                })
-        
-        current_date += timedelta(days=1)
-    
-    # Sort by date (newest first) - convert string date back to date object for proper sorting
-    attendance_list.sort(key=lambda x: datetime.strptime(x['date'], '%Y-%m-%d').date(), reverse=True)
+    report = build_report([employee.id], start_date_obj, end_date_obj)[employee.id]
+    totals = report.totals
     
     return render_template('employee/attendance_report.html', 
-                         attendance=attendance_list,
+                         attendance=report.rows,
                          employee=employee,
-                         start_date=start_date,
-                         end_date=end_date,
-                         total_hours=round(total_hours, 2),
-                         total_days=total_days,
-                         present_days=present_days)
+                         start_date=start_date_obj.isoformat(),
+                         end_date=end_date_obj.isoformat(),
+                         total_hours=totals.total_hours,
+                         total_days=totals.total_days,
+                         present_days=totals.present_days)
@@ -0,0 +1,148 @@
+import collections
+import logging
+import re
+import time
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_PARAM = re.compile(r'%\(\w+\)s|:\w+|\$\d+')
+_NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+_LIST = re.compile(r'\?(\s*,\s*\?)+')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """A view issued more queries than its @query_budget (SQL_QUERY_BUDGET_STRICT only)"""
+
+
+def fingerprint(statement):
+    """
+    A statement with its parameters and literals replaced, so the same query
+    with different values (or IN lists of different lengths) compares equal
+    """
+    statement = _PARAM.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _LIST.sub('?', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+def query_budget(limit):
+    """
+    Declare the most queries a view may issue per request, counting the login
+    guard's identity query. Budgets are for a worker's first request, with
+    the per-process caches (dashboard counters, presence index, holiday
+    calendars, two of them in use) still cold; warm requests run fewer. Put
+    it directly under the route decorator.
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+class RequestQueries:
+    """The statements run while handling one request"""
+
+    __slots__ = ('count', 'seconds', 'fingerprints')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = collections.Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """(fingerprint, times) of statements run at least threshold times, most frequent first"""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+
+def current_queries():
+    """The RequestQueries of this request so far, or None outside a request"""
+    return g.get('sql_queries') if has_request_context() else None
+
+
+class SqlMetrics:
+    """
+    Counts and times the SQL each request runs.
+
+    Every request gets a `Server-Timing: db;dur=<ms>;desc="<n> queries"`
+    header (browser dev tools show it under Timing) and one log line on the
+    app.sql_metrics logger. Statements repeated SQL_REPEAT_THRESHOLD times
+    in one request, the usual sign of an N+1 loop, are logged as warnings.
+    Views declare a query_budget(); going over it is a warning, or a
+    QueryBudgetExceeded error with SQL_QUERY_BUDGET_STRICT (for tests).
+    Queries run after the response starts (streamed pages) are not counted.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.repeat_threshold = 5
+        self.strict = False
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SQL_METRICS_ENABLED', True)
+        self.repeat_threshold = app.config.get('SQL_REPEAT_THRESHOLD', self.repeat_threshold)
+        self.strict = app.config.get('SQL_QUERY_BUDGET_STRICT', False)
+        if not self.enabled:
+            return
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        queries = g.pop('sql_queries', None) or RequestQueries()
+        duration_ms = queries.seconds * 1000
+        response.headers.add('Server-Timing', f'db;dur={duration_ms:.1f};desc="{queries.count} queries"')
+        endpoint = request.endpoint or ''
+        repeated = queries.repeated(self.repeat_threshold)
+        logger.info(
+            "sql endpoint=%s status=%d queries=%d db_ms=%.1f repeated=%d",
+            endpoint, response.status_code, queries.count, duration_ms, len(repeated),
+            extra={'sql': {
+                'endpoint': endpoint,
+                'method': request.method,
+                'status': response.status_code,
+                'queries': queries.count,
+                'db_ms': round(duration_ms, 1),
+                'repeated': [{'statement': sql, 'times': n} for sql, n in repeated],
+            }},
+        )
+        for sql, n in repeated:
+            logger.warning("Possible N+1 in %s: %d x %s", endpoint, n, sql[:300])
+        budget = getattr(current_app.view_functions.get(endpoint), 'query_budget', None)
+        if budget is not None and queries.count > budget:
+            message = f"{endpoint} ran {queries.count} queries, over its budget of {budget}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+# The start time lives on the statement's execution context, not the pooled
+# connection: a statement that raises never reaches after_cursor_execute, and
+# its start must not be left behind for the next statement to pair with
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._sql_metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_sql_metrics_started', None)
+    if started is None or not has_request_context():
+        return
+    seconds = time.perf_counter() - started
+    queries = g.get('sql_queries')
+    if queries is None:
+        queries = g.sql_queries = RequestQueries()
+    queries.record(statement, seconds)
+
+
+sql_metrics = SqlMetrics()
@@ -0,0 +1,204 @@
+import hashlib
+import io
+import logging
+import os
+import queue
+import threading
+from app.blob_store import blob_store
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it the original picture is served
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (48, 160, 512)
+VARIANT_FORMAT = 'WEBP'
+VARIANT_MIMETYPE = 'image/webp'
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+# The only types profile pictures are stored and served as
+IMAGE_MIMETYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+# Served pictures can't run script or load anything, even if a browser renders one as a document
+IMAGE_CSP = "default-src 'none'; img-src 'self'; style-src 'unsafe-inline'; sandbox"
+
+
+def sniff_image_mimetype(header):
+    """
+    Detect the image type from the first bytes of a file
+
+    Args:
+        header (bytes): At least the first 12 bytes of the upload
+
+    Returns:
+        str or None: mimetype of a supported image, None otherwise
+    """
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mimetype
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def verify_image(stream):
+    """
+    Detect the type of an uploaded image and check that the whole file is one
+
+    The first bytes pick the type; with Pillow the file must also parse as
+    an image of that type, which rejects truncated files and other content
+    behind an image header. The stream is rewound either way.
+
+    Args:
+        stream: Seekable binary file object of the upload
+
+    Returns:
+        str or None: mimetype of a supported, intact image, None otherwise
+    """
+    mimetype = sniff_image_mimetype(stream.read(16))
+    stream.seek(0)
+    if mimetype is None or Image is None:
+        return mimetype
+    try:
+        with Image.open(stream) as image:
+            detected = image.get_format_mimetype()
+            image.verify()
+    except Exception:
+        return None
+    finally:
+        stream.seek(0)
+    return mimetype if detected == mimetype else None
+
+
+def variant_key(key, size):
+    """Blob key of the size variant of an original picture"""
+    return hashlib.sha256(f'{key}:{size}:{VARIANT_FORMAT}'.encode()).hexdigest()
+
+
+def render_variant(source, size):
+    """
+    Render a square, centre-cropped variant of an image
+
+    Args:
+        source: Path or binary file object of the original image
+        size (int): Edge length in pixels
+
+    Returns:
+        bytes: The encoded variant
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, VARIANT_FORMAT, quality=80, method=4)
+        return output.getvalue()
+
+
+class VariantWorker:
+    """
+    Generates profile picture size variants on a background thread.
+
+    Uploads only enqueue the original's blob key; the worker renders each
+    configured size into the blob store. Until a variant exists the original
+    is served instead, so a full or dropped queue only delays the savings.
+    Keys already queued, or whose variants failed to render, are not queued
+    again by this process (`flask blobs build-variants` retries them).
+    """
+
+    def __init__(self):
+        self.sizes = DEFAULT_SIZES
+        self.max_queue = 256
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = set()  # Keys in the queue or being rendered
+        self._failed = set()  # Keys whose variants could not be rendered
+
+    def init_app(self, app):
+        """Read variant settings from the app config"""
+        self.sizes = tuple(sorted(app.config.get('PROFILE_PIC_SIZES') or DEFAULT_SIZES))
+        self.max_queue = app.config.get('PROFILE_PIC_VARIANT_QUEUE', self.max_queue)
+        if Image is None:
+            logger.warning("Pillow is not installed; profile picture variants are disabled")
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def nearest_size(self, size):
+        """Smallest configured variant at least as large as size"""
+        for candidate in self.sizes:
+            if candidate >= size:
+                return candidate
+        return self.sizes[-1]
+
+    def _ensure_thread(self):
+        # Started lazily so every gunicorn worker gets its own thread after fork
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pending = set()
+                self._thread = threading.Thread(target=self._run, name='profile-pic-variants', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+            return self._queue
+
+    def enqueue(self, key):
+        """Schedule variant generation for an original picture's blob key"""
+        if not self.available or not key:
+            return False
+        work = self._ensure_thread()
+        with self._lock:
+            if key in self._pending or key in self._failed:
+                return False
+            self._pending.add(key)
+        try:
+            work.put_nowait(key)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+            logger.warning("Variant queue full, skipping %s (run `flask blobs build-variants`)", key)
+            return False
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            try:
+                self.build_variants(key)
+            except Exception:
+                logger.exception("Could not build profile picture variants for %s", key)
+                with self._lock:
+                    self._failed.add(key)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+    def build_variants(self, key):
+        """Render any missing variants of one picture; returns how many were written"""
+        if not self.available or not blob_store.exists(key):
+            return 0
+        written = 0
+        for size in self.sizes:
+            target = variant_key(key, size)
+            if blob_store.exists(target):
+                continue
+            source = blob_store.local_path(key)
+            if source is None:
+                with blob_store.open(key) as original:
+                    source = io.BytesIO(original.read())
+            blob_store.put(render_variant(source, size), key=target)
+            written += 1
+        return written
+
+
+variant_worker = VariantWorker()
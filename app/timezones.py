@@ -0,0 +1,145 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+SECONDS_PER_DAY = 24 * 3600
+
+# Display formats used across the attendance pages
+TIME_12H = '%I:%M %p'
+TIME_12H_SECONDS = '%I:%M:%S %p'
+TIME_24H_SECONDS = '%H:%M:%S'
+
+
+def utc_now():
+    """Current UTC time as a naive datetime, the form attendance is stored in"""
+    return datetime.now(dt_timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=64)
+def get_zone(name):
+    """Return the ZoneInfo for an IANA name, raising ValueError if unknown"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name!r}")
+
+
+def is_valid_zone(name):
+    try:
+        get_zone(name)
+        return True
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=1)
+def zone_choices():
+    """Sorted IANA zone names for select boxes"""
+    return sorted(available_timezones())
+
+
+@lru_cache(maxsize=4096)
+def day_offset(zone_name, day):
+    """
+    UTC offset of a zone in seconds for a whole UTC day
+
+    Returns None when the offset changes during that day (a DST switch);
+    callers then convert each value through zoneinfo.
+    """
+    zone = get_zone(zone_name)
+    start = datetime.combine(day, time.min, dt_timezone.utc)
+    first = start.astimezone(zone).utcoffset()
+    last = (start + timedelta(seconds=SECONDS_PER_DAY - 1)).astimezone(zone).utcoffset()
+    return int(first.total_seconds()) if first == last else None
+
+
+@lru_cache(maxsize=16384)
+def format_time(value, fmt):
+    """strftime() memoized on (time, format); attendance columns repeat a lot"""
+    return value.strftime(fmt)
+
+
+def utc_to_local(day, value, zone_name):
+    """Convert a UTC wall time stored with its date to the zone's local time"""
+    offset = day_offset(zone_name, day)
+    if offset is None:
+        return datetime.combine(day, value, dt_timezone.utc).astimezone(get_zone(zone_name)).time()
+    seconds = (value.hour * 3600 + value.minute * 60 + value.second + offset) % SECONDS_PER_DAY
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60, value.microsecond)
+
+
+class TimeService:
+    """
+    Converts stored UTC attendance times for display.
+
+    The organisation's zone comes from DISPLAY_TIMEZONE; users may pick
+    their own zone, which is used for the pages they view. Late logins are
+    always judged in the organisation's zone.
+    """
+
+    def __init__(self):
+        self.default_zone = DEFAULT_TIMEZONE
+
+    def init_app(self, app):
+        name = app.config.get('DISPLAY_TIMEZONE') or DEFAULT_TIMEZONE
+        get_zone(name)  # Fail at startup on a typo rather than on the first page view
+        self.default_zone = name
+
+    def display_zone(self):
+        """Zone for the current request's user, or the organisation's zone"""
+        from app.identity import current_identity
+        try:
+            identity = current_identity()
+        except RuntimeError:  # Outside an application context (CLI, benchmarks)
+            identity = None
+        user_zone = getattr(identity.user, 'timezone', None) if identity else None
+        return user_zone or self.default_zone
+
+    def to_local(self, day, value, zone_name=None):
+        """Local time of a UTC time stored with its date; None stays None"""
+        if value is None:
+            return None
+        return utc_to_local(day, value, zone_name or self.display_zone())
+
+    def localize_column(self, values, zone_name=None):
+        """
+        Convert a whole column of (date, utc_time) pairs at once
+
+        The zone is resolved once and offsets are looked up once per distinct
+        date, so each row costs a few integer operations.
+
+        Returns:
+            list: local times, None where the input time was None
+        """
+        zone_name = zone_name or self.display_zone()
+        offsets = {}
+        local = []
+        for day, value in values:
+            if value is None:
+                local.append(None)
+                continue
+            offset = offsets.get(day, False)
+            if offset is False:
+                offset = offsets[day] = day_offset(zone_name, day)
+            if offset is None:
+                local.append(utc_to_local(day, value, zone_name))
+                continue
+            seconds = (value.hour * 3600 + value.minute * 60 + value.second + offset) % SECONDS_PER_DAY
+            local.append(time(seconds // 3600, seconds // 60 % 60, seconds % 60, value.microsecond))
+        return local
+
+    def format_column(self, values, fmt=TIME_12H_SECONDS, zone_name=None, placeholder='-'):
+        """localize_column() followed by formatting; missing times become placeholder"""
+        return [
+            format_time(value, fmt) if value is not None else placeholder
+            for value in self.localize_column(values, zone_name)
+        ]
+
+    def format(self, day, value, fmt=TIME_12H_SECONDS, zone_name=None, placeholder=None):
+        """Format a single stored UTC time in the display zone"""
+        local = self.to_local(day, value, zone_name)
+        return format_time(local, fmt) if local is not None else placeholder
+
+
+time_service = TimeService()
@@ -0,0 +1,191 @@
+from datetime import date, time
+from typing import NamedTuple, Optional
+from app import db
+from app.pagination import keyset_page, DEFAULT_PER_PAGE
+from app.timezones import time_service, utc_now, TIME_12H
+
+USER_ROLES = ('admin', 'hr', 'employee')
+
+
+class UserFilters(NamedTuple):
+    role: Optional[str] = None
+    search: Optional[str] = None  # Username, user name or employee name contains
+
+    def args(self):
+        """The filters as query arguments, for links to other pages"""
+        return {'role': self.role, 'q': self.search}
+
+
+class AttendanceStats(NamedTuple):
+    date: date  # The attendance day "today" refers to
+    total_records: int  # Attendance sessions ever
+    present_today: bool
+    login_time: Optional[time]  # Today's first check-in, UTC
+    last_checkout_date: Optional[date]  # Latest closed session
+    last_checkout: Optional[time]  # UTC
+
+
+class LeaveStats(NamedTuple):
+    total_requests: int
+    pending: int
+    approved: int
+    rejected: int  # Everything neither pending nor approved
+
+
+class UserStats(NamedTuple):
+    user_id: int
+    username: str
+    role: str
+    name: Optional[str]  # Employee name for employees, else the user's name
+    employee_id: Optional[int]
+    job_role: Optional[str]
+    attendance: Optional[AttendanceStats]  # None for users without an employee record
+    leaves: Optional[LeaveStats]
+
+    def to_dict(self, zone_name=None, fmt=TIME_12H):
+        """JSON-ready stats with times formatted in zone_name"""
+        attendance = leaves = None
+        if self.attendance:
+            stats = self.attendance
+            attendance = {
+                'total_records': stats.total_records,
+                'present_today': stats.present_today,
+                'login_time': time_service.format(stats.date, stats.login_time, fmt, zone_name),
+                'last_checkout_date': stats.last_checkout_date.isoformat() if stats.last_checkout_date else None,
+                'last_checkout': time_service.format(stats.last_checkout_date, stats.last_checkout, fmt, zone_name),
+            }
+        if self.leaves:
+            leaves = self.leaves._asdict()
+        return {
+            'id': self.user_id,
+            'username': self.username,
+            'role': self.role,
+            'name': self.name,
+            'employee_id': self.employee_id,
+            'job_role': self.job_role,
+            'attendance': attendance,
+            'leaves': leaves,
+        }
+
+
+def parse_user_filters(args):
+    return UserFilters(
+        role=args.get('role') if args.get('role') in USER_ROLES else None,
+        search=args.get('q', '').strip() or None,
+    )
+
+
+def role_counts():
+    """Number of users per role, in one grouped query"""
+    from app.models import User
+    return dict(db.session.query(User.role, db.func.count(User.id)).group_by(User.role).all())
+
+
+def attendance_stats(employee_ids):
+    """
+    Attendance totals, today's first check-in and latest closed session for
+    several employees in one windowed query
+
+    Returns:
+        dict: employee_id -> AttendanceStats, for every id given
+    """
+    from app.models import Attendance
+    today = utc_now().date()
+    employee_ids = list(employee_ids)
+    if not employee_ids:
+        return {}
+    partition = Attendance.employee_id
+    # Closed sessions first, newest first, so rank 1 is the latest checkout if there is one
+    ranked = db.session.query(
+        Attendance.employee_id,
+        Attendance.date,
+        Attendance.checkout_time,
+        db.func.count().over(partition_by=partition).label('total'),
+        db.func.min(db.case((Attendance.date == today, Attendance.checkin_time))).over(
+            partition_by=partition).label('first_today'),
+        db.func.row_number().over(partition_by=partition, order_by=(
+            db.case((Attendance.checkout_time.is_(None), 1), else_=0),
+            Attendance.date.desc(), Attendance.checkin_time.desc(), Attendance.id.desc(),
+        )).label('rank'),
+    ).filter(Attendance.employee_id.in_(employee_ids)).subquery()
+    latest = {
+        employee_id: (total, first_today, day, checkout)
+        for employee_id, total, first_today, day, checkout in db.session.query(
+            ranked.c.employee_id, ranked.c.total, ranked.c.first_today, ranked.c.date, ranked.c.checkout_time,
+        ).filter(ranked.c.rank == 1)
+    }
+    stats = {}
+    for employee_id in employee_ids:
+        total, first_today, day, checkout = latest.get(employee_id, (0, None, None, None))
+        stats[employee_id] = AttendanceStats(
+            date=today,
+            total_records=total,
+            present_today=first_today is not None,
+            login_time=first_today,
+            last_checkout_date=day if checkout else None,
+            last_checkout=checkout,
+        )
+    return stats
+
+
+def leave_stats(employee_ids):
+    """
+    Leave request counts for several employees in one grouped query
+
+    Returns:
+        dict: employee_id -> LeaveStats, for every id given
+    """
+    from app.models import LeaveRequest
+    employee_ids = list(employee_ids)
+    if not employee_ids:
+        return {}
+    rows = db.session.query(
+        LeaveRequest.employee_id,
+        db.func.count(LeaveRequest.id),
+        db.func.sum(db.case((LeaveRequest.status == 'Pending', 1), else_=0)),
+        db.func.sum(db.case((LeaveRequest.status == 'Accepted', 1), else_=0)),
+    ).filter(LeaveRequest.employee_id.in_(employee_ids)).group_by(LeaveRequest.employee_id).all()
+    counts = {employee_id: (total, pending or 0, approved or 0) for employee_id, total, pending, approved in rows}
+    stats = {}
+    for employee_id in employee_ids:
+        total, pending, approved = counts.get(employee_id, (0, 0, 0))
+        stats[employee_id] = LeaveStats(total, pending, approved, total - pending - approved)
+    return stats
+
+
+def user_stats_page(filters, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    A page of users by role and username with their attendance and leave
+    stats, in three queries however many users the page holds
+
+    Returns:
+        KeysetPage of UserStats
+
+    Raises:
+        CursorError: If the cursor is malformed
+    """
+    from app.models import User, Employee
+    query = db.session.query(
+        User.id, User.username, User.role, User.name, Employee.id, Employee.name, Employee.job_role,
+    ).outerjoin(Employee, Employee.user_id == User.id)
+    if filters.role:
+        query = query.filter(User.role == filters.role)
+    if filters.search:
+        pattern = f'%{filters.search}%'
+        query = query.filter(db.or_(
+            User.username.ilike(pattern), User.name.ilike(pattern), Employee.name.ilike(pattern)))
+    page = keyset_page(query, [User.role, User.username], lambda row: (row[2], row[1]),
+                       cursor=cursor, per_page=per_page)
+    # Employee stats only for employee users, as before
+    employee_ids = [row[4] for row in page.items if row[2] == 'employee' and row[4] is not None]
+    attendance = attendance_stats(employee_ids)
+    leaves = leave_stats(employee_ids)
+    items = []
+    for user_id, username, role, name, employee_id, employee_name, job_role in page.items:
+        if role != 'employee':
+            employee_id = job_role = employee_name = None
+        items.append(UserStats(
+            user_id, username, role, employee_name or name, employee_id, job_role,
+            attendance.get(employee_id), leaves.get(employee_id),
+        ))
+    return page._replace(items=items)
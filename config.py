@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
 
 load_dotenv()
 
@@ -29,3 +30,75 @@ PERMANENT_SESSION_LIFETIME = timedelta(hours=8)  # Session expires after 8 hours
 SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'  # HTTPS only in production
 SESSION_COOKIE_HTTPONLY = True  # Prevent XSS attacks
 SESSION_COOKIE_SAMESITE = 'Lax'  # CSRF protection
+
+# Reverse proxies in front of the app (Render runs one); client IPs and the scheme are read from their headers
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 1 if os.environ.get('RENDER') else 0))
+
+# gunicorn worker processes (see gunicorn.conf.py); per-process pools are sized to share the CPUs between them
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+# Password hashing pool (login verification runs off the request thread; needs threaded workers)
+HASH_POOL_ENABLED = os.environ.get('HASH_POOL_ENABLED', 'true').lower() == 'true'
+HASH_POOL_WORKERS = int(os.environ.get('HASH_POOL_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)  # Per web worker
+HASH_POOL_MAX_QUEUE = int(os.environ['HASH_POOL_MAX_QUEUE']) if os.environ.get('HASH_POOL_MAX_QUEUE') else None
+HASH_POOL_PER_KEY_LIMIT = int(os.environ.get('HASH_POOL_PER_KEY_LIMIT', 2))  # Concurrent checks per username / IP
+HASH_POOL_TIMEOUT = float(os.environ.get('HASH_POOL_TIMEOUT', 10))  # Seconds to wait for a verification
+
+# Per-process cache of PBKDF2-derived encryption keys (filled on first use, wiped at logout)
+KEY_CACHE_MAX_ENTRIES = int(os.environ.get('KEY_CACHE_MAX_ENTRIES', 1024))
+KEY_CACHE_TTL = int(os.environ.get('KEY_CACHE_TTL', 900))  # Seconds
+
+# Password hashing policy (see `flask hash-policy calibrate`); never below werkzeug's default cost
+HASH_TARGET_VERIFY_MS = float(os.environ.get('HASH_TARGET_VERIFY_MS', 250))  # Target verify latency
+HASH_MIN_ITERATIONS = int(os.environ.get('HASH_MIN_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS))  # Floor for calibrated PBKDF2 cost
+HASH_POLICY_REFRESH = int(os.environ.get('HASH_POLICY_REFRESH', 60))  # Seconds to cache the active policy
+
+# Profile picture blob store ('local' or a dotted path to a BlobStore subclass)
+BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND', 'local')
+BLOB_STORE_PATH = os.environ.get('BLOB_STORE_PATH')  # Defaults to <instance>/blobs for the local backend
+
+# Profile picture uploads and size variants
+PROFILE_PIC_MAX_BYTES = int(os.environ.get('PROFILE_PIC_MAX_BYTES', 5 * 1024 * 1024))
+PROFILE_PIC_SIZES = (48, 160, 512)  # Square WebP variants rendered in the background
+PROFILE_PIC_VARIANT_QUEUE = 256  # Pending variant jobs per worker process
+MAX_CONTENT_LENGTH = PROFILE_PIC_MAX_BYTES + 1024 * 1024  # Reject oversized requests before reading them
+
+# Holiday calendars (see `flask holidays`)
+HOLIDAY_CACHE_TTL = int(os.environ.get('HOLIDAY_CACHE_TTL', 300))  # Seconds before a compiled calendar is reloaded
+
+# Display timezone for attendance times (stored in UTC); users may override it in their profile
+DISPLAY_TIMEZONE = os.environ.get('DISPLAY_TIMEZONE', 'Asia/Kolkata')
+
+# Schema migrations (`flask db upgrade`); checked at startup: 'strict' (refuse to start), 'warn' or 'off'
+MIGRATIONS_VERIFY = os.environ.get('MIGRATIONS_VERIFY', 'strict')
+
+# JSON API (/api/v1) bearer tokens (see `flask api-tokens create`)
+API_TOKEN_LIFETIME_DAYS = int(os.environ.get('API_TOKEN_LIFETIME_DAYS', 90))  # 0 = tokens do not expire
+
+# Event bus behind the live board: 'local' (one process) or 'postgres' (LISTEN/NOTIFY across workers)
+EVENT_BUS_BACKEND = os.environ.get('EVENT_BUS_BACKEND', 'local')
+EVENT_BUS_BUFFER = int(os.environ.get('EVENT_BUS_BUFFER', 1000))  # Recent events kept for reconnecting clients
+EVENT_BUS_SUBSCRIBER_QUEUE = int(os.environ.get('EVENT_BUS_SUBSCRIBER_QUEUE', 1000))  # Then the client resyncs
+
+# Live "who's in" board (/hr/attendance): check-ins are pushed over Server-Sent Events.
+# Streams hold a thread of a gthread worker (see gunicorn.conf.py). A stream only hears check-ins
+# made on its own worker with the 'local' event bus, so by default the board is live only with
+# the 'postgres' bus or a single worker; otherwise the page shows a snapshot.
+LIVE_BOARD_ENABLED = os.environ.get(
+    'LIVE_BOARD_ENABLED', str(EVENT_BUS_BACKEND == 'postgres' or WEB_CONCURRENCY == 1)).lower() == 'true'
+LIVE_BOARD_MAX_STREAMS = int(os.environ.get('LIVE_BOARD_MAX_STREAMS', 4))  # Per worker; keep below GUNICORN_THREADS
+LIVE_BOARD_HEARTBEAT = int(os.environ.get('LIVE_BOARD_HEARTBEAT', 15))  # Seconds between keepalives
+LIVE_BOARD_STREAM_SECONDS = int(os.environ.get('LIVE_BOARD_STREAM_SECONDS', 300))  # Browsers reconnect after this
+
+# Per-process index of today's check-in state (who is in, late counts); re-read from the database periodically
+PRESENCE_INDEX_ENABLED = os.environ.get('PRESENCE_INDEX_ENABLED', 'true').lower() == 'true'
+PRESENCE_RESYNC_SECONDS = int(os.environ.get('PRESENCE_RESYNC_SECONDS', 300))
+
+# Cached HR/admin dashboard counters; writes invalidate them, and each is recounted at least this often
+DASHBOARD_METRICS_ENABLED = os.environ.get('DASHBOARD_METRICS_ENABLED', 'true').lower() == 'true'
+DASHBOARD_RECONCILE_SECONDS = int(os.environ.get('DASHBOARD_RECONCILE_SECONDS', 60))
+
+# Per-request SQL metrics: a Server-Timing header and a log line with the query count and database time
+SQL_METRICS_ENABLED = os.environ.get('SQL_METRICS_ENABLED', 'true').lower() == 'true'
+SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))  # Same statement this often in a request is logged as a likely N+1
+SQL_QUERY_BUDGET_STRICT = os.environ.get('SQL_QUERY_BUDGET_STRICT', 'false').lower() == 'true'  # Raise when a view exceeds its @query_budget
@@ -0,0 +1,12 @@
+# gunicorn settings, read by the Procfile's `gunicorn -c gunicorn.conf.py wsgi:app`
+#
+# Workers must be threaded: a login waits on the password hashing pool and a
+# live attendance board holds its connection open, and with gthread each of
+# them ties up one thread while the worker's other threads keep serving pages.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))  # config.py sizes the hashing pools from this too
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 60
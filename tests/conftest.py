@@ -0,0 +1,51 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+# Fast hashes for seeded users; tests log in through the session, not the login form
+TEST_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh SQLite database, with query budgets enforced"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'hrms.db'}")
+    monkeypatch.setenv('BLOB_STORE_PATH', str(tmp_path / 'blobs'))
+    monkeypatch.setenv('HASH_POOL_ENABLED', 'false')
+    monkeypatch.setenv('EVENT_BUS_BACKEND', 'local')
+    monkeypatch.setenv('SQL_QUERY_BUDGET_STRICT', 'true')
+    monkeypatch.delenv('RENDER', raising=False)
+    from app import create_app, db
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def add_user(username, role, name=None):
+    from app import db
+    from app.models import User
+    user = User(username=username, role=role, name=name or username.title(),
+                password=generate_password_hash('password', TEST_HASH_METHOD))
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def add_employee(name, username=None, job_role=None):
+    from app import db
+    from app.models import Employee
+    user = add_user(username or name.lower().replace(' ', '.'), 'employee', name)
+    employee = Employee(name=name, gender='Other', address='Street 1', phone_number='1234567890',
+                        unique_id_number=f'ID-{user.id}', job_role=job_role, user_id=user.id)
+    db.session.add(employee)
+    db.session.flush()
+    return employee
+
+
+def login(client, user):
+    """Log a test client in as user without going through password hashing"""
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+        session['role'] = user.role
+    return client
@@ -0,0 +1,54 @@
+from datetime import date
+from app.attendance_matrix import build_matrix
+from app.attendance_report import PRESENT, CHECKED_IN, NO_RECORD
+
+# March 2026 starts on a Sunday: weekly offs on the 1st, 8th, 14th (second Saturday), 15th, ...
+TODAY = date(2026, 3, 10)
+ASHA = (1, 'Asha', 'Engineer', None)
+BILAL = (2, 'Bilal', None, None)
+HOUR = 3600
+
+
+def day(number):
+    return date(2026, 3, number)
+
+
+SUMMARIES = [
+    (1, day(2), PRESENT, 8 * HOUR, True),
+    (1, day(3), PRESENT, 4 * HOUR, False),
+    (1, day(4), CHECKED_IN, 0, False),
+    (1, day(5), NO_RECORD, 0, False),
+    (1, day(8), PRESENT, 2 * HOUR, True),  # Worked on a Sunday
+]
+
+
+def test_cells_are_classified_per_day(app):
+    asha, bilal = build_matrix([ASHA, BILAL], 2026, 3, SUMMARIES, today=TODAY)
+    assert asha.statuses == 'HPPCNAAPAA' + '.' * 21
+    assert bilal.statuses == 'HAAAAAAHAA' + '.' * 21
+    assert asha.late_days == [2, 8]
+    assert asha.hours[:10] == [None, 8.0, 4.0, None, None, None, None, 2.0, None, None]
+    assert set(asha.hours[10:]) == {None}
+
+
+def test_totals(app):
+    asha, bilal = build_matrix([ASHA, BILAL], 2026, 3, SUMMARIES, today=TODAY)
+    assert asha.totals._asdict() == {
+        'present_days': 3, 'absent_days': 4, 'holiday_days': 1, 'late_days': 2, 'total_hours': 14.0}
+    assert bilal.totals._asdict() == {
+        'present_days': 0, 'absent_days': 8, 'holiday_days': 2, 'late_days': 0, 'total_hours': 0.0}
+
+
+def test_past_and_future_months(app):
+    (past,) = build_matrix([BILAL], 2026, 2, [], today=TODAY)
+    # February 2026: 4 Sundays and the second Saturday (the 14th) are off
+    assert past.totals.holiday_days == 5 and past.totals.absent_days == 28 - 5
+    assert '.' not in past.statuses
+    (future,) = build_matrix([BILAL], 2026, 4, [], today=TODAY)
+    assert future.statuses == '.' * 30 and future.totals.absent_days == 0
+
+
+def test_rows_follow_the_given_order(app):
+    rows = build_matrix([BILAL, ASHA], 2026, 3, SUMMARIES, today=TODAY)
+    assert [row.employee_id for row in rows] == [2, 1]
+    assert rows[1].to_dict()['statuses'] == rows[1].statuses
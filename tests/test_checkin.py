@@ -0,0 +1,68 @@
+from datetime import datetime
+from app import db
+from app.checkin import check_in, check_out
+from app.models import Attendance
+from conftest import add_employee, login
+
+MORNING = datetime(2026, 3, 2, 3, 0)
+NOON = datetime(2026, 3, 2, 6, 30)
+AFTERNOON = datetime(2026, 3, 2, 7, 0)
+
+
+def sessions(employee_id):
+    return Attendance.query.filter_by(employee_id=employee_id).order_by(Attendance.id).all()
+
+
+def test_replayed_checkin_key_does_nothing(app):
+    employee = add_employee('Asha')
+    db.session.commit()
+    first = check_in(employee.id, 'key-1', now=MORNING)
+    again = check_in(employee.id, 'key-1', now=NOON)
+    assert first.changed and not again.changed
+    assert again.state.checked_in and again.state.first_checkin == MORNING.time()
+    assert len(sessions(employee.id)) == 1
+
+
+def test_double_submit_opens_one_session(app):
+    employee = add_employee('Asha')
+    db.session.commit()
+    assert check_in(employee.id, now=MORNING).changed
+    # A second form submit with a different (or no) key while checked in
+    assert not check_in(employee.id, 'other-key', now=MORNING).changed
+    assert not check_in(employee.id, now=NOON).changed
+    assert len(sessions(employee.id)) == 1
+
+
+def test_checkout_without_open_session(app):
+    employee = add_employee('Asha')
+    db.session.commit()
+    result = check_out(employee.id, 'out-1', now=NOON)
+    assert not result.changed
+    assert not result.state.checked_in
+    assert sessions(employee.id) == []
+
+
+def test_replayed_checkout_key_does_not_close_a_later_session(app):
+    employee = add_employee('Asha')
+    db.session.commit()
+    check_in(employee.id, 'in-1', now=MORNING)
+    closed = check_out(employee.id, 'out-1', now=NOON)
+    assert closed.changed and closed.state.worked_seconds == 3.5 * 3600
+    assert check_in(employee.id, 'in-2', now=AFTERNOON).changed
+    replay = check_out(employee.id, 'out-1', now=AFTERNOON)
+    assert not replay.changed
+    assert replay.state.checked_in
+    assert [s.checkout_time for s in sessions(employee.id)] == [NOON.time(), None]
+
+
+def test_api_checkin_is_idempotent(app):
+    employee = add_employee('Asha')
+    db.session.commit()
+    client = login(app.test_client(), employee.user)
+    headers = {'Idempotency-Key': 'kiosk-1'}
+    first = client.post('/api/v1/attendance/checkin', json={}, headers=headers)
+    again = client.post('/api/v1/attendance/checkin', json={}, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert first.json['changed'] and not again.json['changed']
+    assert again.json['state']['checked_in']
+    assert len(sessions(employee.id)) == 1
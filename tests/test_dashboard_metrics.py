@@ -0,0 +1,61 @@
+from datetime import datetime, time
+import pytest
+from app import db
+from app.checkin import check_in
+from app.dashboard_metrics import dashboard_metrics, DashboardCounts
+from app.models import Employee, LeaveRequest
+from app.presence import presence
+from app.timezones import utc_now
+from conftest import add_employee, add_user, login
+
+
+@pytest.fixture
+def hr(app, monkeypatch):
+    """A client logged in as HR, with caches that only an invalidation refreshes"""
+    monkeypatch.setattr(dashboard_metrics, 'reconcile_seconds', 3600)
+    monkeypatch.setattr(presence, 'resync_seconds', 3600)
+    dashboard_metrics.reset()
+    presence.invalidate()
+    client = login(app.test_client(), add_user('hr', 'hr'))
+    db.session.commit()
+    return client
+
+
+def test_new_and_deleted_employees_update_the_counts(app, hr):
+    assert dashboard_metrics.counts()[:2] == (0, 1)
+    response = hr.post('/hr/add_employee', data={
+        'name': 'Asha', 'gender': 'Female', 'address': 'Street 1', 'phone_number': '1234567890',
+        'unique_id_number': 'ID-1', 'username': 'asha', 'job_role': 'Engineer',
+    })
+    assert response.status_code == 302
+    assert dashboard_metrics.counts()[:2] == (1, 2)
+
+    employee = Employee.query.filter_by(name='Asha').one()
+    hr.post(f'/hr/delete_employee/{employee.id}')
+    assert dashboard_metrics.counts()[:2] == (0, 1)
+
+
+def test_leave_decisions_update_pending_leaves(app, hr):
+    employee = add_employee('Asha')
+    today = utc_now().date()
+    leave = LeaveRequest(employee_id=employee.id, leave_type='Sick', start_date=today, end_date=today,
+                         reason='Unwell', status='Pending')
+    db.session.add(leave)
+    db.session.commit()
+    assert dashboard_metrics.counts().pending_leaves == 1
+
+    hr.post('/hr/leave_requests', data={'leave_id': leave.id, 'action': 'Accepted'})
+    assert dashboard_metrics.counts().pending_leaves == 0
+
+
+def test_late_checkins_update_late_today(app, hr):
+    asha, bilal = add_employee('Asha'), add_employee('Bilal')
+    db.session.commit()
+    assert dashboard_metrics.counts().late_today == 0
+    today = utc_now().date()
+    # 08:30 and 10:30 in Asia/Kolkata; late is after 09:30
+    check_in(asha.id, now=datetime.combine(today, time(3, 0)))
+    check_in(bilal.id, now=datetime.combine(today, time(5, 0)))
+    counts = dashboard_metrics.counts()
+    assert counts == DashboardCounts(employees=2, users=3, pending_leaves=0, late_today=1)
+    assert b'>1</p>' in hr.get('/hr/dashboard').data
@@ -0,0 +1,51 @@
+import io
+import zipfile
+from datetime import date
+from xml.etree import ElementTree
+import pytest
+from app import db
+from app.exports import iter_csv, export_stream
+from app.models import LeaveRequest
+from conftest import add_employee
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def read_xlsx(data):
+    """Rows of the first sheet of an XLSX, and whether any cell holds a formula"""
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+    rows = []
+    for row in sheet.iter(f'{SHEET_NS}row'):
+        cells = []
+        for cell in row.iter(f'{SHEET_NS}c'):
+            if cell.get('t') == 'inlineStr':
+                cells.append(cell.find(f'{SHEET_NS}is/{SHEET_NS}t').text or '')
+            else:
+                cells.append(float(cell.find(f'{SHEET_NS}v').text))
+        rows.append(cells)
+    return rows, sheet.find(f'.//{SHEET_NS}f') is not None
+
+
+def test_csv_quotes_formula_like_text():
+    data = b''.join(iter_csv([['=HYPERLINK("x")', '+1', '-1', '@SUM(A1)', '\tx', 'Sick leave', -3, None]]))
+    assert data.decode() == '"\'=HYPERLINK(""x"")",\'+1,\'-1,\'@SUM(A1),\'\tx,Sick leave,-3,\r\n'
+
+
+def test_xlsx_export_has_the_header_and_rows(app):
+    pytest.importorskip('xlsxwriter')
+    employee = add_employee('=cmd|calc', job_role='Engineer')
+    # Monday to Friday of a week without holidays
+    db.session.add(LeaveRequest(employee_id=employee.id, leave_type='Sick', start_date=date(2026, 3, 2),
+                                end_date=date(2026, 3, 6), reason='Flu', status='Accepted',
+                                request_date=date(2026, 2, 27)))
+    db.session.commit()
+    stream, mimetype, filename = export_stream('leave', 'xlsx', date(2026, 3, 1), date(2026, 3, 31))
+    rows, has_formula = read_xlsx(b''.join(stream))
+    assert mimetype.endswith('spreadsheetml.sheet') and filename == 'leave_2026-03-01_2026-03-31.xlsx'
+    assert rows == [
+        ['employee_id', 'employee_name', 'job_role', 'leave_type', 'start_date', 'end_date',
+         'working_days', 'status', 'request_date'],
+        [employee.id, '=cmd|calc', 'Engineer', 'Sick', '2026-03-02', '2026-03-06', 5, 'Accepted', '2026-02-27'],
+    ]
+    assert not has_formula
@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+import pytest
+from app.holidays import CompiledCalendar, parse_weekly_offs, weekly_off_bitmap
+
+NEW_YEAR = date(2026, 1, 1)
+REPUBLIC_DAY = date(2026, 1, 26)
+
+
+def working_days_by_hand(calendar, start, end):
+    days = (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+    return sum(not calendar.is_holiday(day) for day in days)
+
+
+def is_off_by_hand(day):
+    # Sundays and the second Saturday, straight from the definition
+    return day.weekday() == 6 or (day.weekday() == 5 and 8 <= day.day <= 14)
+
+
+def test_parse_weekly_offs():
+    assert parse_weekly_offs('sun, SAT2,SAT4') == ((6, None), (5, 2), (5, 4))
+    assert parse_weekly_offs('') == ()
+    for rules in ('SUNDAY', 'SAT0', 'SAT6', 'FRIx'):
+        with pytest.raises(ValueError):
+            parse_weekly_offs(rules)
+
+
+def test_weekly_off_bitmap():
+    # January 2026 starts on a Thursday: Sundays 4, 11, 18, 25 and the second Saturday is the 10th
+    bitmap = weekly_off_bitmap(parse_weekly_offs('SUN,SAT2'), 2026, 1)
+    assert [day for day in range(1, 32) if bitmap >> (day - 1) & 1] == [4, 10, 11, 18, 25]
+    # February 2026 has no fifth Saturday, January 2026 has one (the 31st)
+    assert weekly_off_bitmap(parse_weekly_offs('SAT5'), 2026, 2) == 0
+    assert weekly_off_bitmap(parse_weekly_offs('SAT5'), 2026, 1) == 1 << 30
+
+
+def test_weekly_offs_match_their_definition_over_years():
+    calendar = CompiledCalendar()
+    day = date(2024, 1, 1)
+    while day <= date(2028, 12, 31):
+        assert calendar.is_holiday(day) == is_off_by_hand(day), day
+        day += timedelta(days=1)
+
+
+def test_public_holidays():
+    calendar = CompiledCalendar(holidays={REPUBLIC_DAY: 'Republic Day', NEW_YEAR: 'New Year'})
+    assert calendar.holiday_name(REPUBLIC_DAY) == 'Republic Day'
+    assert calendar.holiday_name(date(2026, 1, 4)) == 'Weekly Off'
+    assert calendar.holiday_name(date(2026, 1, 5)) is None
+    assert calendar.working_days_between(date(2026, 1, 1), date(2026, 1, 31)) == 31 - 5 - 2
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (date(2025, 12, 29), date(2026, 1, 2), 4),  # Across the year end, New Year's Day off
+    (date(2026, 1, 31), date(2026, 2, 2), 2),  # Fifth Saturday (working), Sunday, Monday across a month end
+    (date(2028, 2, 1), date(2028, 2, 29), 29 - 4 - 1),  # Leap February
+    (date(2026, 1, 5), date(2026, 1, 5), 1),
+    (date(2026, 1, 4), date(2026, 1, 4), 0),
+    (date(2026, 1, 5), date(2026, 1, 4), 0),  # End before start
+])
+def test_working_days_between(start, end, expected):
+    calendar = CompiledCalendar(holidays={NEW_YEAR: 'New Year'})
+    assert calendar.working_days_between(start, end) == expected
+
+
+def test_working_days_match_a_day_by_day_count():
+    calendar = CompiledCalendar(holidays={NEW_YEAR: 'New Year', REPUBLIC_DAY: 'Republic Day',
+                                          date(2026, 12, 25): 'Christmas'})
+    starts = [date(2025, 11, 30), date(2025, 12, 31), date(2026, 1, 26), date(2026, 2, 28)]
+    ends = [date(2026, 1, 1), date(2026, 3, 1), date(2026, 12, 31), date(2027, 1, 10)]
+    for start in starts:
+        for end in ends:
+            assert calendar.working_days_between(start, end) == working_days_by_hand(calendar, start, end)
+
+
+def test_span_grows_for_far_dates():
+    calendar = CompiledCalendar(holidays={NEW_YEAR: 'New Year'})
+    start, end = date(1999, 12, 1), date(2000, 1, 31)
+    assert calendar.working_days_between(start, end) == working_days_by_hand(calendar, start, end)
+    # Counts inside the original span still agree after recompiling
+    assert calendar.working_days_between(date(2025, 12, 29), date(2026, 1, 2)) == 4
+    assert calendar.working_days_between(date(2060, 1, 1), date(2060, 1, 31)) == working_days_by_hand(
+        calendar, date(2060, 1, 1), date(2060, 1, 31))
@@ -0,0 +1,58 @@
+import collections
+import json
+import threading
+import pytest
+from app import db
+from app.event_bus import event_bus, NOTIFY_MAX_BYTES
+from app.invalidation import invalidation_bus, EMPLOYEE, LEAVE_REQUEST, MAX_IDS
+from app.models import HolidayCalendar
+from app.presence import presence
+from conftest import add_employee
+
+
+@pytest.fixture
+def received(app, monkeypatch):
+    """(entity, ids) of every invalidation this test commits"""
+    monkeypatch.setattr(invalidation_bus, '_subscribers', collections.defaultdict(list))
+    events = []
+    for entity in (EMPLOYEE, LEAVE_REQUEST):
+        invalidation_bus.subscribe(entity, lambda ids, entity=entity: events.append((entity, ids)))
+    return events
+
+
+def test_ids_arrive_after_commit(received):
+    invalidation_bus.changed(db.session, EMPLOYEE, 3, 1, 3)
+    assert received == []
+    db.session.commit()
+    assert received == [(EMPLOYEE, [1, 3])]
+
+
+def test_long_id_lists_become_any_row(received):
+    ids = range(10 ** 9, 10 ** 9 + MAX_IDS)
+    assert len(json.dumps({'entity': LEAVE_REQUEST, 'ids': list(ids)})) < NOTIFY_MAX_BYTES
+    invalidation_bus.changed(db.session, LEAVE_REQUEST, *ids)
+    invalidation_bus.changed(db.session, LEAVE_REQUEST, *ids, 1)
+    db.session.commit()
+    assert received == [(LEAVE_REQUEST, list(ids)), (LEAVE_REQUEST, None)]
+
+
+def test_assigning_a_calendar_invalidates_the_employees(app, received):
+    employee = add_employee('Asha')
+    db.session.add(HolidayCalendar(name='Karnataka'))
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['holidays', 'assign', 'Karnataka', str(employee.id)])
+    assert result.exit_code == 0, result.output
+    assert received == [(EMPLOYEE, [employee.id])]
+
+
+def test_requests_start_the_listener_without_presence(app, monkeypatch):
+    stop = threading.Event()
+    monkeypatch.setattr(presence, 'enabled', False)
+    monkeypatch.setattr(event_bus, 'backend', 'postgres')
+    monkeypatch.setattr(event_bus, '_listen', lambda: stop.wait(10))
+    monkeypatch.setattr(event_bus, '_listener', None)
+    try:
+        app.test_client().get('/login')
+        assert event_bus._listener is not None and event_bus._listener.is_alive()
+    finally:
+        stop.set()
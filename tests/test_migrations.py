@@ -0,0 +1,61 @@
+from datetime import date, time
+import pytest
+import sqlalchemy as sa
+from app import create_app, db, migrations
+from app.migrations.versions import v0001_baseline as baseline
+
+
+def empty_database():
+    db.session.remove()
+    db.drop_all()
+    migrations.schema_migrations.drop(db.engine, checkfirst=True)
+
+
+def test_upgrade_from_empty_database_matches_models(app):
+    empty_database()
+    applied = migrations.upgrade()
+    assert [m.version for m in applied] == [m.version for m in migrations.load_migrations()]
+    assert migrations.check_schema() == []
+
+
+def test_upgrade_from_baseline_backfills_summaries(app):
+    empty_database()
+    migrations.upgrade(target=1)
+    day = date(2026, 3, 2)
+    with db.engine.begin() as connection:
+        connection.execute(baseline.user.insert(), {'id': 1, 'username': 'emp', 'password': 'x', 'role': 'employee'})
+        connection.execute(baseline.employee.insert(), {
+            'id': 1, 'name': 'Emp', 'gender': 'Other', 'address': 'x', 'phone_number': '1',
+            'unique_id_number': 'U1', 'user_id': 1})
+        connection.execute(baseline.attendance.insert(), [
+            {'employee_id': 1, 'date': day, 'checkin_time': time(3, 0), 'checkout_time': time(5, 0)},
+            {'employee_id': 1, 'date': day, 'checkin_time': time(6, 0), 'checkout_time': None},
+            {'employee_id': 1, 'date': day, 'checkin_time': time(7, 0), 'checkout_time': None},
+        ])
+    migrations.upgrade()
+    assert migrations.check_schema() == []
+    with db.engine.connect() as connection:
+        summary = connection.execute(sa.text('SELECT * FROM daily_attendance_summary')).mappings().one()
+        open_sessions = connection.execute(sa.text(
+            'SELECT COUNT(*) FROM attendance WHERE checkout_time IS NULL')).scalar()
+    # The later of the two open sessions was closed so the unique index could be built
+    assert open_sessions == 1
+    assert summary['session_count'] == 3
+    assert summary['worked_seconds'] == 7200
+    assert summary['open_sessions'] == 1
+    assert summary['status'] == 'Checked In'
+    assert summary['last_checkin'] is not None
+
+
+def test_downgrade_and_upgrade_again(app):
+    migrations.downgrade(3)
+    assert migrations.current_version() == 3
+    migrations.upgrade()
+    assert migrations.check_schema() == []
+
+
+def test_strict_startup_refuses_pending_migrations(app):
+    migrations.downgrade(7)
+    db.session.remove()
+    with pytest.raises(migrations.MigrationError, match='pending migration'):
+        create_app()
@@ -0,0 +1,60 @@
+from datetime import date, datetime
+import pytest
+from app import db
+from app.listings import employee_page, EmployeeFilters
+from app.pagination import encode_cursor, decode_cursor, CursorError
+from conftest import add_employee, add_user, login
+
+NAMES = ['Asha', 'Bilal', 'Chen', 'Dara', 'Emeka']
+
+
+def test_cursor_round_trip():
+    values = ['Chen', 3, date(2026, 3, 2), datetime(2026, 3, 2, 9, 30)]
+    cursor = encode_cursor(values, 'prev')
+    assert decode_cursor(cursor, [str, int, date, datetime]) == ('prev', values)
+
+
+@pytest.mark.parametrize('values, key_types', [
+    ([[1]], [str]),
+    (['Chen', '3'], [str, int]),
+    ([True], [int]),
+    ([datetime(2026, 3, 2, 9, 30)], [date]),
+    ([{'d': 'not a date'}], [date]),
+    ([{'x': 1}], [int]),
+])
+def test_cursor_values_must_fit_their_keys(values, key_types):
+    with pytest.raises(CursorError):
+        decode_cursor(encode_cursor(values, 'next'), key_types)
+
+
+@pytest.mark.parametrize('cursor', ['', '!!!', encode_cursor([1], 'sideways'), encode_cursor([1, 2, 3], 'next')])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, [str, int])
+
+
+def test_employee_pages_walk_forward_and_back(app):
+    for name in reversed(NAMES):
+        add_employee(name)
+    db.session.commit()
+    filters = EmployeeFilters()
+
+    pages = [employee_page(filters, per_page=2)]
+    while pages[-1].next_cursor:
+        pages.append(employee_page(filters, pages[-1].next_cursor, per_page=2))
+    assert [[employee.name for employee in page.items] for page in pages] == [
+        ['Asha', 'Bilal'], ['Chen', 'Dara'], ['Emeka']]
+    assert pages[0].prev_cursor is None
+
+    back = employee_page(filters, pages[-1].prev_cursor, per_page=2)
+    assert [employee.name for employee in back.items] == ['Chen', 'Dara']
+    assert back.next_cursor and back.prev_cursor
+
+
+def test_tampered_cursor_redirects_to_the_first_page(app):
+    client = login(app.test_client(), add_user('hr', 'hr'))
+    add_employee('Asha')
+    db.session.commit()
+    response = client.get('/hr/employees', query_string={'cursor': encode_cursor([[1], 1], 'next')})
+    assert response.status_code == 302
+    assert 'cursor' not in response.headers['Location']
@@ -0,0 +1,50 @@
+import threading
+from datetime import time
+from app import db
+from app.models import Attendance
+from app.presence import presence, PresenceCounts
+from app.timezones import utc_now
+from conftest import add_employee
+
+
+def event(session_id, employee_id, day, checkin, checkout=None):
+    return {'session_id': session_id, 'employee_id': employee_id, 'date': day.isoformat(),
+            'checkin': checkin.isoformat(), 'checkout': checkout.isoformat() if checkout else None}
+
+
+def test_concurrent_warms_keep_events_that_race_with_them(app, monkeypatch):
+    asha, bilal = add_employee('Asha'), add_employee('Bilal')
+    today = utc_now().date()
+    db.session.add(Attendance(employee_id=asha.id, date=today, checkin_time=time(3, 0)))
+    db.session.commit()
+
+    # Both warms are querying when a check-in that neither query sees arrives
+    both_querying = threading.Barrier(2)
+    query = db.session.query
+
+    def racing_query(*args, **kwargs):
+        if both_querying.wait() == 0:
+            presence.apply_event(event(1000, bilal.id, today, time(3, 30)))
+        both_querying.wait()
+        return query(*args, **kwargs)
+    monkeypatch.setattr(db.session, 'query', racing_query)
+
+    errors = []
+
+    def warm():
+        with app.app_context():
+            try:
+                presence.warm(today)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                db.session.remove()
+    threads = [threading.Thread(target=warm) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    monkeypatch.undo()
+
+    assert errors == []
+    assert presence.counts() == PresenceCounts(present=2, checked_in=2, late=0)
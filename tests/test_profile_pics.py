@@ -0,0 +1,76 @@
+import io
+import pytest
+from PIL import Image
+from app import db
+from app.blob_store import blob_store
+from app.thumbnails import variant_worker
+from conftest import add_employee, add_user, login
+
+# A GIF header followed by markup: sniffs as a GIF, renders as HTML if served as a document
+POLYGLOT = b'GIF89a<html><script>alert(document.cookie)</script></html>'
+
+
+@pytest.fixture
+def picture(app):
+    """(client logged in as HR, blob key) for an employee whose picture was stored as a GIF"""
+    employee = add_employee('Asha')
+    employee.profile_pic_key = blob_store.put(POLYGLOT)
+    employee.profile_pic_mimetype = 'image/gif'
+    client = login(app.test_client(), add_user('hr', 'hr'))
+    db.session.commit()
+    return client, employee.profile_pic_key
+
+
+def test_picture_is_served_as_its_stored_type(picture):
+    client, key = picture
+    response = client.get(f'/media/profile_pics/{key}.gif')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/gif'
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+    assert 'sandbox' in response.headers['Content-Security-Policy']
+    assert response.headers['Content-Disposition'].startswith('inline')
+
+
+@pytest.mark.parametrize('ext', ['html', 'svg', 'png', 'txt'])
+def test_other_extensions_are_not_found(picture, ext):
+    client, key = picture
+    assert client.get(f'/media/profile_pics/{key}.{ext}').status_code == 404
+
+
+def png_bytes():
+    output = io.BytesIO()
+    Image.new('RGB', (8, 8), 'teal').save(output, 'PNG')
+    return output.getvalue()
+
+
+@pytest.mark.parametrize('data, accepted', [
+    (POLYGLOT, False),
+    (png_bytes()[:40], False),  # Truncated
+    (png_bytes(), True),
+])
+def test_uploads_must_be_intact_images(app, monkeypatch, data, accepted):
+    monkeypatch.setattr(variant_worker, 'enqueue', lambda key: False)
+    employee = add_employee('Asha')
+    client = login(app.test_client(), employee.user)
+    db.session.commit()
+    client.post('/edit_profile', data={
+        'profile_pic': (io.BytesIO(data), 'me.gif'), 'phone_number': '1234567890', 'address': 'Street 1',
+    })
+    db.session.refresh(employee)
+    assert (employee.profile_pic_key is not None) == accepted
+    assert employee.profile_pic_mimetype == ('image/png' if accepted else None)
+
+
+def test_variants_are_queued_once_and_failures_not_retried(app, monkeypatch):
+    attempts = []
+
+    def build_variants(key):
+        attempts.append(key)
+        raise OSError('cannot identify image file')
+    monkeypatch.setattr(variant_worker, 'build_variants', build_variants)
+    monkeypatch.setattr(variant_worker, '_failed', set())
+    key = blob_store.put(POLYGLOT)
+    assert variant_worker.enqueue(key)
+    variant_worker._queue.join()
+    assert not variant_worker.enqueue(key)
+    assert attempts == [key]
@@ -0,0 +1,72 @@
+from datetime import date, time
+import pytest
+from app import db
+from app.dashboard_metrics import dashboard_metrics
+from app.holidays import holiday_calendars
+from app.models import Attendance, LeaveRequest, HolidayCalendar, Holiday
+from app.presence import presence
+from app.timezones import utc_now
+from conftest import add_employee, add_user, login
+
+# Every listing and dashboard, with the roles allowed to open it
+ROUTES = [
+    ('/hr/dashboard', 'hr'),
+    ('/admin/dashboard', 'admin'),
+    ('/hr/employees', 'hr'),
+    ('/hr/employee_list', 'hr'),
+    ('/hr/attendance/{employee_id}', 'hr'),
+    ('/hr/attendance/matrix', 'hr'),
+    ('/hr/leave_requests', 'hr'),
+    ('/employee/leave_status', 'employee'),
+    ('/admin/view_employees', 'admin'),
+    ('/admin/view_hr', 'admin'),
+    ('/admin/view_users', 'admin'),
+    ('/api/v1/admin/users', 'admin'),
+]
+
+
+@pytest.fixture
+def users(app):
+    """One user per role, and employees with attendance, leave and two holiday calendars"""
+    default, regional = HolidayCalendar(name='India', is_default=True), HolidayCalendar(name='Karnataka')
+    db.session.add_all([default, regional])
+    db.session.flush()
+    db.session.add(Holiday(calendar_id=regional.id, date=date.today().replace(day=1), name='Founders Day'))
+    employees = [add_employee(name, job_role='Engineer') for name in ('Asha', 'Bilal', 'Chen')]
+    employees[1].holiday_calendar_id = regional.id
+    today = utc_now().date()
+    for employee in employees:
+        db.session.add(Attendance(employee_id=employee.id, date=today, checkin_time=time(3, 0),
+                                  checkout_time=time(11, 0)))
+        for status in ('Pending', 'Accepted'):
+            db.session.add(LeaveRequest(employee_id=employee.id, leave_type='Sick', start_date=today,
+                                        end_date=today, reason='Unwell', status=status))
+    users = {'admin': add_user('root', 'admin'), 'hr': add_user('hr', 'hr'), 'employee': employees[0].user}
+    db.session.commit()
+    users['employee_id'] = employees[0].id
+    return users
+
+
+def cold_caches(monkeypatch):
+    """Make every per-process cache miss, as on a worker's first request"""
+    monkeypatch.setattr(presence, 'resync_seconds', 0)
+    dashboard_metrics.reset()
+    holiday_calendars.invalidate()
+
+
+@pytest.mark.parametrize('path, role', ROUTES)
+def test_routes_stay_within_budget_with_cold_caches(app, users, monkeypatch, path, role):
+    # SQL_QUERY_BUDGET_STRICT turns going over a budget into an error
+    client = login(app.test_client(), users[role])
+    path = path.format(employee_id=users['employee_id'])
+    cold_caches(monkeypatch)
+    assert client.get(path).status_code == 200
+
+
+def test_leave_decision_stays_within_budget_with_cold_caches(app, users, monkeypatch):
+    client = login(app.test_client(), users['hr'])
+    leave = LeaveRequest.query.filter_by(status='Pending').first()
+    cold_caches(monkeypatch)
+    response = client.post('/hr/leave_requests', data={'leave_id': leave.id, 'action': 'Accepted'})
+    assert response.status_code == 200
+    assert db.session.get(LeaveRequest, leave.id).status == 'Accepted'
@@ -0,0 +1,18 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.sql_metrics import current_queries
+
+
+def test_failed_statements_leave_nothing_on_the_connection(app):
+    with app.test_request_context(), db.engine.connect() as connection:
+        info = dict(connection.info)
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+            connection.rollback()
+        assert connection.info == info
+        connection.execute(text('SELECT 1'))
+        queries = current_queries()
+        assert queries.count == 1 and queries.repeated(1) == [('SELECT ?', 1)]
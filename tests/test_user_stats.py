@@ -0,0 +1,90 @@
+from datetime import date, datetime, time
+from app import db
+from app.models import Attendance, LeaveRequest
+from app.user_stats import attendance_stats, leave_stats, role_counts, user_stats_page, UserFilters, LeaveStats
+from conftest import add_employee, add_user
+
+TODAY = date(2026, 3, 3)
+YESTERDAY = date(2026, 3, 2)
+
+
+def add_session(employee, day, checkin, checkout=None):
+    db.session.add(Attendance(employee_id=employee.id, date=day, checkin_time=checkin, checkout_time=checkout))
+
+
+def add_leave(employee, status):
+    db.session.add(LeaveRequest(employee_id=employee.id, leave_type='Sick', start_date=TODAY, end_date=TODAY,
+                                reason='Unwell', status=status))
+
+
+def freeze_today(monkeypatch):
+    monkeypatch.setattr('app.user_stats.utc_now', lambda: datetime.combine(TODAY, time(8)))
+
+
+def test_attendance_stats_per_employee(app, monkeypatch):
+    freeze_today(monkeypatch)
+    asha, bilal, chen = add_employee('Asha'), add_employee('Bilal'), add_employee('Chen')
+    add_session(asha, YESTERDAY, time(3, 0), time(11, 0))
+    add_session(asha, TODAY, time(4, 0), time(5, 0))
+    add_session(asha, TODAY, time(3, 30))
+    add_session(bilal, YESTERDAY, time(3, 0))  # Never checked out
+    db.session.commit()
+
+    stats = attendance_stats([asha.id, bilal.id, chen.id])
+    assert stats[asha.id].total_records == 3
+    assert stats[asha.id].present_today and stats[asha.id].login_time == time(3, 30)
+    assert (stats[asha.id].last_checkout_date, stats[asha.id].last_checkout) == (TODAY, time(5, 0))
+    assert stats[bilal.id].total_records == 1 and not stats[bilal.id].present_today
+    assert stats[bilal.id].last_checkout is None and stats[bilal.id].last_checkout_date is None
+    assert stats[chen.id].total_records == 0 and stats[chen.id].date == TODAY
+    assert attendance_stats([]) == {}
+
+
+def test_leave_stats_per_employee(app):
+    asha, bilal = add_employee('Asha'), add_employee('Bilal')
+    for status in ('Pending', 'Accepted', 'Accepted', 'Rejected'):
+        add_leave(asha, status)
+    db.session.commit()
+
+    stats = leave_stats([asha.id, bilal.id])
+    assert stats[asha.id] == LeaveStats(total_requests=4, pending=1, approved=2, rejected=1)
+    assert stats[bilal.id] == LeaveStats(0, 0, 0, 0)
+
+
+def test_role_counts(app):
+    add_user('root', 'admin')
+    add_user('hr', 'hr')
+    add_employee('Asha')
+    add_employee('Bilal')
+    db.session.commit()
+    assert role_counts() == {'admin': 1, 'hr': 1, 'employee': 2}
+
+
+def test_user_stats_page_joins_employee_stats(app, monkeypatch):
+    freeze_today(monkeypatch)
+    add_user('root', 'admin')
+    asha = add_employee('Asha Rao', username='asha', job_role='Engineer')
+    add_session(asha, TODAY, time(3, 0))
+    add_leave(asha, 'Pending')
+    db.session.commit()
+
+    page = user_stats_page(UserFilters())
+    by_username = {stats.username: stats for stats in page.items}
+    assert [stats.role for stats in page.items] == ['admin', 'employee']
+    assert by_username['root'].attendance is None and by_username['root'].leaves is None
+    asha_stats = by_username['asha']
+    assert (asha_stats.name, asha_stats.employee_id, asha_stats.job_role) == ('Asha Rao', asha.id, 'Engineer')
+    assert asha_stats.attendance.present_today and asha_stats.leaves.pending == 1
+
+    assert [stats.username for stats in user_stats_page(UserFilters(search='rao')).items] == ['asha']
+    assert [stats.username for stats in user_stats_page(UserFilters(role='admin')).items] == ['root']
+
+
+def test_user_stats_page_cursor(app):
+    for username in ('dara', 'chen', 'bilal'):
+        add_employee(username.title(), username=username)
+    db.session.commit()
+    first = user_stats_page(UserFilters(), per_page=2)
+    second = user_stats_page(UserFilters(), first.next_cursor, per_page=2)
+    assert [stats.username for stats in first.items + second.items] == ['bilal', 'chen', 'dara']
+    assert second.next_cursor is None and all(stats.leaves.total_requests == 0 for stats in second.items)